@@ -14,7 +14,9 @@ standard python terminal session.
 """
 
 import tank
-import inspect
+import asyncio
+import contextlib
+import json
 import logging
 import sys
 import os
@@ -32,13 +34,53 @@ class ShellEngine(Engine):
     def __init__(self, *args, **kwargs):
         # passthrough so we can init stuff
 
+        # when the TK_SHELL_STARTUP_TRACE environment variable is set to the
+        # path of a file, a timeline of the startup of the engine is written to
+        # it. It can't be an engine setting, since settings are only available
+        # well into the startup.
+        self._startup_trace = None
+        startup_trace_path = os.environ.get("TK_SHELL_STARTUP_TRACE")
+        if startup_trace_path:
+            self._start_startup_trace(startup_trace_path)
+
         # the has_qt flag indicates that the QT subsystem is present and can be started
         self._has_qt = False
 
+        # in lazy QT mode, QT is only imported once a command needs it. Until
+        # then, we only know whether it may be available.
+        self._lazy_qt = False
+        self._qt_may_be_available = False
+        self._qt_base = None
+        self._lazy_qt_application = None
+
         self._ui_created = False
 
         self._log = None
         self._stream_handler = None
+        self._log_pipeline = None
+        self._log_filter = None
+
+        # index of the registered commands and their cached signatures
+        self._dispatch_index = None
+
+        # state resolved for recently used contexts
+        self._context_cache = None
+        self._reusing_context_state = False
+
+        # results of the commands that opted into caching
+        self._result_cache = None
+
+        # releases what commands leave behind in long running sessions
+        self._session = None
+
+        # counters and latencies of the commands run, and their exporter
+        self._metrics = None
+        self._metrics_exporter = None
+
+        # measures the latency of the QT event loop, when enabled
+        self._stall_watchdog = None
+        # runs the dialogs requested by offloaded callbacks on the main thread
+        self._main_thread_invoker = None
 
         # Check if the Toolkit instance has a log and if so, we'll use it.
         if len(args) > 0 and isinstance(args[0], tank.Tank):
@@ -58,12 +100,67 @@ class ShellEngine(Engine):
             self._stream_handler.setFormatter(formatter)
             self._log.addHandler(self._stream_handler)
 
-        super().__init__(*args, **kwargs)
+        if self._startup_trace is None:
+            super().__init__(*args, **kwargs)
+        else:
+            with self._startup_trace.span("Engine.__init__"):
+                super().__init__(*args, **kwargs)
 
     def init_engine(self):
         """
         Init
         """
+        tk_shell = self.import_module("tk_shell")
+        self._dispatch_index = tk_shell.dispatch.DispatchIndex()
+        context_cache_size = self.get_setting("context_cache_size", 0)
+        if context_cache_size > 0:
+            self._context_cache = tk_shell.context_cache.ContextStateCache(
+                context_cache_size
+            )
+        # the cache location is only resolved once results are read from or
+        # written to disk, engines not caching anything never pay for it.
+        self._result_cache = tk_shell.result_cache.ResultCache(
+            self.get_setting("result_cache_size", 128),
+            lambda: os.path.join(self.cache_location, "results"),
+            self.get_setting("result_cache_disk_size", 1024),
+        )
+
+        if self._get_option("async_logging", "TK_SHELL_ASYNC_LOGGING", False):
+            self._start_log_pipeline(tk_shell)
+
+        rate = self._get_option("log_rate_limit", "TK_SHELL_LOG_RATE_LIMIT", 0.0)
+        collapse_repeats = self._get_option(
+            "log_collapse_repeats", "TK_SHELL_LOG_COLLAPSE_REPEATS", False
+        )
+        if rate or collapse_repeats:
+            self._log_filter = tk_shell.log_filters.RateLimitFilter(
+                self._log,
+                rate,
+                self.get_setting("log_rate_burst", 10),
+                collapse_repeats,
+            )
+            self._log.addFilter(self._log_filter)
+
+        self._metrics = tk_shell.metrics.MetricsRegistry()
+        metrics_path = self._get_option("metrics_path", "TK_SHELL_METRICS_PATH", "")
+        if metrics_path:
+            metrics_format = self._get_option(
+                "metrics_format", "TK_SHELL_METRICS_FORMAT", "prometheus"
+            )
+            interval = self._get_option(
+                "metrics_interval", "TK_SHELL_METRICS_INTERVAL", 0.0
+            )
+            self._metrics_exporter = tk_shell.metrics.MetricsExporter(
+                self._metrics, metrics_path, metrics_format, interval
+            )
+            self._metrics_exporter.start()
+
+        reclaim = self._get_option("reclaim_memory", "TK_SHELL_RECLAIM_MEMORY", False)
+        leak_report = self._get_option("leak_report_path", "TK_SHELL_LEAK_REPORT", "")
+        if reclaim or leak_report:
+            self._session = tk_shell.session.SessionHygiene(
+                self, reclaim, leak_report or None
+            )
 
     def destroy_engine(self):
         """
@@ -71,6 +168,23 @@ class ShellEngine(Engine):
 
         This will remove the logger.
         """
+        if self._dispatch_index is not None:
+            self._dispatch_index.invalidate()
+        if self._context_cache is not None:
+            self._context_cache.invalidate()
+        if self._result_cache is not None:
+            self._result_cache.invalidate()
+        if self._session is not None:
+            self._session.write_report()
+        if self._metrics_exporter is not None:
+            self._metrics_exporter.stop()
+            self._metrics_exporter = None
+        if self._lazy_qt and self._qt_base is None:
+            # QT was never needed, don't leave the lazy modules behind
+            self.import_module("tk_shell").lazy_qt.remove_lazy_qt(self)
+        self._report_stalls()
+        self._report_suppressed_logs()
+        self._finish_startup_trace()
         self._cleanup_logger()
 
     def __del__(self):
@@ -82,10 +196,112 @@ class ShellEngine(Engine):
         # have more and more loggers added to tank.tk-shell.
         self._cleanup_logger()
 
+    def _start_log_pipeline(self, tk_shell):
+        """
+        Replaces the stream handler with a handler queuing records for a
+        background thread, which writes them to the terminal and optionally to
+        a log file.
+        """
+        if self._stream_handler is None:
+            self.log_debug(
+                "Logging is not handled by the engine, asynchronous logging is "
+                "not available."
+            )
+            return
+
+        sinks = [self._stream_handler]
+        log_file = self._get_option("log_file", "TK_SHELL_LOG_FILE", "")
+        if log_file:
+            file_handler = logging.FileHandler(log_file)
+            file_handler.setFormatter(
+                logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+            )
+            sinks.append(file_handler)
+
+        self._log_pipeline = tk_shell.log_pipeline.AsyncLogPipeline(
+            sinks,
+            max_queue_size=self.get_setting("log_queue_size", 10000),
+            overflow_policy=self.get_setting("log_overflow_policy", "block"),
+        )
+        self._log.removeHandler(self._stream_handler)
+        self._log.addHandler(self._log_pipeline.handler)
+        self._log_pipeline.start()
+
+    def _start_startup_trace(self, path):
+        """
+        Starts recording the timeline of the startup of the engine.
+
+        The ``tk_shell`` package can't be imported before the engine is
+        initialized, so its ``startup_trace`` module is loaded from its file.
+
+        :param str path: Path of the Chrome trace event file to write.
+        """
+        import importlib.util
+
+        module_path = os.path.join(
+            os.path.dirname(__file__), "python", "tk_shell", "startup_trace.py"
+        )
+        spec = importlib.util.spec_from_file_location(
+            "tk_shell_startup_trace", module_path
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        self._startup_trace = module.StartupTrace(path)
+        self._startup_trace.start()
+
+    def _finish_startup_trace(self):
+        """
+        Stops recording the timeline of the startup of the engine, once the
+        first command is about to run, and writes it.
+        """
+        if self._startup_trace is None:
+            return
+
+        startup_trace = self._startup_trace
+        self._startup_trace = None
+        startup_trace.stop()
+        self.log_info("Startup trace written to %s and %s" % startup_trace.write())
+
+    def _report_suppressed_logs(self):
+        """
+        Logs the number of log messages dropped by the rate limiting filter.
+        """
+        if self._log_filter is None:
+            return
+
+        self._log_filter.flush()
+        report = self._log_filter.report()
+        if report["rate_limited"] or report["collapsed"]:
+            self.log_info(
+                "Suppressed %d rate limited and %d repeated log messages."
+                % (report["rate_limited"], report["collapsed"])
+            )
+            for entry in report["top_rate_limited"]:
+                self.log_debug(
+                    "%d messages suppressed like: %s"
+                    % (entry["count"], entry["template"])
+                )
+
     def _cleanup_logger(self):
         """
         Removes the stream handler if it exists from the current logger.
+
+        When logging asynchronously, the records still queued are written
+        before the pipeline is torn down.
         """
+        if self._log_filter is not None:
+            self._log.removeFilter(self._log_filter)
+            self._log_filter = None
+
+        if self._log_pipeline is not None:
+            self._log.removeHandler(self._log_pipeline.handler)
+            self._log_pipeline.stop()
+            self._log_pipeline = None
+            # the stream handler was one of the pipeline sinks, and is gone
+            # with it.
+            self._stream_handler = None
+
         if self._stream_handler is not None:
             self._log.removeHandler(self._stream_handler)
             self._stream_handler = None
@@ -118,6 +334,18 @@ class ShellEngine(Engine):
     ###################################################################################
     # properties
 
+    @property
+    def cancellation_token(self):
+        """
+        The cancellation token of the command being run, which long running
+        commands should check regularly so they stop when they are cancelled
+        or run out of time.
+
+        :returns: A ``CancellationToken`` instance, or None outside of a command.
+        """
+        tk_shell = self.import_module("tk_shell")
+        return tk_shell.cancellation.current_token()
+
     @property
     def context_change_allowed(self):
         """
@@ -125,72 +353,816 @@ class ShellEngine(Engine):
         """
         return True
 
+    def change_context(self, new_context):
+        """
+        Changes the context of the engine.
+
+        When the ``context_cache_size`` setting is not 0, the environment, apps
+        and commands resolved for recently used contexts are cached. When
+        switching to a cached context that resolves to the current
+        environment, with the same apps loaded and an unchanged configuration,
+        the engine and its apps are moved to the new context without resolving
+        the environment and reloading apps again. See
+        :meth:`_reuse_context_state` for what is skipped then.
+
+        :param new_context: The context to change to.
+        """
+        if self._context_cache is None:
+            super().change_context(new_context)
+            return
+
+        fingerprint = self._context_cache_fingerprint()
+        state = self._context_cache.get(new_context, fingerprint)
+        if state is not None and self._can_reuse_context_state(state):
+            self._reuse_context_state(new_context, state)
+            return
+
+        self._cache_context_state(self.context, fingerprint)
+        super().change_context(new_context)
+        self._cache_context_state(new_context, fingerprint)
+
+    def post_context_change(self, old_context, new_context):
+        """
+        Called after the context has changed. Apps may have been reloaded and
+        registered different commands, so the dispatch index is rebuilt. The
+        results cached in memory are dropped too, while the ones on disk are
+        keyed by context and expire on their own.
+        """
+        if not self._reusing_context_state:
+            self._dispatch_index.invalidate()
+        self._result_cache.invalidate()
+
+    def _context_cache_fingerprint(self):
+        """
+        :returns: The fingerprint of the configuration, used to discard cached
+            context state when the configuration changes on disk.
+        """
+        tk_shell = self.import_module("tk_shell")
+        return tk_shell.context_cache.config_fingerprint(
+            self.sgtk.pipeline_configuration.get_config_location()
+        )
+
+    def _cache_context_state(self, context, fingerprint):
+        """
+        Caches the state currently resolved by the engine for a context.
+        """
+        tk_shell = self.import_module("tk_shell")
+        self._context_cache.put(
+            context,
+            tk_shell.context_cache.ContextState(
+                self.environment["name"], fingerprint, self.apps, self.commands
+            ),
+        )
+
+    def _can_reuse_context_state(self, state):
+        """
+        Checks if the engine can switch to a cached context without reloading
+        anything, which is the case if the context resolved to the current
+        environment and the apps cached for it are the ones currently loaded.
+
+        Engines not allowing context changes always go through core, which
+        reports it.
+        """
+        if not self.context_change_allowed or not hasattr(self, "_set_context"):
+            return False
+
+        if state.env_name != self.environment["name"]:
+            return False
+
+        if set(state.apps) != set(self.apps) or set(state.commands) != set(
+            self.commands
+        ):
+            return False
+
+        return all(self.apps[name] is app for name, app in state.apps.items())
+
+    def _reuse_context_state(self, new_context, state):
+        """
+        Moves the engine and its apps to a new context, reusing the cached
+        state of that context.
+
+        Only the part of core's ``change_context`` that the context affects
+        once the environment and apps are known is done: the engine and app
+        ``pre_context_change`` methods, setting the context of the engine and
+        of each app with their private ``_set_context`` method, and the engine
+        and app ``post_context_change`` methods. The following is skipped:
+
+        - the ``context_change`` core hook, which is not run before nor after
+          the change.
+        - picking the environment of the new context, the cached environment
+          name is trusted.
+        - reading the engine and app settings from the environment again and
+          reloading frameworks, the configuration fingerprint guarantees they
+          didn't change on disk.
+        - unloading, loading and initializing apps, which keep the commands
+          they registered, along with the dispatch index.
+
+        This is why the cache is only enabled by setting ``context_cache_size``,
+        for configurations that don't rely on the ``context_change`` core hook.
+        """
+        old_context = self.context
+        self.log_debug("Reusing cached state for context %s" % new_context)
+
+        self.pre_context_change(old_context, new_context)
+        for app in self.apps.values():
+            app.pre_context_change(old_context, new_context)
+
+        self._set_context(new_context)
+        for app in self.apps.values():
+            app._set_context(new_context)
+
+        self._reusing_context_state = True
+        try:
+            self.post_context_change(old_context, new_context)
+        finally:
+            self._reusing_context_state = False
+        for app in self.apps.values():
+            app.post_context_change(old_context, new_context)
+
     ###################################################################################
     # command handling
 
+    def post_app_init(self):
+        """
+        Registers the commands provided by the engine itself.
+
+        They are exempt from the ``command_timeout`` setting, since they run
+        for as long as the commands they run, or until asked to stop.
+
+        ``serve_commands`` runs outside of a QT event loop: the engine server
+        processes QT events itself between requests and the prefork server
+        must never create a QApplication.
+        """
+        self.register_command(
+            "serve_commands",
+            self.serve_commands,
+            {
+                "short_name": "serve_commands",
+                "timeout": 0,
+                "qt_event_loop": False,
+                "description": (
+                    "Keeps the engine running and serves commands sent over a "
+                    "local socket. Takes the path of the socket to listen on."
+                ),
+            },
+        )
+        self.register_command(
+            "run_batch",
+            self._run_batch,
+            {
+                "short_name": "run_batch",
+                "timeout": 0,
+                "description": (
+                    "Runs all the commands listed in a json lines or yaml manifest "
+                    "and writes their status and timing to a results file. Takes "
+                    "the path of the manifest and the path of the results file."
+                ),
+            },
+        )
+        self.register_command(
+            "fan_out",
+            self._fan_out,
+            {
+                "short_name": "fan_out",
+                "timeout": 0,
+                "description": (
+                    "Runs a command once for each entity in a list, in parallel "
+                    "worker processes, and writes a report of the results. Takes "
+                    "the command, a targets file or a comma separated list of "
+                    "Type:id entities, the path of the report and the arguments "
+                    "of the command."
+                ),
+            },
+        )
+
+    def register_command(self, name, callback, properties=None):
+        """
+        Registers a command and adds it to the dispatch index, so its signature
+        is only introspected once.
+        """
+        super().register_command(name, callback, properties)
+        for cmd_key, command in self.commands.items():
+            if command["callback"] is callback:
+                self._dispatch_index.add(cmd_key, callback)
+
     def execute_command(self, cmd_key, args):
         """
         Executes a given command.
+
+        Arguments passed as strings, as they are from the command line, are
+        converted to ``int``, ``float``, ``bool`` or ``pathlib.Path`` when the
+        matching callback parameter is annotated with one of these types.
+
+        Commands registered with the ``cacheable`` property have their result
+        cached by arguments and context, for ``cache_ttl`` seconds, and on disk
+        if ``cache_on_disk`` is set. Cached results are returned without
+        calling the callback.
+
+        Callbacks can be coroutine functions. Without QT, the coroutine is run
+        to completion on a new asyncio event loop. With QT, it runs on an
+        asyncio event loop driven by the QT event loop.
+
+        When a command returns a generator or an iterator, each item is written
+        to stdout, or to the file configured with the ``TK_SHELL_STREAM_PATH``
+        environment variable, as soon as it is produced. The command then
+        returns the number of items written.
+
+        Commands can be given a time budget in seconds through their
+        ``timeout`` property, or globally through the ``command_timeout``
+        setting or the ``TK_SHELL_COMMAND_TIMEOUT`` environment variable. Once
+        it is spent, the command is cancelled and reported as timed out.
+
+        When the ``reclaim_memory`` setting is on, what the command leaves
+        behind, like closed windows and log handlers, is released once it is
+        done.
+
+        Commands registered with the ``qt_event_loop`` property set to False
+        run straight, outside of a QT event loop, even when QT is available.
+
+        The outcome and duration of the command are recorded in the engine
+        :attr:`metrics`.
         """
-        cb = self.commands[cmd_key]["callback"]
+        with self._command_scope(cmd_key):
+            return self._execute_command(cmd_key, args)
+
+    def _execute_command(self, cmd_key, args):
+        """
+        Executes a given command, see :meth:`execute_command`.
+        """
+        tk_shell = self.import_module("tk_shell")
+        self._finish_startup_trace()
+        profiler = self._create_profiler(cmd_key)
+        writer = self._create_stream_writer()
+        try:
+            with profiler.phase("validation"):
+                cb, args = self._resolve_command(cmd_key, args)
+                timeout = self._get_command_timeout(cmd_key)
+
+            if self.commands[cmd_key].get("properties", {}).get("requires_ui"):
+                # in lazy QT mode, commands flagged as requiring a UI need QT
+                # now, before choosing how to run them.
+                self._ensure_qt()
+
+            is_async = tk_shell.aio.is_async_callback(cb)
+            in_qt_event_loop = self._runs_in_qt_event_loop(cmd_key)
+            if is_async and not in_qt_event_loop:
+                cb = tk_shell.aio.as_sync(cb)
+            if not in_qt_event_loop:
+                cb = tk_shell.streaming.consuming(cb, writer)
+            cb = profiler.wrap(cb)
+
+            if not in_qt_event_loop:
+                # QT not available or not wanted - just run the command straight
+                token = tk_shell.cancellation.CancellationToken(timeout)
+                with self._metrics.measure(cmd_key):
+                    with tk_shell.cancellation.deadline(self, token, cmd_key):
+                        result = cb(*args)
+
+                if self._lazy_qt_application:
+                    # QT was started on demand while the command ran because it
+                    # requested a dialog. Keep the windows alive until closed.
+                    qt_application = self._lazy_qt_application
+                    self._lazy_qt_application = None
+                    with profiler.phase("event_loop"):
+                        qt_application.exec_()
+
+                return result
+            else:
+                from sgtk.platform.qt import QtCore
+
+                # we got QT capabilities. Start a QT app and fire the command into
+                # the app
+                if is_async:
+                    t = tk_shell.AsyncTask(self, cb, args, cmd_key, timeout)
+                elif self._offloads_callback(cmd_key):
+                    # dialogs requested by the callback are marshalled back to
+                    # the main thread.
+                    if self._main_thread_invoker is None:
+                        self._main_thread_invoker = tk_shell.MainThreadInvoker()
+                    t = tk_shell.OffloadedTask(self, cb, args, cmd_key, timeout)
+                else:
+                    t = tk_shell.Task(self, cb, args, cmd_key, timeout)
+                t.item_produced.connect(writer.write)
+
+                # start up our QApp now, if none is already running
+                with profiler.phase("qt_startup"):
+                    qt_application, created = self._get_qt_application()
+
+                # if we didn't start the QApplication here, leave the responsibility
+                # to run the exec loop and quit to the initial creator of the
+                # QApplication
+                if created:
+                    # when the QApp starts, initialize our task code
+                    QtCore.QTimer.singleShot(0, t.run_command)
+                    # and ask the main app to exit when the task emits its finished
+                    # signal
+                    t.finished.connect(qt_application.quit)
+
+                    # start the application loop. This will block the process until
+                    # the task has completed - this is either triggered by a main
+                    # window closing or byt the finished signal being called from the
+                    # task class above.
+                    with profiler.phase("event_loop"), self._watching_stalls():
+                        qt_application.exec_()
+                else:
+                    with self._watching_stalls():
+                        # we can run the command now, as the QApp is already started
+                        t.run_command()
+
+                        if not t.is_complete:
+                            # coroutines, offloaded callbacks and streamed output
+                            # need events to be processed to make progress. Wait
+                            # for them here.
+                            loop = QtCore.QEventLoop()
+                            t.completed.connect(loop.quit)
+                            with profiler.phase("event_loop"):
+                                loop.exec_()
+
+                if t.result is None:
+                    return None
+                self._metrics.record_result(t.result)
+                return t.result.value
+        finally:
+            writer.close()
+            profiler.report()
+
+    async def execute_command_async(self, cmd_key, args):
+        """
+        Executes a given command from code already running in an asyncio event
+        loop.
 
-        # make sure the number of parameters to the command are correct
-        cb_arg_spec = inspect.getfullargspec(cb)
-        cb_arg_list = cb_arg_spec[0]
-        cb_var_args = cb_arg_spec[1]
+        Coroutine function callbacks are awaited. Regular callbacks are run in
+        the loop's default executor when QT is not available, so they don't
+        block the loop, and directly otherwise, since they may create widgets.
 
-        if hasattr(cb, "__self__"):
-            # first argument to cb will be class instance:
-            cb_arg_list = cb_arg_list[1:]
+        Like with :meth:`execute_command`, commands get their cancellation
+        token and are held to their time budget, and their outcome and
+        duration are recorded in the engine :attr:`metrics`.
 
-        # ensure the correct/minimum number of arguments have been passed:
-        have_expected_args = False
-        if cb_var_args:
-            have_expected_args = len(args) >= len(cb_arg_list)
-        else:
-            have_expected_args = len(args) == len(cb_arg_list)
+        :param str cmd_key: Name of the command.
+        :param list args: Arguments for the command.
 
-        if not have_expected_args:
-            expected_args = list(cb_arg_list)
-            if cb_var_args:
-                expected_args.append("*%s" % cb_var_args)
-            raise TankError(
-                "Cannot run command! Expected command arguments (%s)"
-                % ", ".join(expected_args)
+        :returns: The value returned by the command.
+        """
+        with self._command_scope(cmd_key):
+            return await self._execute_command_async(cmd_key, args)
+
+    async def _execute_command_async(self, cmd_key, args):
+        """
+        Executes a given command, see :meth:`execute_command_async`.
+        """
+        tk_shell = self.import_module("tk_shell")
+        cb, args = self._resolve_command(cmd_key, args)
+
+        with self._metrics.measure(cmd_key):
+            token = tk_shell.cancellation.CancellationToken(
+                self._get_command_timeout(cmd_key)
             )
+            if tk_shell.aio.is_async_callback(cb):
+                return await tk_shell.cancellation.wait_for(cb(*args), token, cmd_key)
 
+            def run():
+                # the token is activated on the thread running the callback
+                with tk_shell.cancellation.deadline(self, token, cmd_key):
+                    return cb(*args)
+
+            if self._has_qt:
+                return run()
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, run)
+
+    def execute_commands(
+        self, entries, results_path=None, max_workers=None, executor=None
+    ):
+        """
+        Executes many commands within this engine and, when QT is available,
+        within a single QT event loop.
+
+        Errors raised by a command are logged and recorded in its result and do
+        not prevent the following commands from running.
+
+        When QT is not available, commands can be run concurrently on a pool of
+        threads or forked processes. They must then be independent from each
+        other. When QT is available, commands flagged with the ``headless``
+        property can run concurrently on a ``QThreadPool`` while the others run
+        on the main thread.
+
+        :param entries: List of ``(cmd_key, args)`` tuples.
+        :param str results_path: Optional path of a json file the status and
+            timing of each command is written to.
+        :param int max_workers: Number of commands to run concurrently. Defaults
+            to the ``batch_max_workers`` setting.
+        :param str executor: ``thread`` or ``process``. Defaults to the
+            ``batch_executor`` setting.
+
+        :returns: List of ``CommandResult``, in the order of ``entries``.
+        """
+        tk_shell = self.import_module("tk_shell")
+        self._finish_startup_trace()
+
+        if max_workers is None:
+            max_workers = self.get_setting("batch_max_workers", 1)
+        if executor is None:
+            executor = self.get_setting("batch_executor", "thread")
+
+        writer = self._create_stream_writer()
         if not self._has_qt:
-            # QT not available - just run the command straight
-            return cb(*args)
+            if max_workers > 1:
+                results = tk_shell.pool.run_entries_concurrently(
+                    self, entries, max_workers, executor, writer
+                )
+            else:
+                results = tk_shell.batch.run_entries(self, entries, writer)
         else:
-            from sgtk.platform.qt import QtCore, QtGui
+            from sgtk.platform.qt import QtCore
+
+            results = []
+            qt_application, created = self._get_qt_application()
+
+            def run_all():
+                results.extend(tk_shell.batch.run_entries(self, entries, writer))
+                # same as for a single command, keep the event loop running
+                # for as long as the windows that were requested are open.
+                if created and not self.has_received_ui_creation_requests():
+                    qt_application.quit()
+
+            if max_workers > 1:
+                results = self._schedule_commands(
+                    entries, max_workers, writer, qt_application, created
+                )
+            elif created:
+                QtCore.QTimer.singleShot(0, run_all)
+                with self._watching_stalls():
+                    qt_application.exec_()
+            else:
+                with self._watching_stalls():
+                    run_all()
 
-            # we got QT capabilities. Start a QT app and fire the command into the app
-            tk_shell = self.import_module("tk_shell")
-            t = tk_shell.Task(self, cb, args)
-
-            # start up our QApp now, if none is already running
-            qt_application = None
-            if not QtGui.QApplication.instance():
-                qt_application = QtGui.QApplication([])
-                qt_application.setWindowIcon(QtGui.QIcon(self.icon_256))
-                self._initialize_dark_look_and_feel()
-
-            # if we didn't start the QApplication here, leave the responsibility
-            # to run the exec loop and quit to the initial creator of the QApplication
-            if qt_application:
-                # when the QApp starts, initialize our task code
-                QtCore.QTimer.singleShot(0, t.run_command)
-                # and ask the main app to exit when the task emits its finished signal
-                t.finished.connect(qt_application.quit)
-
-                # start the application loop. This will block the process until the task
-                # has completed - this is either triggered by a main window closing or
-                # byt the finished signal being called from the task class above.
+        writer.close()
+        for result in results:
+            self._metrics.record_result(result)
+        if results_path:
+            tk_shell.batch.write_results(results_path, results)
+        return results
+
+    def _schedule_commands(self, entries, max_workers, writer, qt_application, created):
+        """
+        Runs commands with a ``TaskScheduler``, within the running QT event loop
+        or within a new one.
+
+        :returns: List of ``CommandResult``, in the order of ``entries``.
+        """
+        from sgtk.platform.qt import QtCore
+
+        tk_shell = self.import_module("tk_shell")
+        scheduler = tk_shell.TaskScheduler(self, max_workers, writer)
+        for cmd_key, args in entries:
+            scheduler.submit(cmd_key, args)
+
+        with self._watching_stalls():
+            if created:
+                QtCore.QTimer.singleShot(0, scheduler.start)
+                scheduler.finished.connect(qt_application.quit)
                 qt_application.exec_()
             else:
-                # we can run the command now, as the QApp is already started
-                t.run_command()
+                loop = QtCore.QEventLoop()
+                scheduler.finished.connect(loop.quit)
+                scheduler.start()
+                if not scheduler.is_finished:
+                    loop.exec_()
+
+        # the event loop may have been stopped by the last window closing while
+        # headless commands were still running.
+        scheduler.wait()
+        return scheduler.results
+
+    def _run_batch(self, manifest_path, results_path):
+        """
+        Callback for the run_batch command.
+        """
+        tk_shell = self.import_module("tk_shell")
+        results = self.execute_commands(
+            tk_shell.batch.load_manifest(manifest_path), results_path
+        )
+        failed = len([result for result in results if not result.succeeded])
+        self.log_info(
+            "Ran %d commands, %d failed. Results written to %s"
+            % (len(results), failed, results_path)
+        )
+
+    def execute_command_for_contexts(
+        self, cmd_key, args, targets, max_workers=None, report_path=None
+    ):
+        """
+        Executes a command once for each of many entities, each time in the
+        context of the entity, in parallel worker processes forked from this
+        one.
+
+        The results, failures and logs of all the runs are merged into one
+        report. Commands run this way must not require a UI.
+
+        :param str cmd_key: Name of the command.
+        :param list args: Arguments for the command.
+        :param targets: List of entities, as ``{"type": ..., "id": ...}``
+            dictionaries, ``[type, id]`` lists or ``"type:id"`` strings.
+        :param int max_workers: Number of worker processes. Defaults to the
+            ``fanout_max_workers`` setting, or to the number of CPUs.
+        :param str report_path: Optional path of a json file the report is
+            written to.
+
+        :returns: The report, as a dictionary.
+        """
+        tk_shell = self.import_module("tk_shell")
+
+        if max_workers is None:
+            max_workers = self.get_setting("fanout_max_workers", 0)
+        max_workers = max_workers or os.cpu_count() or 1
+
+        report = tk_shell.fanout.run_for_contexts(
+            self,
+            cmd_key,
+            args,
+            [tk_shell.fanout.parse_target(target) for target in targets],
+            max_workers,
+        )
+        for result in report["results"]:
+            self._metrics.record(cmd_key, result["status"], result["duration"])
+        if report_path:
+            tk_shell.fanout.write_report(report_path, report)
+        return report
+
+    def _fan_out(self, cmd_key, targets, report_path, *args):
+        """
+        Callback for the fan_out command.
+        """
+        tk_shell = self.import_module("tk_shell")
+        if os.path.isfile(targets):
+            targets = tk_shell.fanout.load_targets(targets)
+        else:
+            targets = [target for target in targets.split(",") if target.strip()]
+
+        summary = self.execute_command_for_contexts(
+            cmd_key, list(args), targets, report_path=report_path
+        )["summary"]
+        self.log_info(
+            "Ran %s for %d entities, %d failed. Report written to %s"
+            % (cmd_key, summary["total"], summary["failed"], report_path)
+        )
+
+    def serve_commands(self, socket_path):
+        """
+        Keeps this engine alive and serves ``execute_command`` requests sent
+        over a Unix domain socket, until a client asks the server to shut down.
+
+        Clients can use the ``tk_shell/daemon.py`` script shipped with this
+        engine, which does not need toolkit to be bootstrapped.
+
+        When the ``command_server`` setting or the ``TK_SHELL_COMMAND_SERVER``
+        environment variable is set to ``prefork``, each request runs in a
+        child process forked from this one, in isolation from the others, and
+        no QApplication is created.
+
+        :param str socket_path: Path of the socket to listen on.
+        """
+        tk_shell = self.import_module("tk_shell")
+        self._finish_startup_trace()
+        mode = self._get_option("command_server", "TK_SHELL_COMMAND_SERVER", "engine")
+        if mode == "prefork":
+            server = tk_shell.prefork.PreforkCommandServer(
+                self,
+                socket_path,
+                max_children=self.get_setting("prefork_max_children", 8),
+            )
+        elif mode == "engine":
+            server = tk_shell.daemon.CommandServer(self, socket_path)
+        else:
+            raise TankError(
+                "Unknown command server '%s'. Expected engine or prefork." % mode
+            )
+        server.serve_forever()
+
+    def _resolve_command(self, cmd_key, args):
+        """
+        Looks up a command and validates the arguments passed to it.
+
+        :param str cmd_key: Name of the command.
+        :param list args: Arguments for the command.
+
+        :returns: A tuple of the command callback and the arguments to call it
+            with, converted to the types the callback is annotated with.
+        :raises TankError: If the arguments don't match the callback signature.
+        """
+        if cmd_key not in self.commands:
+            raise TankError("Unknown command '%s'." % cmd_key)
+
+        cb = self.commands[cmd_key]["callback"]
+        signature = self._dispatch_index.get(cmd_key, cb)
+        args = signature.bind(args)
+        if signature.accepts_token:
+            tk_shell = self.import_module("tk_shell")
+            cb = tk_shell.cancellation.passing_token(cb)
+
+        properties = self.commands[cmd_key].get("properties", {})
+        if properties.get("cacheable"):
+            # lookups are served from the cache without calling the callback
+            tk_shell = self.import_module("tk_shell")
+            cb = tk_shell.result_cache.memoized(
+                cb,
+                self._result_cache,
+                tk_shell.result_cache.cache_key(cmd_key, args, self.context),
+                properties.get(
+                    "cache_ttl", self.get_setting("result_cache_ttl", 300.0)
+                ),
+                properties.get("cache_on_disk", False),
+            )
+        return cb, args
+
+    def _get_command_timeout(self, cmd_key):
+        """
+        Returns the time budget of a command, from its ``timeout`` property or,
+        if it doesn't have one, from the ``command_timeout`` setting or the
+        ``TK_SHELL_COMMAND_TIMEOUT`` environment variable.
+
+        :param str cmd_key: Name of the command.
+
+        :returns: The time budget in seconds, or None if it is unlimited.
+        """
+        timeout = self.commands[cmd_key].get("properties", {}).get("timeout")
+        if timeout is None:
+            timeout = self._get_option(
+                "command_timeout", "TK_SHELL_COMMAND_TIMEOUT", 0.0
+            )
+        return float(timeout) or None
+
+    def _create_profiler(self, cmd_key):
+        """
+        Creates the profiler instrumenting a command execution. It does nothing
+        unless profiling was enabled through the ``profile_commands`` setting
+        or the ``TK_SHELL_PROFILE`` environment variable.
+
+        :param str cmd_key: Name of the command.
+        """
+        tk_shell = self.import_module("tk_shell")
+        modes = tk_shell.profiling.parse_modes(
+            self._get_option("profile_commands", "TK_SHELL_PROFILE", "")
+        )
+        output_dir = None
+        if modes:
+            output_dir = self._get_option(
+                "profile_output_dir", "TK_SHELL_PROFILE_DIR", ""
+            ) or os.path.join(self.cache_location, "profiles")
+        return tk_shell.profiling.create_profiler(self, cmd_key, modes, output_dir)
+
+    def _create_stream_writer(self):
+        """
+        Creates the writer items streamed by a command are written to, as
+        configured by the ``stream_format`` setting or the
+        ``TK_SHELL_STREAM_FORMAT`` environment variable, and the
+        ``TK_SHELL_STREAM_PATH`` environment variable.
+        """
+        tk_shell = self.import_module("tk_shell")
+        return tk_shell.streaming.StreamWriter(
+            output_format=self._get_option(
+                "stream_format", "TK_SHELL_STREAM_FORMAT", "text"
+            ),
+            path=os.environ.get("TK_SHELL_STREAM_PATH") or None,
+        )
+
+    @contextlib.contextmanager
+    def _command_scope(self, cmd_key):
+        """
+        Context manager wrapping the execution of a command, releasing what it
+        leaves behind and sampling the process for the leak report, if
+        enabled.
+
+        :param str cmd_key: Name of the command.
+        """
+        if self._session is None:
+            yield
+            return
+
+        with self._session.command(cmd_key):
+            yield
+
+    def _runs_in_qt_event_loop(self, cmd_key):
+        """
+        Indicates if a command should run within a QT event loop, which is the
+        case when QT is available, unless the command's ``qt_event_loop``
+        property is set to False.
+
+        :param str cmd_key: Name of the command.
+        """
+        if not self._has_qt:
+            return False
+        return bool(
+            self.commands[cmd_key].get("properties", {}).get("qt_event_loop", True)
+        )
+
+    def _offloads_callback(self, cmd_key):
+        """
+        Indicates if a command callback should run on a worker thread, as
+        requested by its ``offload`` property or, if it doesn't have one, by
+        the ``offload_callbacks`` setting or the ``TK_SHELL_OFFLOAD_CALLBACKS``
+        environment variable.
+
+        :param str cmd_key: Name of the command.
+        """
+        offload = self.commands[cmd_key].get("properties", {}).get("offload")
+        if offload is None:
+            offload = self._get_option(
+                "offload_callbacks", "TK_SHELL_OFFLOAD_CALLBACKS", False
+            )
+        return bool(offload)
+
+    @contextlib.contextmanager
+    def _watching_stalls(self):
+        """
+        Context manager watching the QT event loop for stalls, if enabled
+        through the ``stall_threshold`` setting or the
+        ``TK_SHELL_STALL_THRESHOLD`` environment variable. It must only be
+        entered while an event loop is running or about to run.
+        """
+        if self._stall_watchdog is None:
+            threshold = self._get_option(
+                "stall_threshold", "TK_SHELL_STALL_THRESHOLD", 0.0
+            )
+            if not threshold:
+                yield
+                return
+            tk_shell = self.import_module("tk_shell")
+            self._stall_watchdog = tk_shell.StallWatchdog(self, threshold)
+
+        self._stall_watchdog.start()
+        try:
+            yield
+        finally:
+            self._stall_watchdog.stop()
+
+    def _report_stalls(self):
+        """
+        Logs the QT event loop latency histogram and writes it to the file
+        configured with the ``stall_report_path`` setting or the
+        ``TK_SHELL_STALL_REPORT`` environment variable.
+        """
+        if self._stall_watchdog is None:
+            return
+
+        report = self._stall_watchdog.report()
+        self.log_debug("QT event loop latency: %s" % json.dumps(report))
+        path = self._get_option("stall_report_path", "TK_SHELL_STALL_REPORT", "")
+        if path:
+            with open(path, "w") as fh:
+                json.dump(report, fh, indent=2)
+
+    def _get_option(self, setting_name, env_var, default):
+        """
+        Returns the value of an option that can be set either through an
+        environment variable or through an engine setting. The environment
+        variable takes precedence.
+
+        :param str setting_name: Name of the engine setting.
+        :param str env_var: Name of the environment variable.
+        :param default: Default value, also used to convert the environment
+            variable to the right type.
+
+        An empty environment variable is ignored, as is one that can't be
+        converted, with a warning.
+        """
+        value = os.environ.get(env_var)
+        if value is None or not value.strip():
+            return self.get_setting(setting_name, default)
+
+        if isinstance(default, bool):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        if default is not None:
+            try:
+                return type(default)(value)
+            except ValueError:
+                self.log_warning(
+                    "Ignoring %s=%r, which is not a valid %s."
+                    % (env_var, value, type(default).__name__)
+                )
+                return self.get_setting(setting_name, default)
+        return value
+
+    def _get_qt_application(self):
+        """
+        Returns the running QApplication, creating it if needed.
+
+        :returns: A tuple of the QApplication and a boolean indicating if it
+            was created by this call.
+        """
+        from sgtk.platform.qt import QtGui
+
+        qt_application = QtGui.QApplication.instance()
+        if qt_application:
+            return qt_application, False
+
+        qt_application = QtGui.QApplication([])
+        qt_application.setWindowIcon(QtGui.QIcon(self.icon_256))
+        self._initialize_dark_look_and_feel()
+        return qt_application, True
 
     ###################################################################################
     # logging interfaces
@@ -210,6 +1182,20 @@ class ShellEngine(Engine):
     ###################################################################################
     # metrics
 
+    @property
+    def metrics(self):
+        """
+        Counters and latency histograms of the commands run by this engine, by
+        command.
+
+        They are written to the file configured with the ``metrics_path``
+        setting or the ``TK_SHELL_METRICS_PATH`` environment variable, every
+        ``metrics_interval`` seconds and when the engine is destroyed.
+
+        :returns: A ``MetricsRegistry`` instance.
+        """
+        return self._metrics
+
     @property
     def host_info(self):
         """
@@ -228,7 +1214,70 @@ class ShellEngine(Engine):
     def _define_qt_base(self):
         """
         Define the QT environment.
+
+        In lazy QT mode, QT is not imported. We only check whether it could be,
+        and return placeholders that import it the first time they are used.
+        """
+        if not self._uses_lazy_qt():
+            return self._bootstrap_qt()
+
+        tk_shell = self.import_module("tk_shell")
+        self._qt_may_be_available = tk_shell.lazy_qt.is_qt_installed()
+        return tk_shell.lazy_qt.define_lazy_qt_base(self)
+
+    def _define_qt5_base(self):
+        """
+        Define the QT5 shim.
+
+        In lazy QT mode, the shim imports QT the first time it is used.
+        """
+        if not self._uses_lazy_qt():
+            return super()._define_qt5_base()
+
+        tk_shell = self.import_module("tk_shell")
+        return tk_shell.lazy_qt.define_lazy_shim_base(self, "qt5")
+
+    def _define_qt6_base(self):
+        """
+        Define the QT6 shim.
+
+        In lazy QT mode, the shim imports QT the first time it is used.
+        """
+        if not self._uses_lazy_qt():
+            return super()._define_qt6_base()
+
+        tk_shell = self.import_module("tk_shell")
+        return tk_shell.lazy_qt.define_lazy_shim_base(self, "qt6")
+
+    def _uses_lazy_qt(self):
+        """
+        Indicates if QT is only imported once it is needed, as requested with
+        the ``lazy_qt`` setting or the ``TK_SHELL_LAZY_QT`` environment
+        variable.
+        """
+        self._lazy_qt = self._get_option("lazy_qt", "TK_SHELL_LAZY_QT", False)
+        return self._lazy_qt
+
+    def _ensure_qt(self):
+        """
+        Makes sure QT has been imported when the engine runs in lazy QT mode.
+
+        :returns: True if QT is available.
+        """
+        if self._lazy_qt and self._qt_base is None and self._qt_may_be_available:
+            self._bootstrap_qt()
+        return self._has_qt
+
+    def _bootstrap_qt(self):
+        """
+        Imports QT and builds the QT environment, once.
+
+        :returns: A dictionary with the QT core and gui modules and the dialog
+            base class.
         """
+        if self._qt_base is not None:
+            return self._qt_base
+
         base = super()._define_qt_base()
 
         if not base["qt_gui"]:
@@ -275,8 +1324,42 @@ class ShellEngine(Engine):
             if QtGui.QApplication.instance():
                 self._has_ui = True
 
+        self._qt_base = base
+
+        if self._lazy_qt:
+            # code that imported the QT modules until now holds lazy modules
+            # forwarding to this base. Point the toolkit modules at the real
+            # thing for code importing them from now on.
+            from tank.platform import qt, qt5, qt6
+
+            qt.QtCore = base["qt_core"]
+            qt.QtGui = base["qt_gui"]
+            qt.TankDialogBase = base["dialog_base"]
+
+            # the qt5 and qt6 shims were left empty at startup, fill them in.
+            for shim, shim_base in (
+                (qt5, super()._define_qt5_base()),
+                (qt6, super()._define_qt6_base()),
+            ):
+                shim.__dict__.pop("__getattr__", None)
+                for name, value in shim_base.items():
+                    setattr(shim, name, value)
+            self.log_debug("QT was imported on demand.")
+
         return base
 
+    def _ensure_qt_application(self):
+        """
+        In lazy QT mode, makes sure a QApplication exists before a dialog is
+        created by a command that runs outside of a QT event loop.
+        """
+        if not self._lazy_qt:
+            return
+
+        qt_application, created = self._get_qt_application()
+        if created:
+            self._lazy_qt_application = qt_application
+
     def show_dialog(self, title, bundle, widget_class, *args, **kwargs):
         """
         Shows a non-modal dialog window in a way suitable for this engine.
@@ -293,7 +1376,7 @@ class ShellEngine(Engine):
 
         :returns: the created widget_class instance
         """
-        if not self._has_qt:
+        if not self._ensure_qt():
             self.log_error(
                 "Cannot show dialog %s! No QT support appears to exist in this engine. "
                 "In order for the shell engine to run UI based apps, either pyside "
@@ -301,7 +1384,17 @@ class ShellEngine(Engine):
             )
             return
 
+        if (
+            self._main_thread_invoker is not None
+            and not self._main_thread_invoker.is_main_thread()
+        ):
+            # widgets can only be created on the main thread
+            return self._main_thread_invoker.call(
+                self.show_dialog, title, bundle, widget_class, *args, **kwargs
+            )
+
         self._ui_created = True
+        self._ensure_qt_application()
 
         return Engine.show_dialog(self, title, bundle, widget_class, *args, **kwargs)
 
@@ -323,7 +1416,7 @@ class ShellEngine(Engine):
         :returns: (a standard QT dialog status return code, the created widget_class
             instance)
         """
-        if not self._has_qt:
+        if not self._ensure_qt():
             self.log_error(
                 "Cannot show dialog %s! No QT support appears to exist in this engine. "
                 "In order for the shell engine to run UI based apps, either pyside "
@@ -331,6 +1424,16 @@ class ShellEngine(Engine):
             )
             return
 
+        if (
+            self._main_thread_invoker is not None
+            and not self._main_thread_invoker.is_main_thread()
+        ):
+            # widgets can only be created on the main thread
+            return self._main_thread_invoker.call(
+                self.show_modal, title, bundle, widget_class, *args, **kwargs
+            )
+
         self._ui_created = True
+        self._ensure_qt_application()
 
         return Engine.show_modal(self, title, bundle, widget_class, *args, **kwargs)
@@ -8,4 +8,44 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-from .task import Task  # noqa
+from .result import CommandResult, run_async_callback, run_callback  # noqa
+from . import aio  # noqa
+from . import batch  # noqa
+from . import cancellation  # noqa
+from . import context_cache  # noqa
+from . import daemon  # noqa
+from . import dispatch  # noqa
+from . import fanout  # noqa
+from . import forking  # noqa
+from . import histogram  # noqa
+from . import lazy_qt  # noqa
+from . import log_filters  # noqa
+from . import log_pipeline  # noqa
+from . import metrics  # noqa
+from . import pool  # noqa
+from . import prefork  # noqa
+from . import profiling  # noqa
+from . import result_cache  # noqa
+from . import session  # noqa
+from . import streaming  # noqa
+
+# Modules below require QT and are only imported the first time they are
+# accessed, so headless code paths can use this package without it.
+_QT_EXPORTS = {
+    "AsyncioPump": "async_task",
+    "AsyncTask": "async_task",
+    "MainThreadInvoker": "offload",
+    "OffloadedTask": "offload",
+    "StallWatchdog": "stall_watchdog",
+    "Task": "task",
+    "TaskScheduler": "scheduler",
+}
+
+
+def __getattr__(name):
+    if name in _QT_EXPORTS:
+        import importlib
+
+        module = importlib.import_module("." + _QT_EXPORTS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
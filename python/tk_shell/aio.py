@@ -0,0 +1,42 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Helpers for commands implemented as coroutine functions.
+"""
+
+import asyncio
+import functools
+import inspect
+
+
+def is_async_callback(callback):
+    """
+    :returns: True if the callback is a coroutine function.
+    """
+    return inspect.iscoroutinefunction(callback)
+
+
+def as_sync(callback):
+    """
+    Turns a coroutine function into a regular function running the coroutine
+    to completion on a new asyncio event loop.
+
+    :param callback: A coroutine function.
+
+    :returns: A function taking the same arguments as ``callback`` and
+        returning the result of the coroutine.
+    """
+
+    @functools.wraps(callback)
+    def run_to_completion(*args):
+        return asyncio.run(callback(*args))
+
+    return run_to_completion
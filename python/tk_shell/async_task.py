@@ -0,0 +1,128 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import asyncio
+
+from tank.platform.qt import QtCore
+
+from .result import run_async_callback
+from .task import Task
+
+
+class AsyncioPump(QtCore.QObject):
+    """
+    Drives an asyncio event loop from the QT event loop.
+
+    A timer regularly runs one iteration of the asyncio loop, so coroutines
+    and QT events are both processed on the main thread without either loop
+    blocking the other.
+    """
+
+    # how often, in milliseconds, the asyncio loop gets to run
+    INTERVAL = 5
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.loop = asyncio.new_event_loop()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(self.INTERVAL)
+        self._timer.timeout.connect(self._run_once)
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        """
+        Stops driving the asyncio loop and closes it.
+        """
+        self._timer.stop()
+        if not self.loop.is_closed():
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def _run_once(self):
+        # stopping right away makes run_forever process the callbacks that are
+        # ready, poll for I/O without waiting, and return.
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+
+class AsyncTask(Task):
+    """
+    Runs a command implemented as a coroutine function inside the QT universe.
+
+    The coroutine runs on an asyncio event loop driven by the QT event loop.
+    Like for :class:`Task`, ``finished`` is emitted once the coroutine has
+    completed unless the command requested a UI. ``completed`` is emitted in
+    all cases.
+    """
+
+    # milliseconds a coroutine gets to complete once cancelled, before it is
+    # reported as timed out without waiting for it any longer.
+    CANCEL_GRACE_PERIOD = 1000
+
+    def __init__(self, engine, callback, args, cmd_key=None, timeout=None):
+        Task.__init__(self, engine, callback, args, cmd_key, timeout)
+        self._pump = None
+        self._future = None
+
+    def run_command(self):
+        remaining = self.cancellation_token.remaining()
+        if remaining is not None:
+            QtCore.QTimer.singleShot(int(remaining * 1000), self._on_deadline)
+
+        self._pump = AsyncioPump(self)
+        self._future = self._pump.loop.create_task(self._run())
+        self._pump.start()
+
+    async def _run(self):
+        try:
+            # execute the coroutine, errors are logged and classified. It is
+            # cancelled by run_async_callback once its time is up.
+            self.result = await run_async_callback(
+                self._engine,
+                self._callback,
+                self._args,
+                self._cmd_key,
+                self.cancellation_token,
+            )
+        finally:
+            # the loop can't be closed from within one of its callbacks
+            QtCore.QTimer.singleShot(0, self._complete)
+
+    def _on_deadline(self):
+        if self._future is not None and not self._future.done():
+            # the coroutine is about to be cancelled and report it, unless it
+            # ignores the cancellation.
+            self._future.cancel()
+            QtCore.QTimer.singleShot(
+                self.CANCEL_GRACE_PERIOD, self._on_grace_period_end
+            )
+            return
+        Task._on_deadline(self)
+
+    def _on_grace_period_end(self):
+        """
+        Ends the command if its coroutine didn't complete once cancelled.
+        """
+        if self._future.done():
+            # it completed, the task is about to complete as well
+            return
+        self._engine.log_warning(
+            "Command %s ignored its cancellation, no longer waiting for it."
+            % self._cmd_key
+        )
+        Task._on_deadline(self)
+
+    def _complete(self):
+        if self.is_complete:
+            return
+        self._pump.stop()
+        Task._complete(self)
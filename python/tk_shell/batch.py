@@ -0,0 +1,129 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Support for running many commands within a single engine lifetime.
+
+A manifest lists the commands to run, either as json lines::
+
+    {"command": "cmd_key", "args": ["a", "b"]}
+    ["other_cmd_key", "c"]
+
+or as a yaml list::
+
+    - command: cmd_key
+      args: [a, b]
+"""
+
+import json
+import os
+import time
+
+import tank
+
+from .cancellation import CancellationToken
+from .result import CommandResult, run_callback
+from .streaming import consuming
+
+
+def load_manifest(path):
+    """
+    Reads the commands listed in a manifest file.
+
+    :param str path: Path to a ``.jsonl``/``.json`` or ``.yml``/``.yaml`` file.
+
+    :returns: List of ``(cmd_key, args)`` tuples.
+    :raises TankError: If the manifest cannot be read.
+    """
+    if not os.path.isfile(path):
+        raise tank.TankError("Batch manifest %s does not exist." % path)
+
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, "r") as fh:
+            if extension in (".yml", ".yaml"):
+                from tank_vendor import yaml
+
+                raw_entries = yaml.safe_load(fh) or []
+            else:
+                raw_entries = [json.loads(line) for line in fh if line.strip()]
+    except ValueError as e:
+        raise tank.TankError("Cannot parse batch manifest %s: %s" % (path, e))
+
+    if not isinstance(raw_entries, list):
+        raise tank.TankError("Batch manifest %s must contain a list." % path)
+
+    return [_parse_entry(entry, path) for entry in raw_entries]
+
+
+def _parse_entry(entry, path):
+    """
+    Converts a manifest entry into a ``(cmd_key, args)`` tuple.
+    """
+    if isinstance(entry, dict) and entry.get("command"):
+        return entry["command"], list(entry.get("args") or [])
+
+    if isinstance(entry, list) and entry:
+        return entry[0], list(entry[1:])
+
+    raise tank.TankError("Invalid entry %r in batch manifest %s." % (entry, path))
+
+
+def run_entries(engine, entries, writer=None):
+    """
+    Runs commands one after the other, collecting their results.
+
+    Errors raised by a command are logged and recorded in its result and do
+    not prevent the following commands from running.
+
+    :param engine: The engine running the commands.
+    :param entries: List of ``(cmd_key, args)`` tuples.
+    :param writer: Optional :class:`~streaming.StreamWriter` the items of
+        commands returning a generator or an iterator are streamed to.
+
+    :returns: List of :class:`~result.CommandResult`, in the order of ``entries``.
+    """
+    results = []
+    for cmd_key, args in entries:
+        engine.log_debug("Running batch command %s %s" % (cmd_key, args))
+        try:
+            callback, args = engine._resolve_command(cmd_key, args)
+        except tank.TankError as e:
+            result = CommandResult.failed(cmd_key, args, e)
+            engine.log_error(result.error)
+        else:
+            if writer is not None:
+                callback = consuming(callback, writer)
+            token = CancellationToken(engine._get_command_timeout(cmd_key))
+            result = run_callback(engine, callback, args, cmd_key, token)
+        results.append(result)
+    return results
+
+
+def write_results(path, results):
+    """
+    Writes the status and timing of each command to a json file.
+
+    :param str path: Path of the file to write.
+    :param results: List of :class:`~result.CommandResult`.
+    """
+    failed = [result for result in results if not result.succeeded]
+    report = {
+        "created": time.time(),
+        "summary": {
+            "total": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "duration": sum(result.duration or 0.0 for result in results),
+        },
+        "results": [result.to_dict() for result in results],
+    }
+    with open(path, "w") as fh:
+        json.dump(report, fh, indent=2)
@@ -0,0 +1,287 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Time budgets and cooperative cancellation of commands.
+
+Every command runs with a :class:`CancellationToken`, which callbacks can get
+from :func:`current_token`, from the engine's ``cancellation_token`` property,
+or by declaring a keyword only ``cancellation_token`` parameter. Long running
+callbacks should check it regularly, for example with
+:meth:`CancellationToken.raise_if_cancelled` or by sleeping with
+:meth:`CancellationToken.wait`.
+
+When a command has a time budget, a watchdog cancels its token once the budget
+is spent. Callbacks running on the main thread are also interrupted, so a
+command that never checks its token doesn't hang the process.
+"""
+
+import _thread
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import signal
+import threading
+import time
+
+# Name of the keyword only parameter the token is passed as.
+TOKEN_PARAMETER = "cancellation_token"
+
+_current_token = contextvars.ContextVar("tk_shell_cancellation_token", default=None)
+
+
+class OperationCancelled(Exception):
+    """
+    Raised when a command notices it was cancelled.
+    """
+
+
+class CommandTimedOut(OperationCancelled):
+    """
+    Raised when a command notices it ran out of time.
+    """
+
+
+class CancellationToken(object):
+    """
+    Shared flag telling a command it should stop, along with its deadline.
+    """
+
+    def __init__(self, timeout=None):
+        """
+        :param float timeout: Time budget of the command in seconds, or None
+            for no limit.
+        """
+        self.timeout = timeout or None
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.timed_out = False
+        self.reason = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        """
+        True once the command was cancelled.
+        """
+        return self._event.is_set()
+
+    @property
+    def expired(self):
+        """
+        True once the deadline of the command has passed.
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self):
+        """
+        :returns: The number of seconds left before the deadline, or None if
+            there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason="The operation was cancelled.", timed_out=False):
+        """
+        Asks the command to stop.
+
+        :param str reason: Message reported for the cancellation.
+        :param bool timed_out: Whether the command ran out of time.
+        """
+        if self.cancelled:
+            return
+        self.reason = reason
+        self.timed_out = timed_out
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        Sleeps until the command is cancelled or the timeout elapses.
+
+        :returns: True if the command was cancelled.
+        """
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        """
+        :raises CommandTimedOut: If the command ran out of time.
+        :raises OperationCancelled: If the command was cancelled.
+        """
+        if not self.cancelled and self.expired:
+            self.cancel(_timed_out_message(self.timeout), timed_out=True)
+        if self.cancelled:
+            if self.timed_out:
+                raise CommandTimedOut(self.reason)
+            raise OperationCancelled(self.reason)
+
+
+def current_token():
+    """
+    :returns: The :class:`CancellationToken` of the command being run, or None
+        outside of a command.
+    """
+    return _current_token.get()
+
+
+def _timed_out_message(timeout, cmd_key=None):
+    """
+    :returns: The message reported when a command runs out of time.
+    """
+    if cmd_key:
+        return "Command %s exceeded its time budget of %s seconds." % (
+            cmd_key,
+            timeout,
+        )
+    return "The command exceeded its time budget of %s seconds." % timeout
+
+
+def _interrupt_main_thread():
+    """
+    Raises ``KeyboardInterrupt`` in the main thread, waking it up if it is
+    blocked in a system call.
+    """
+    if (
+        hasattr(signal, "pthread_kill")
+        and signal.getsignal(signal.SIGINT) is signal.default_int_handler
+    ):
+        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+    else:
+        _thread.interrupt_main()
+
+
+class Watchdog(object):
+    """
+    Cancels a command once its time budget is spent.
+    """
+
+    def __init__(self, engine, token, cmd_key=None, interrupt=False):
+        """
+        :param engine: The engine running the command, used for logging.
+        :param token: The :class:`CancellationToken` of the command.
+        :param str cmd_key: Name of the command, for reporting.
+        :param bool interrupt: Whether to interrupt the main thread as well.
+            Only set it when the command runs on the main thread.
+        """
+        self._engine = engine
+        self._token = token
+        self._cmd_key = cmd_key
+        self._interrupt = interrupt
+        self._timer = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        remaining = self._token.remaining()
+        if remaining is None:
+            return
+        self._timer = threading.Timer(remaining, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _expire(self):
+        with self._lock:
+            if self._stopped:
+                return
+            message = _timed_out_message(self._token.timeout, self._cmd_key)
+            self._engine.log_warning(message + " Cancelling it.")
+            self._token.cancel(message, timed_out=True)
+            if self._interrupt:
+                _interrupt_main_thread()
+
+
+@contextlib.contextmanager
+def activated(token):
+    """
+    Context manager making a token the current one.
+    """
+    reset_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset_token)
+
+
+@contextlib.contextmanager
+def deadline(engine, token, cmd_key=None):
+    """
+    Context manager running a command with a token, under a watchdog
+    enforcing the token's deadline.
+
+    An interruption caused by the watchdog is reported as
+    :class:`CommandTimedOut`.
+
+    :param engine: The engine running the command, used for logging.
+    :param token: The :class:`CancellationToken` of the command.
+    :param str cmd_key: Name of the command, for reporting.
+    """
+    watchdog = Watchdog(
+        engine,
+        token,
+        cmd_key,
+        interrupt=threading.current_thread() is threading.main_thread(),
+    )
+    with activated(token):
+        try:
+            watchdog.start()
+            try:
+                yield token
+            finally:
+                watchdog.stop()
+        except KeyboardInterrupt:
+            if token.timed_out:
+                raise CommandTimedOut(token.reason) from None
+            raise
+
+
+async def wait_for(coroutine, token, cmd_key=None):
+    """
+    Awaits a coroutine, cancelling it once the token's deadline passes.
+
+    :raises CommandTimedOut: If the deadline passed.
+    """
+    remaining = token.remaining()
+    with activated(token):
+        if remaining is None:
+            return await coroutine
+        try:
+            return await asyncio.wait_for(coroutine, remaining)
+        except asyncio.TimeoutError:
+            if not token.expired:
+                raise
+            token.cancel(_timed_out_message(token.timeout, cmd_key), timed_out=True)
+            raise CommandTimedOut(token.reason) from None
+
+
+def passing_token(callback):
+    """
+    Wraps a callback so the current token is passed to it as the
+    ``cancellation_token`` keyword argument.
+    """
+    if inspect.iscoroutinefunction(callback):
+
+        @functools.wraps(callback)
+        async def async_callback_with_token(*args):
+            return await callback(*args, cancellation_token=current_token())
+
+        return async_callback_with_token
+
+    @functools.wraps(callback)
+    def callback_with_token(*args):
+        return callback(*args, cancellation_token=current_token())
+
+    return callback_with_token
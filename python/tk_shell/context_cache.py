@@ -0,0 +1,137 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cache of the state resolved for the contexts an engine recently switched to.
+"""
+
+import collections
+import json
+import os
+
+
+def context_key(context):
+    """
+    Builds a hashable key identifying a context.
+
+    :param context: A toolkit context.
+
+    :returns: A string uniquely describing the context.
+    """
+    return json.dumps(context.to_dict(), sort_keys=True, default=str)
+
+
+def config_fingerprint(config_location):
+    """
+    Summarizes the state on disk of the environment files of a configuration,
+    so cached state can be discarded when the configuration changes.
+
+    :param str config_location: Path to the configuration's ``config`` folder.
+
+    :returns: A tuple of the number of environment files and their latest
+        modification time.
+    """
+    count = 0
+    latest = 0.0
+    for root, _, file_names in os.walk(os.path.join(config_location, "env")):
+        for file_name in file_names:
+            if not file_name.endswith(".yml"):
+                continue
+            count += 1
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, file_name)))
+            except OSError:
+                # the file went away while we were looking at it, which is
+                # a change on its own.
+                latest = float("inf")
+    return count, latest
+
+
+class ContextState(object):
+    """
+    State resolved by the engine for a context.
+    """
+
+    def __init__(self, env_name, fingerprint, apps, commands):
+        """
+        :param str env_name: Name of the environment the context resolves to.
+        :param fingerprint: Configuration fingerprint when the state was
+            resolved, see :func:`config_fingerprint`.
+        :param dict apps: The app instances, by instance name.
+        :param dict commands: The registered commands, by name.
+        """
+        self.env_name = env_name
+        self.fingerprint = fingerprint
+        self.apps = dict(apps)
+        self.commands = dict(commands)
+
+
+class ContextStateCache(object):
+    """
+    Least recently used cache of :class:`ContextState`, by context.
+    """
+
+    def __init__(self, max_entries):
+        """
+        :param int max_entries: Maximum number of contexts to keep state for.
+        """
+        self._max_entries = max_entries
+        self._states = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, context, fingerprint):
+        """
+        Returns the cached state of a context.
+
+        :param context: A toolkit context.
+        :param fingerprint: The current configuration fingerprint. Everything
+            cached is discarded if the configuration changed since.
+
+        :returns: A :class:`ContextState` or None.
+        """
+        key = context_key(context)
+        state = self._states.get(key)
+        if state is not None and state.fingerprint != fingerprint:
+            self.invalidate()
+            state = None
+
+        if state is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._states.move_to_end(key)
+        return state
+
+    def put(self, context, state):
+        """
+        Caches the state of a context, evicting the least recently used state
+        if the cache is full.
+        """
+        if self._max_entries <= 0:
+            return
+
+        key = context_key(context)
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self._max_entries:
+            self._states.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        """
+        Forgets all the cached state.
+        """
+        self._states.clear()
+
+    def __len__(self):
+        return len(self._states)
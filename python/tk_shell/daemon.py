@@ -0,0 +1,443 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Command server keeping a single initialized shell engine alive between
+invocations, and the client used to talk to it.
+
+The server listens on a Unix domain socket. Each connection carries one
+json encoded request on a single line::
+
+    {"action": "execute", "command": "cmd_key", "args": ["a", "b"]}
+
+and receives a stream of json lines back, one per log record emitted while
+the command runs and one per item produced by commands returning a generator,
+followed by a final ``result`` message.
+
+The client side only relies on the standard library so this file can be run
+directly as a script, without bootstrapping toolkit::
+
+    python daemon.py /tmp/tk-shell.sock cmd_key arg1 arg2
+"""
+
+import json
+import logging
+import os
+import socket
+import stat
+import sys
+
+ACTION_EXECUTE = "execute"
+ACTION_PING = "ping"
+ACTION_SHUTDOWN = "shutdown"
+
+
+def _send(wfile, message):
+    """
+    Writes a single json message to a socket file object.
+    """
+    wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+    wfile.flush()
+
+
+def _error(message):
+    """
+    Builds the result message of a request that could not be handled.
+    """
+    return {"type": "result", "status": "error", "error": message}
+
+
+def _serialize_value(value):
+    """
+    Makes sure a command return value can be sent back to the client.
+    """
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return repr(value)
+    return value
+
+
+class _StreamingLogHandler(logging.Handler):
+    """
+    Forwards log records to a connected client while a command runs.
+    """
+
+    def __init__(self, wfile):
+        logging.Handler.__init__(self)
+        self._wfile = wfile
+
+    def emit(self, record):
+        try:
+            _send(
+                self._wfile,
+                {
+                    "type": "log",
+                    "level": record.levelname,
+                    "message": self.format(record),
+                },
+            )
+        except (OSError, ValueError):
+            # The client went away, there is nobody left to log to.
+            pass
+
+
+class _StreamingItemWriter(object):
+    """
+    Forwards the items produced by a streamed command to a connected client.
+    """
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+
+    def write(self, item):
+        _send(self._wfile, {"type": "item", "value": _serialize_value(item)})
+
+
+class CommandServer(object):
+    """
+    Serves ``execute_command`` requests for an engine over a Unix domain
+    socket.
+
+    Requests are handled one at a time on the thread calling
+    :meth:`serve_forever`, which is expected to be the main thread so commands
+    run exactly as they would from the ``tank`` command. When QT is available,
+    a ``QApplication`` is created up front and its events are processed while
+    the server waits for requests, so dialogs opened by commands stay alive.
+    """
+
+    def __init__(self, engine, socket_path, poll_interval=0.1, request_timeout=5.0):
+        """
+        :param engine: The engine running the commands.
+        :param str socket_path: Path of the socket to listen on.
+        :param float poll_interval: How often, in seconds, to stop waiting for
+            a connection and process QT events.
+        :param float request_timeout: Number of seconds a client has to send
+            its request once connected, so an idle client can't hold up the
+            server.
+        """
+        self._engine = engine
+        self._socket_path = socket_path
+        self._poll_interval = poll_interval
+        self._request_timeout = request_timeout
+        self._running = False
+        self._qt_application = None
+
+    @property
+    def socket_path(self):
+        """
+        Path of the socket the server listens on.
+        """
+        return self._socket_path
+
+    def serve_forever(self):
+        """
+        Listens for requests until a shutdown request is received.
+        """
+        from tank import TankError
+
+        if not hasattr(socket, "AF_UNIX"):
+            raise TankError(
+                "The command server requires Unix domain socket support, which "
+                "is not available on this platform."
+            )
+
+        self._remove_stale_socket()
+        self._start_qt()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self._socket_path)
+            # Only the user running the engine may send it commands.
+            os.chmod(self._socket_path, stat.S_IRUSR | stat.S_IWUSR)
+            server.listen(5)
+            server.settimeout(self._poll_interval)
+
+            self._running = True
+            self._engine.log_info("Command server listening on %s" % self._socket_path)
+            while self._running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    self._process_events()
+                    continue
+
+                with connection:
+                    connection.settimeout(self._request_timeout)
+                    self._handle_connection(connection)
+        finally:
+            self._running = False
+            server.close()
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+            self._engine.log_info("Command server stopped.")
+
+    def shutdown(self):
+        """
+        Asks the server to stop after the current request.
+        """
+        self._running = False
+
+    def _remove_stale_socket(self):
+        """
+        Removes a socket file left behind by a server that didn't shut down
+        cleanly.
+        """
+        from tank import TankError
+
+        if not os.path.exists(self._socket_path):
+            return
+
+        if not stat.S_ISSOCK(os.stat(self._socket_path).st_mode):
+            raise TankError(
+                "Cannot start the command server, %s exists and is not a socket."
+                % self._socket_path
+            )
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self._socket_path)
+        except OSError:
+            os.unlink(self._socket_path)
+        else:
+            raise TankError(
+                "A command server is already listening on %s" % self._socket_path
+            )
+        finally:
+            probe.close()
+
+    def _start_qt(self):
+        """
+        Creates the QApplication that will live as long as the server, if QT
+        is available.
+        """
+        if not self._engine._has_qt:
+            return
+
+        self._qt_application, _ = self._engine._get_qt_application()
+
+    def _process_events(self):
+        """
+        Gives QT a chance to process its events between requests.
+        """
+        if self._qt_application is not None:
+            self._qt_application.processEvents()
+
+    def _handle_connection(self, connection):
+        """
+        Reads a request from a client and sends back the response.
+        """
+        rfile = connection.makefile("rb")
+        wfile = connection.makefile("wb")
+        try:
+            line = rfile.readline()
+            if not line:
+                return
+            # the request may take as long as it needs to run
+            connection.settimeout(None)
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                _send(wfile, _error("Invalid request."))
+                return
+
+            self._respond(request, wfile)
+        except OSError as e:
+            self._engine.log_debug("Lost connection to client: %s" % e)
+        except Exception as e:
+            # a bad request must never stop the server
+            self._engine.log_exception("Failed to handle request.")
+            try:
+                _send(wfile, _error(str(e)))
+            except (OSError, ValueError):
+                pass
+        finally:
+            rfile.close()
+            wfile.close()
+
+    def _respond(self, request, wfile):
+        """
+        Handles a decoded request and sends back the final response.
+        """
+        _send(wfile, self._handle_request(request, wfile))
+
+    def _handle_request(self, request, wfile):
+        """
+        Executes a request and builds the final response message.
+
+        :param dict request: The decoded request.
+        :param wfile: File object log records are streamed to.
+
+        :returns: The result message.
+        """
+        action = request.get("action", ACTION_EXECUTE)
+
+        if action == ACTION_PING:
+            return {"type": "result", "status": "success", "value": os.getpid()}
+
+        if action == ACTION_SHUTDOWN:
+            self.shutdown()
+            return {"type": "result", "status": "success", "value": None}
+
+        if action != ACTION_EXECUTE:
+            return _error("Unknown action '%s'." % action)
+
+        cmd_key = request.get("command")
+        args = request.get("args") or []
+        if not isinstance(cmd_key, str):
+            return _error("The command must be a string.")
+        if not isinstance(args, list):
+            return _error("The arguments must be a list.")
+
+        result = self._run_command(cmd_key, args, wfile)
+        response = {"type": "result", "value": _serialize_value(result.value)}
+        response.update(result.to_dict())
+        return response
+
+    def _run_command(self, cmd_key, args, wfile):
+        """
+        Runs a command, streaming what it logs to the client.
+
+        :returns: A :class:`~result.CommandResult` instance.
+        """
+        from tank import TankError
+
+        from .cancellation import CancellationToken
+        from .result import CommandResult, run_callback
+        from .streaming import consuming
+
+        handler = _StreamingLogHandler(wfile)
+        loggers = [logging.getLogger("sgtk"), self._engine._log]
+        for logger in loggers:
+            logger.addHandler(handler)
+
+        try:
+            try:
+                callback, args = self._engine._resolve_command(cmd_key, args)
+            except TankError as e:
+                return CommandResult.failed(cmd_key, args, e)
+
+            callback = consuming(callback, _StreamingItemWriter(wfile))
+            token = CancellationToken(self._engine._get_command_timeout(cmd_key))
+            with self._engine._command_scope(cmd_key):
+                result = run_callback(self._engine, callback, args, cmd_key, token)
+            self._record_result(result)
+            return result
+        finally:
+            for logger in loggers:
+                logger.removeHandler(handler)
+
+    def _record_result(self, result):
+        """
+        Records the outcome of a command in the engine metrics.
+
+        :param result: A :class:`~result.CommandResult` instance.
+        """
+        self._engine._metrics.record_result(result)
+
+
+def send_request(socket_path, request, log_stream=None, item_stream=None):
+    """
+    Sends a request to a command server and waits for its result.
+
+    :param str socket_path: Path of the server's socket.
+    :param dict request: The request to send.
+    :param log_stream: File object log messages from the server are written to
+        as they arrive. Defaults to ``sys.stderr``.
+    :param item_stream: File object the items streamed by the command are
+        written to as they arrive, one json document per line. Defaults to
+        ``sys.stdout``.
+
+    :returns: The result message sent back by the server.
+    """
+    log_stream = log_stream or sys.stderr
+    item_stream = item_stream or sys.stdout
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        rfile = client.makefile("rb")
+        wfile = client.makefile("wb")
+        _send(wfile, request)
+
+        for line in rfile:
+            message = json.loads(line.decode("utf-8"))
+            if message.get("type") == "log":
+                log_stream.write(message["message"] + "\n")
+                log_stream.flush()
+            elif message.get("type") == "item":
+                item_stream.write(json.dumps(message["value"]) + "\n")
+                item_stream.flush()
+            elif message.get("type") == "result":
+                return message
+    finally:
+        client.close()
+
+    raise RuntimeError("The command server closed the connection without a result.")
+
+
+def execute_command(socket_path, cmd_key, args, log_stream=None, item_stream=None):
+    """
+    Runs a command on a command server.
+
+    :returns: The result message sent back by the server.
+    """
+    return send_request(
+        socket_path,
+        {"action": ACTION_EXECUTE, "command": cmd_key, "args": list(args)},
+        log_stream,
+        item_stream,
+    )
+
+
+def main(argv=None):
+    """
+    Command line client for the command server.
+
+    :returns: The process exit code.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Runs a command on a running tk-shell command server."
+    )
+    parser.add_argument("socket", help="Path of the command server socket.")
+    parser.add_argument("command", nargs="?", help="Command to execute.")
+    parser.add_argument("args", nargs="*", help="Arguments for the command.")
+    parser.add_argument(
+        "--ping", action="store_true", help="Checks that the server is alive."
+    )
+    parser.add_argument(
+        "--shutdown", action="store_true", help="Stops the command server."
+    )
+    options = parser.parse_args(argv)
+
+    if options.ping:
+        response = send_request(options.socket, {"action": ACTION_PING})
+    elif options.shutdown:
+        response = send_request(options.socket, {"action": ACTION_SHUTDOWN})
+    elif options.command:
+        response = execute_command(options.socket, options.command, options.args)
+    else:
+        parser.error("A command is required.")
+
+    if response.get("status") != "success":
+        sys.stderr.write("%s\n" % response.get("error"))
+        return 1
+
+    if response.get("value") is not None:
+        sys.stdout.write("%s\n" % json.dumps(response["value"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Command dispatch index, so callbacks are only introspected once.
+"""
+
+import inspect
+import pathlib
+import typing
+
+import tank
+
+from .cancellation import TOKEN_PARAMETER
+
+_TRUE_STRINGS = ("1", "true", "yes", "on")
+_FALSE_STRINGS = ("0", "false", "no", "off")
+
+
+def _to_bool(value):
+    """
+    Converts a command line string to a boolean.
+    """
+    lowered = value.strip().lower()
+    if lowered in _TRUE_STRINGS:
+        return True
+    if lowered in _FALSE_STRINGS:
+        return False
+    raise ValueError("expected one of %s" % ", ".join(_TRUE_STRINGS + _FALSE_STRINGS))
+
+
+# Converters for the annotations command line strings get coerced to.
+_CONVERTERS = {
+    int: int,
+    float: float,
+    bool: _to_bool,
+    pathlib.Path: pathlib.Path,
+    pathlib.PurePath: pathlib.PurePath,
+}
+
+
+class CommandSignature(object):
+    """
+    Cached description of the positional arguments a command callback takes,
+    and of whether it takes a ``cancellation_token`` keyword only argument.
+    """
+
+    def __init__(self, callback):
+        """
+        :param callback: The command callback. For bound methods, the instance
+            argument is not part of the signature.
+        """
+        self.names = []
+        self.defaults = []
+        self.var_args = None
+        self.required = 0
+        self.accepts_token = False
+        self._converters = []
+        self._var_args_converter = None
+        self._introspected = True
+
+        try:
+            signature = inspect.signature(callback)
+        except (TypeError, ValueError):
+            # Some callables, like builtins, can't be introspected. Let them
+            # validate their own arguments.
+            self._introspected = False
+            return
+
+        try:
+            hints = typing.get_type_hints(callback)
+        except Exception:
+            hints = {}
+
+        for parameter in signature.parameters.values():
+            converter = _CONVERTERS.get(hints.get(parameter.name))
+            if parameter.kind in (
+                parameter.POSITIONAL_ONLY,
+                parameter.POSITIONAL_OR_KEYWORD,
+            ):
+                self.names.append(parameter.name)
+                self.defaults.append(parameter.default)
+                self._converters.append(converter)
+                if parameter.default is parameter.empty:
+                    self.required += 1
+            elif parameter.kind == parameter.VAR_POSITIONAL:
+                self.var_args = parameter.name
+                self._var_args_converter = converter
+            elif (
+                parameter.kind == parameter.KEYWORD_ONLY
+                and parameter.name == TOKEN_PARAMETER
+            ):
+                self.accepts_token = True
+
+    @property
+    def optional(self):
+        """
+        Number of positional arguments that have a default value.
+        """
+        return len(self.names) - self.required
+
+    def bind(self, args):
+        """
+        Validates the number of arguments and coerces the command line strings
+        to the annotated types.
+
+        :param list args: Arguments for the command.
+
+        :returns: The list of arguments to call the callback with.
+        :raises TankError: If the arguments don't match the signature.
+        """
+        if not self._introspected:
+            return list(args)
+
+        if len(args) < self.required or (
+            not self.var_args and len(args) > len(self.names)
+        ):
+            raise tank.TankError(
+                "Cannot run command! Expected command arguments (%s)"
+                % ", ".join(self._describe())
+            )
+
+        coerced = []
+        for index, value in enumerate(args):
+            if index < len(self.names):
+                name = self.names[index]
+                converter = self._converters[index]
+            else:
+                name = "*%s" % self.var_args
+                converter = self._var_args_converter
+            coerced.append(self._coerce(name, converter, value))
+        return coerced
+
+    def _coerce(self, name, converter, value):
+        """
+        Converts a single command line string.
+        """
+        if converter is None or not isinstance(value, str):
+            return value
+
+        try:
+            return converter(value)
+        except ValueError as e:
+            raise tank.TankError(
+                "Cannot run command! Invalid value %r for argument %s: %s"
+                % (value, name, e)
+            )
+
+    def _describe(self):
+        """
+        :returns: List of argument descriptions for error messages.
+        """
+        description = []
+        for name, default in zip(self.names, self.defaults):
+            if default is inspect.Parameter.empty:
+                description.append(name)
+            else:
+                description.append("%s=%r" % (name, default))
+        if self.var_args:
+            description.append("*%s" % self.var_args)
+        return description
+
+
+class DispatchIndex(object):
+    """
+    Maps command names to their callback and cached signature.
+
+    Entries are validated against the engine's current command table when
+    looked up, so a command registered again, for example after an app reload,
+    is introspected again.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def add(self, cmd_key, callback):
+        """
+        Indexes a command.
+
+        :returns: The :class:`CommandSignature` of the callback.
+        """
+        signature = CommandSignature(callback)
+        self._entries[cmd_key] = (callback, signature)
+        return signature
+
+    def get(self, cmd_key, callback):
+        """
+        Returns the signature of a command, indexing it if needed.
+
+        :param str cmd_key: Name of the command.
+        :param callback: The callback currently registered for the command.
+
+        :returns: The :class:`CommandSignature` of the callback.
+        """
+        entry = self._entries.get(cmd_key)
+        if entry is None or entry[0] is not callback:
+            return self.add(cmd_key, callback)
+        return entry[1]
+
+    def invalidate(self):
+        """
+        Forgets all the indexed commands.
+        """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,207 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Fan-out of a command across many contexts, in parallel worker processes.
+
+Targets are entities, listed in a json lines or json file::
+
+    {"type": "Shot", "id": 1234}
+    ["Shot", 1235]
+
+or on the command line as ``Shot:1234``.
+
+Contexts are resolved by the parent process. Workers are forked from it, so
+each one starts with the already initialized engine and its apps, and only
+switches it to the contexts it was handed.
+"""
+
+import json
+import logging
+import os
+import time
+
+import tank
+
+from .batch import run_entries
+from .forking import ensure_fork_supported
+from .pool import map_in_forked_processes, picklable
+from .result import CommandResult
+
+
+def parse_target(target):
+    """
+    Converts a target description into an entity dictionary.
+
+    :param target: A ``{"type": ..., "id": ...}`` dictionary, a
+        ``[type, id]`` list or a ``"type:id"`` string.
+
+    :returns: A ``{"type": str, "id": int}`` dictionary.
+    :raises TankError: If the target can't be parsed.
+    """
+    try:
+        if isinstance(target, dict):
+            entity_type, entity_id = target["type"], target["id"]
+        elif isinstance(target, (list, tuple)):
+            entity_type, entity_id = target
+        else:
+            entity_type, entity_id = str(target).rsplit(":", 1)
+        return {"type": entity_type, "id": int(entity_id)}
+    except (KeyError, TypeError, ValueError):
+        raise tank.TankError(
+            "Invalid fan-out target %r. Expected an entity type and id." % (target,)
+        )
+
+
+def load_targets(path):
+    """
+    Reads the targets listed in a file.
+
+    :param str path: Path to a ``.jsonl`` or ``.json`` file.
+
+    :returns: List of entity dictionaries.
+    :raises TankError: If the file cannot be read.
+    """
+    if not os.path.isfile(path):
+        raise tank.TankError("Fan-out targets file %s does not exist." % path)
+
+    try:
+        with open(path, "r") as fh:
+            if os.path.splitext(path)[1].lower() == ".json":
+                raw_targets = json.load(fh)
+            else:
+                raw_targets = [json.loads(line) for line in fh if line.strip()]
+    except ValueError as e:
+        raise tank.TankError("Cannot parse fan-out targets %s: %s" % (path, e))
+
+    if not isinstance(raw_targets, list):
+        raise tank.TankError("Fan-out targets %s must contain a list." % path)
+    return [parse_target(target) for target in raw_targets]
+
+
+class _LogCollector(logging.Handler):
+    """
+    Collects the messages logged while a command runs.
+    """
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append("%s: %s" % (record.levelname, self.format(record)))
+
+
+def run_for_contexts(engine, cmd_key, args, targets, max_workers):
+    """
+    Runs a command once for each target, in forked worker processes.
+
+    Failures are classified the same way as for batches, and the messages
+    logged by each run are collected along with its result.
+
+    :param engine: The engine running the command.
+    :param str cmd_key: Name of the command.
+    :param list args: Arguments for the command.
+    :param targets: List of entity dictionaries, see :func:`parse_target`.
+    :param int max_workers: Number of worker processes.
+
+    :returns: A json friendly report, see :func:`write_report`.
+    :raises TankError: If worker processes can't be forked on this platform.
+    """
+    ensure_fork_supported("Running a command across contexts")
+
+    started = time.time()
+    entries = []
+    for target in targets:
+        try:
+            context = engine.sgtk.context_from_entity(target["type"], target["id"])
+        except Exception as e:
+            context = None
+            engine.log_error("Cannot resolve the context of %s: %s" % (target, e))
+        entries.append((target, context))
+
+    states = map_in_forked_processes(
+        engine,
+        _run_forked_target,
+        [(cmd_key, list(args), context) for _, context in entries],
+        max(1, min(max_workers, len(entries))),
+        chunksize=max(1, len(entries) // (max_workers * 4)),
+    )
+
+    results = []
+    for (target, context), state in zip(entries, states):
+        state.update({"entity": target, "context": str(context) if context else None})
+        results.append(state)
+
+    failed = [result for result in results if result["status"] != "success"]
+    return {
+        "created": time.time(),
+        "command": cmd_key,
+        "args": [str(arg) for arg in args],
+        "summary": {
+            "total": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "duration": time.time() - started,
+        },
+        "results": results,
+    }
+
+
+def _run_forked_target(engine, target):
+    """
+    Runs the command for one target inside a forked worker process.
+
+    :param engine: The engine inherited by the worker.
+    :param tuple target: The command, its arguments and the context to run
+        it in.
+
+    :returns: The state of the command result, with the messages it logged.
+    """
+    cmd_key, args, context = target
+    if context is None:
+        result = CommandResult.failed(
+            cmd_key, args, "The context of the target could not be resolved."
+        )
+        return dict(result.to_dict(), logs=[])
+
+    collector = _LogCollector()
+    loggers = [logging.getLogger("sgtk"), engine._log]
+    for logger in loggers:
+        logger.addHandler(collector)
+
+    try:
+        try:
+            if engine.context != context:
+                engine.change_context(context)
+        except Exception as e:
+            result = CommandResult.failed(
+                cmd_key, args, "Cannot switch to context %s: %s" % (context, e)
+            )
+        else:
+            result = run_entries(engine, [(cmd_key, args)])[0]
+    finally:
+        for logger in loggers:
+            logger.removeHandler(collector)
+
+    return dict(
+        result.to_dict(), value=picklable(result.value), logs=collector.messages
+    )
+
+
+def write_report(path, report):
+    """
+    Writes a fan-out report to a json file.
+
+    :param str path: Path of the file to write.
+    :param dict report: Report returned by :func:`run_for_contexts`.
+    """
+    with open(path, "w") as fh:
+        json.dump(report, fh, indent=2, default=repr)
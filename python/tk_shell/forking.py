@@ -0,0 +1,62 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Support for running commands in processes forked from an initialized engine.
+"""
+
+import multiprocessing
+
+import tank
+
+
+def ensure_fork_supported(operation, alternative=None):
+    """
+    Makes sure processes can be forked on this platform.
+
+    :param str operation: What requires forking, for the error message.
+    :param str alternative: Optional suggestion added to the error message.
+
+    :raises TankError: If fork is not supported.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return
+
+    message = "%s requires fork, which is not supported on this platform." % operation
+    if alternative:
+        message = "%s %s" % (message, alternative)
+    raise tank.TankError(message)
+
+
+def reset_after_fork(engine):
+    """
+    Makes the engine state inherited from the parent process usable in a
+    forked child.
+
+    :param engine: The engine inherited from the parent process.
+    """
+    # the thread writing asynchronous log records only exists in the parent.
+    # Records queued by the child would never be written, and would block it
+    # once the queue is full, so log directly from the child.
+    pipeline = engine._log_pipeline
+    if pipeline is not None:
+        engine._log.removeHandler(pipeline.handler)
+        engine._log_pipeline = None
+        if engine._stream_handler is not None:
+            engine._log.addHandler(engine._stream_handler)
+
+    # the connection to Flow Production Tracking may be used by other
+    # processes at the same time. Force a new one to be opened.
+    try:
+        connection = engine.shotgun
+    except Exception:
+        return
+    if hasattr(connection, "_connection"):
+        connection._connection = None
@@ -0,0 +1,63 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Histograms of the latencies measured by the engine.
+"""
+
+import bisect
+import threading
+
+# Upper bounds of the latency buckets, in seconds.
+DEFAULT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram(object):
+    """
+    Thread safe histogram of durations, in fixed buckets.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        """
+        :param bounds: Sorted upper bounds of the buckets, in seconds. Values
+            above the last bound are counted in an extra bucket.
+        """
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        """
+        Adds a duration to the histogram.
+
+        :param float value: Duration in seconds.
+        """
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def to_dict(self):
+        """
+        :returns: A json friendly dictionary describing the histogram.
+        """
+        with self._lock:
+            return {
+                "bounds": list(self.bounds),
+                "counts": list(self.counts),
+                "count": self.count,
+                "sum": self.total,
+                "max": self.max,
+            }
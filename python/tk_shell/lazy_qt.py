@@ -0,0 +1,123 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Deferred QT bootstrap, so headless commands never pay for importing PySide.
+"""
+
+import importlib
+import importlib.util
+
+# Bindings the engine may end up using, in order of preference.
+QT_BINDINGS = ("PySide6", "PySide2")
+
+
+def is_qt_installed():
+    """
+    Checks if a QT binding can be imported, without importing it.
+
+    :returns: True if PySide6 or PySide2 can be found on the python path.
+    """
+    for binding in QT_BINDINGS:
+        try:
+            if importlib.util.find_spec(binding) is not None:
+                return True
+        except (ImportError, ValueError):
+            continue
+    return False
+
+
+class LazyQtModule(object):
+    """
+    Stands in for ``QtCore`` or ``QtGui`` until QT is bootstrapped.
+
+    The first attribute access asks the engine to import QT and then forwards
+    to the real module, so code doing ``from sgtk.platform.qt import QtGui``
+    before QT is loaded keeps working afterwards.
+    """
+
+    def __init__(self, engine, key):
+        """
+        :param engine: The engine in charge of bootstrapping QT.
+        :param str key: Key of the module in the engine's QT base, ``qt_core``
+            or ``qt_gui``.
+        """
+        self._engine = engine
+        self._key = key
+
+    def __getattr__(self, name):
+        return getattr(self._engine._bootstrap_qt()[self._key], name)
+
+    def __repr__(self):
+        return "<LazyQtModule %s>" % self._key
+
+
+def define_lazy_qt_base(engine):
+    """
+    Builds a QT base made of lazy modules.
+
+    :param engine: The engine in charge of bootstrapping QT.
+
+    :returns: A dictionary with the same keys as ``Engine._define_qt_base``.
+    """
+    return {
+        "qt_core": LazyQtModule(engine, "qt_core"),
+        "qt_gui": LazyQtModule(engine, "qt_gui"),
+        "dialog_base": None,
+    }
+
+
+def define_lazy_shim_base(engine, shim_name):
+    """
+    Builds a base for toolkit's ``qt5`` or ``qt6`` shim module made of a module
+    level ``__getattr__``. The first attribute access, for example through
+    ``from sgtk.platform.qt5 import QtWidgets``, asks the engine to import QT,
+    which fills the shim with the real modules.
+
+    :param engine: The engine in charge of bootstrapping QT.
+    :param str shim_name: ``qt5`` or ``qt6``.
+
+    :returns: A dictionary of the attributes to set on the shim module.
+    """
+
+    def __getattr__(name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        engine._bootstrap_qt()
+        shim = importlib.import_module("tank.platform." + shim_name)
+        if shim.__dict__.get("__getattr__") is __getattr__:
+            raise AttributeError(
+                "module %r has no attribute %r" % (shim.__name__, name)
+            )
+        return getattr(shim, name)
+
+    __getattr__.lazy_qt_engine = engine
+    return {"__getattr__": __getattr__}
+
+
+def remove_lazy_qt(engine):
+    """
+    Removes the lazy modules and shim ``__getattr__`` functions an engine
+    installed in toolkit's QT modules, so they don't bootstrap QT for that
+    engine once it is destroyed.
+
+    :param engine: The engine that installed them.
+    """
+    qt = importlib.import_module("tank.platform.qt")
+    for name in ("QtCore", "QtGui"):
+        module = getattr(qt, name, None)
+        if isinstance(module, LazyQtModule) and module._engine is engine:
+            setattr(qt, name, None)
+
+    for shim_name in ("qt5", "qt6"):
+        shim = importlib.import_module("tank.platform." + shim_name)
+        function = shim.__dict__.get("__getattr__")
+        if getattr(function, "lazy_qt_engine", None) is engine:
+            del shim.__getattr__
@@ -0,0 +1,190 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Rate limiting of the log messages of apps logging in tight loops, like once
+per file or per frame.
+
+Messages are grouped by template: the message before formatting or, for
+messages formatted by the caller, the message with its numbers masked, so
+``Published frame 1001`` and ``Published frame 1002`` share a limit.
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+
+# Attribute flagging the records emitted by the filter itself.
+_SUMMARY_ATTRIBUTE = "tk_shell_log_summary"
+
+# Maximum number of templates the filter keeps rate limits for. The oldest
+# ones are forgotten first.
+_MAX_TEMPLATES = 1024
+
+_NUMBERS = re.compile(r"\d+")
+
+
+def message_template(record):
+    """
+    :param record: A ``logging.LogRecord``.
+
+    :returns: The template the message of a record was built from.
+    """
+    if record.args:
+        return str(record.msg)
+    return _NUMBERS.sub("#", str(record.msg))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter of a logger limiting the rate of the messages built from the same
+    template, with a token bucket per template, and collapsing consecutive
+    identical messages into a "last message repeated N times" message.
+
+    Errors and critical messages are never rate limited.
+    """
+
+    def __init__(
+        self,
+        logger,
+        rate=0.0,
+        burst=10,
+        collapse_repeats=False,
+        max_level=logging.WARNING,
+    ):
+        """
+        :param logger: The ``logging.Logger`` the filter is added to, which
+            summaries of collapsed messages are logged to.
+        :param float rate: Number of messages per second allowed for each
+            template, once the burst is spent. When 0, messages are not rate
+            limited.
+        :param int burst: Number of messages of a template allowed at once.
+        :param bool collapse_repeats: Whether to collapse consecutive identical
+            messages.
+        :param int max_level: Highest level of the messages rate limited.
+        """
+        logging.Filter.__init__(self)
+        self._logger = logger
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._collapse_repeats = collapse_repeats
+        self._max_level = max_level
+        # template -> [tokens, last refill, suppressed since last message]
+        self._buckets = collections.OrderedDict()
+        self._last_message = None
+        self._repeats = 0
+        self._lock = threading.RLock()
+
+        self.rate_limited = collections.Counter()
+        self.collapsed = 0
+
+    def filter(self, record):
+        """
+        :returns: False if the record must be dropped.
+        """
+        if getattr(record, _SUMMARY_ATTRIBUTE, False):
+            return True
+
+        with self._lock:
+            if self._collapse_repeats:
+                message = (record.levelno, record.getMessage())
+                if message == self._last_message:
+                    self._repeats += 1
+                    self.collapsed += 1
+                    return False
+
+            if self._rate > 0 and record.levelno <= self._max_level:
+                if not self._take_token(record):
+                    return False
+
+            if self._collapse_repeats:
+                self._flush_repeats()
+                self._last_message = message
+        return True
+
+    def flush(self):
+        """
+        Logs the number of times the last message was repeated, if it was.
+        """
+        with self._lock:
+            self._flush_repeats()
+            self._last_message = None
+
+    def report(self):
+        """
+        :returns: A json friendly dictionary of the number of messages
+            dropped, with the most rate limited templates.
+        """
+        with self._lock:
+            return {
+                "collapsed": self.collapsed,
+                "rate_limited": sum(self.rate_limited.values()),
+                "top_rate_limited": [
+                    {"template": template, "count": count}
+                    for template, count in self.rate_limited.most_common(10)
+                ],
+            }
+
+    def _take_token(self, record):
+        """
+        Takes a token from the bucket of the record's template. The lock must
+        be held.
+
+        :returns: False if the bucket is empty and the record must be dropped.
+        """
+        template = message_template(record)
+        now = time.monotonic()
+        bucket = self._buckets.get(template)
+        if bucket is None:
+            bucket = self._buckets[template] = [float(self._burst), now, 0]
+            if len(self._buckets) > _MAX_TEMPLATES:
+                self._buckets.popitem(last=False)
+
+        tokens = min(self._burst, bucket[0] + (now - bucket[1]) * self._rate)
+        bucket[1] = now
+        if tokens < 1.0:
+            bucket[0] = tokens
+            bucket[2] += 1
+            self.rate_limited[template] += 1
+            return False
+
+        bucket[0] = tokens - 1.0
+        if bucket[2]:
+            # let readers know what they missed
+            record.msg = "%s (%d similar messages suppressed)" % (
+                record.getMessage(),
+                bucket[2],
+            )
+            record.args = None
+            bucket[2] = 0
+        return True
+
+    def _flush_repeats(self):
+        """
+        Logs the number of times the last message was repeated. The lock must
+        be held.
+        """
+        if not self._repeats:
+            return
+
+        summary = logging.LogRecord(
+            self._logger.name,
+            self._last_message[0],
+            __file__,
+            0,
+            "Last message repeated %d times." % self._repeats,
+            None,
+            None,
+        )
+        setattr(summary, _SUMMARY_ATTRIBUTE, True)
+        self._repeats = 0
+        self._logger.handle(summary)
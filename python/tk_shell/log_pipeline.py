@@ -0,0 +1,185 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Asynchronous logging, so writing to a slow terminal or pipe doesn't stall the
+code emitting log records.
+"""
+
+import logging
+import logging.handlers
+import queue
+import threading
+
+import tank
+
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_NEW = "drop_new"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST)
+
+# Put on the queue to stop the listener thread.
+_STOP = object()
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler applying the pipeline's overflow policy when the queue is
+    full.
+    """
+
+    def __init__(self, pipeline):
+        logging.handlers.QueueHandler.__init__(self, pipeline._queue)
+        self._pipeline = pipeline
+
+    def enqueue(self, record):
+        self._pipeline._enqueue(record)
+
+
+class AsyncLogPipeline(object):
+    """
+    Hands log records over to a background thread writing them to a set of
+    sinks.
+
+    Records are queued by :attr:`handler` on the calling thread. The background
+    thread takes them off the queue in batches, passes each one to the sinks
+    and flushes the sinks once per batch.
+    """
+
+    def __init__(
+        self,
+        sinks,
+        max_queue_size=10000,
+        overflow_policy=OVERFLOW_BLOCK,
+        batch_size=100,
+    ):
+        """
+        :param sinks: List of ``logging.Handler`` records are written to.
+        :param int max_queue_size: Maximum number of records waiting to be
+            written.
+        :param str overflow_policy: What to do with a record when the queue is
+            full. ``block`` waits for room, ``drop_new`` discards the record
+            and ``drop_oldest`` discards the oldest queued record.
+        :param int batch_size: Maximum number of records written between two
+            flushes of the sinks.
+        :raises TankError: If the overflow policy is not supported.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise tank.TankError(
+                "Unknown log overflow policy '%s'. Expected one of %s."
+                % (overflow_policy, ", ".join(OVERFLOW_POLICIES))
+            )
+
+        self._sinks = list(sinks)
+        self._queue = queue.Queue(max_queue_size)
+        self._overflow_policy = overflow_policy
+        self._batch_size = batch_size
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self.handler = _BoundedQueueHandler(self)
+
+    def start(self):
+        """
+        Starts the background thread writing the records.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="tk-shell-log-pipeline", daemon=True
+        )
+        self._thread.start()
+
+    def flush(self):
+        """
+        Blocks until all the records queued so far have been written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def stop(self):
+        """
+        Writes the remaining records, stops the background thread and closes
+        the sinks.
+        """
+        if self._thread is None:
+            return
+
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+        if self.dropped:
+            # the pipeline is down, so report straight to the sinks
+            record = logging.makeLogRecord(
+                {
+                    "msg": "%d log records were dropped because the log queue "
+                    "was full." % self.dropped,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                }
+            )
+            for sink in self._sinks:
+                sink.handle(record)
+
+        for sink in self._sinks:
+            sink.close()
+
+    def _enqueue(self, record):
+        """
+        Queues a record according to the overflow policy.
+        """
+        if self._overflow_policy == OVERFLOW_BLOCK:
+            self._queue.put(record)
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(record)
+                return
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                if self._overflow_policy == OVERFLOW_DROP_NEW:
+                    return
+
+            # make room by discarding the oldest record
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                pass
+
+    def _run(self):
+        """
+        Body of the background thread.
+        """
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is _STOP:
+                    stopping = True
+                    continue
+                for sink in self._sinks:
+                    if record.levelno >= sink.level:
+                        sink.handle(record)
+
+            for sink in self._sinks:
+                sink.flush()
+
+            for _ in batch:
+                self._queue.task_done()
@@ -0,0 +1,264 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+In-process metrics of the commands run by the engine: invocations, outcomes
+and latencies, by command.
+
+They can be exported as a Prometheus textfile, for the node exporter's
+textfile collector, or as json.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+import tank
+
+from .histogram import LatencyHistogram
+from .result import CommandResult, status_of
+
+FORMAT_PROMETHEUS = "prometheus"
+FORMAT_JSON = "json"
+FORMATS = (FORMAT_PROMETHEUS, FORMAT_JSON)
+
+
+class _CommandMetrics(object):
+    """
+    Counters and latency histogram of a single command.
+    """
+
+    def __init__(self):
+        self.statuses = collections.Counter()
+        self.latency = LatencyHistogram()
+
+
+class MetricsRegistry(object):
+    """
+    Thread safe registry of the metrics of each command.
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def record(self, cmd_key, status, duration):
+        """
+        Records the outcome of a command invocation.
+
+        :param str cmd_key: Name of the command.
+        :param str status: One of the :class:`~result.CommandResult` statuses.
+        :param float duration: Duration of the command in seconds, or None if
+            it is unknown.
+        """
+        with self._lock:
+            metrics = self._commands.get(cmd_key)
+            if metrics is None:
+                metrics = self._commands[cmd_key] = _CommandMetrics()
+            metrics.statuses[status] += 1
+        if duration is not None:
+            metrics.latency.record(duration)
+
+    def record_result(self, result):
+        """
+        Records the outcome of a command invocation.
+
+        :param result: A :class:`~result.CommandResult` instance.
+        """
+        if result.status is not None:
+            self.record(result.cmd_key, result.status, result.duration)
+
+    @contextlib.contextmanager
+    def measure(self, cmd_key):
+        """
+        Context manager recording the outcome and duration of the command
+        invocation it wraps. Errors are classified, then propagated.
+
+        :param str cmd_key: Name of the command.
+        """
+        started = time.time()
+        try:
+            yield
+        except BaseException as e:
+            self.record(cmd_key, status_of(e), time.time() - started)
+            raise
+        self.record(cmd_key, CommandResult.SUCCESS, time.time() - started)
+
+    def to_dict(self):
+        """
+        :returns: A json friendly dictionary of the metrics of each command.
+        """
+        with self._lock:
+            commands = [
+                (cmd_key, dict(metrics.statuses), metrics.latency)
+                for cmd_key, metrics in sorted(self._commands.items())
+            ]
+        return {
+            "created": time.time(),
+            "started": self.started,
+            "commands": {
+                cmd_key: {
+                    "invocations": sum(statuses.values()),
+                    "statuses": statuses,
+                    "latency": latency.to_dict(),
+                }
+                for cmd_key, statuses, latency in commands
+            },
+        }
+
+    def to_prometheus(self):
+        """
+        :returns: The metrics in the Prometheus text exposition format.
+        """
+        commands = self.to_dict()["commands"]
+        lines = [
+            "# HELP tk_shell_command_invocations_total Number of command "
+            "invocations.",
+            "# TYPE tk_shell_command_invocations_total counter",
+        ]
+        for cmd_key, metrics in commands.items():
+            lines.append(
+                "tk_shell_command_invocations_total{%s} %d"
+                % (_labels(command=cmd_key), metrics["invocations"])
+            )
+
+        lines.extend(
+            [
+                "# HELP tk_shell_command_results_total Number of command "
+                "invocations, by outcome.",
+                "# TYPE tk_shell_command_results_total counter",
+            ]
+        )
+        for cmd_key, metrics in commands.items():
+            for status, count in sorted(metrics["statuses"].items()):
+                lines.append(
+                    "tk_shell_command_results_total{%s} %d"
+                    % (_labels(command=cmd_key, status=status), count)
+                )
+
+        lines.extend(
+            [
+                "# HELP tk_shell_command_duration_seconds Duration of command "
+                "invocations.",
+                "# TYPE tk_shell_command_duration_seconds histogram",
+            ]
+        )
+        for cmd_key, metrics in commands.items():
+            latency = metrics["latency"]
+            cumulative = 0
+            bounds = ["%g" % bound for bound in latency["bounds"]] + ["+Inf"]
+            for bound, count in zip(bounds, latency["counts"]):
+                cumulative += count
+                lines.append(
+                    "tk_shell_command_duration_seconds_bucket{%s} %d"
+                    % (_labels(command=cmd_key, le=bound), cumulative)
+                )
+            lines.append(
+                "tk_shell_command_duration_seconds_sum{%s} %r"
+                % (_labels(command=cmd_key), latency["sum"])
+            )
+            lines.append(
+                "tk_shell_command_duration_seconds_count{%s} %d"
+                % (_labels(command=cmd_key), latency["count"])
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    """
+    :returns: Prometheus labels, with their values escaped.
+    """
+    escaped = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped.append('%s="%s"' % (name, value.replace("\n", "\\n")))
+    return ",".join(escaped)
+
+
+class MetricsExporter(object):
+    """
+    Writes the metrics of a registry to a file, at regular intervals from a
+    background thread, and on demand.
+    """
+
+    def __init__(self, registry, path, format=FORMAT_PROMETHEUS, interval=0.0):
+        """
+        :param registry: The :class:`MetricsRegistry` to export.
+        :param str path: Path of the file to write.
+        :param str format: ``prometheus`` or ``json``.
+        :param float interval: Number of seconds between two exports. When 0,
+            metrics are only exported on demand.
+
+        :raises TankError: If the format is not supported.
+        """
+        if format not in FORMATS:
+            raise tank.TankError(
+                "Unknown metrics format '%s'. Expected one of %s."
+                % (format, ", ".join(FORMATS))
+            )
+        self._registry = registry
+        self._path = path
+        self._format = format
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts exporting at regular intervals, if an interval was given.
+        """
+        if self._interval <= 0 or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="tk-shell-metrics", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops exporting at regular intervals, then exports a last time.
+        """
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.export()
+
+    def export(self):
+        """
+        Writes the metrics to the file.
+        """
+        if self._format == FORMAT_JSON:
+            data = json.dumps(self._registry.to_dict(), indent=2)
+        else:
+            data = self._registry.to_prometheus()
+
+        folder = os.path.dirname(self._path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        # collectors must never read a partially written file
+        temp_path = "%s.%d.tmp" % (self._path, os.getpid())
+        with open(temp_path, "w") as fh:
+            fh.write(data)
+        os.replace(temp_path, self._path)
+
+    def _run(self):
+        """
+        Body of the export thread.
+        """
+        while not self._stopped.wait(self._interval):
+            self.export()
@@ -0,0 +1,142 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import threading
+
+from tank.platform.qt import QtCore
+
+from .result import run_callback
+from .streaming import is_stream
+from .task import Task
+
+
+class _Call(object):
+    """
+    A function call to run on the main thread, and its outcome.
+    """
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.error = None
+
+
+class MainThreadInvoker(QtCore.QObject):
+    """
+    Runs functions on the main thread on behalf of worker threads.
+
+    It must be created on the main thread.
+    """
+
+    _invoke = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self._invoke.connect(self._run, QtCore.Qt.BlockingQueuedConnection)
+
+    @staticmethod
+    def is_main_thread():
+        return threading.current_thread() is threading.main_thread()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls a function on the main thread and waits for it to return.
+
+        :returns: The value returned by the function.
+        """
+        if self.is_main_thread():
+            return func(*args, **kwargs)
+
+        call = _Call(func, args, kwargs)
+        self._invoke.emit(call)
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def _run(self, call):
+        try:
+            call.value = call.func(*call.args, **call.kwargs)
+        except Exception as e:
+            call.error = e
+
+
+class OffloadedTask(Task):
+    """
+    Runs a command callback on a worker thread, so the QT event loop keeps
+    processing events, and windows stay responsive, while it runs.
+
+    Dialogs the callback shows through the engine are created on the main
+    thread by a :class:`MainThreadInvoker`. Items of streamed commands are
+    pulled on the worker thread as well.
+    """
+
+    # emitted from the worker thread once the callback is done
+    _done = QtCore.Signal()
+
+    def __init__(self, engine, callback, args, cmd_key=None, timeout=None):
+        Task.__init__(self, engine, callback, args, cmd_key, timeout)
+        self._done.connect(self._on_done, QtCore.Qt.QueuedConnection)
+        self._thread = None
+        # guards the result against the deadline, which runs on the main
+        # thread.
+        self._lock = threading.Lock()
+
+    def run_command(self):
+        remaining = self.cancellation_token.remaining()
+        if remaining is not None:
+            QtCore.QTimer.singleShot(int(remaining * 1000), self._on_deadline)
+
+        self._thread = threading.Thread(
+            target=self._run, name="tk-shell-command-%s" % self._cmd_key, daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        """
+        Body of the worker thread.
+        """
+        try:
+            # execute the callback, errors are logged and classified
+            result = run_callback(
+                self._engine,
+                self._callback,
+                self._args,
+                self._cmd_key,
+                self.cancellation_token,
+            )
+            with self._lock:
+                if self.is_complete:
+                    # the deadline passed, the timeout was reported already
+                    return
+                self.result = result
+                streaming = result.succeeded and is_stream(result.value)
+                if streaming:
+                    self._items = result.value
+                    result.value = 0
+            if streaming:
+                while not self.is_complete and not self._pull_next_item():
+                    pass
+        finally:
+            self._done.emit()
+
+    def _on_deadline(self):
+        with self._lock:
+            Task._on_deadline(self)
+
+    def _close_items(self):
+        # the items are pulled by the worker thread, which stops once the
+        # task is complete.
+        pass
+
+    def _on_done(self):
+        if not self.is_complete:
+            self._complete()
@@ -0,0 +1,196 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Concurrent execution of independent, non UI commands.
+
+Threads suit commands spending their time waiting on I/O, like Flow
+Production Tracking API calls. Processes suit CPU bound commands. Processes
+are forked from the current one so they inherit the initialized engine and
+its apps, which means they are only available on platforms supporting
+``fork``.
+"""
+
+import concurrent.futures
+import functools
+import multiprocessing
+import pickle
+import sys
+
+import tank
+
+from .batch import run_entries
+from .forking import ensure_fork_supported, reset_after_fork
+from .result import CommandResult
+
+THREAD_EXECUTOR = "thread"
+PROCESS_EXECUTOR = "process"
+EXECUTORS = (THREAD_EXECUTOR, PROCESS_EXECUTOR)
+
+# State inherited by forked worker processes. Set right before the pool is
+# created and cleared once it is done.
+_forked_engine = None
+_forked_function = None
+_forked_items = None
+
+
+def run_entries_concurrently(
+    engine, entries, max_workers, executor=THREAD_EXECUTOR, writer=None
+):
+    """
+    Runs commands concurrently, collecting their results.
+
+    Errors are classified the same way as when running commands one after the
+    other, and results are reported in the order of ``entries`` regardless of
+    the order in which commands complete.
+
+    :param engine: The engine running the commands.
+    :param entries: List of ``(cmd_key, args)`` tuples.
+    :param int max_workers: Maximum number of commands running at once.
+    :param str executor: Either ``thread`` or ``process``.
+    :param writer: Optional :class:`~streaming.StreamWriter` the items of
+        commands returning a generator or an iterator are streamed to.
+
+    :returns: List of :class:`~result.CommandResult`, in the order of ``entries``.
+    :raises TankError: If the executor is not supported.
+    """
+    if executor not in EXECUTORS:
+        raise tank.TankError(
+            "Unknown command executor '%s'. Expected one of %s."
+            % (executor, ", ".join(EXECUTORS))
+        )
+
+    entries = list(entries)
+    if executor == THREAD_EXECUTOR:
+        return _run_in_threads(engine, entries, max_workers, writer)
+    return _run_in_processes(engine, entries, max_workers, writer)
+
+
+def _run_in_threads(engine, entries, max_workers, writer):
+    """
+    Runs commands on a thread pool.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(run_entries, engine, [entry], writer) for entry in entries
+        ]
+        return [future.result()[0] for future in futures]
+
+
+def _run_in_processes(engine, entries, max_workers, writer):
+    """
+    Runs commands on a pool of forked processes.
+    """
+    ensure_fork_supported(
+        "Running commands in separate processes", "Use the thread executor instead."
+    )
+
+    states = map_in_forked_processes(
+        engine,
+        functools.partial(_run_forked_entry, writer=writer),
+        entries,
+        max_workers,
+    )
+
+    results = []
+    for (cmd_key, args), state in zip(entries, states):
+        result = CommandResult(cmd_key, args)
+        result.__dict__.update(state)
+        results.append(result)
+    return results
+
+
+def _run_forked_entry(engine, entry, writer):
+    """
+    Runs a command inside a forked worker process.
+
+    :returns: The state of the command result, minus anything that can't be
+        sent back to the parent process.
+    """
+    result = run_entries(engine, [entry], writer)[0]
+    state = dict(result.__dict__)
+    del state["cmd_key"]
+    del state["args"]
+    state["value"] = picklable(state["value"])
+    return state
+
+
+def map_in_forked_processes(engine, function, items, max_workers, chunksize=1):
+    """
+    Calls a function for each item, in a pool of worker processes forked from
+    the current one, which inherit the initialized engine and its apps.
+
+    The function and the items are inherited by the workers as well, only the
+    values returned by the function are sent back, so they must be picklable.
+    Callers must check that fork is supported first, see
+    :func:`~forking.ensure_fork_supported`.
+
+    :param engine: The engine, prepared for running commands in each worker.
+    :param function: Function called in the workers with the engine and an
+        item.
+    :param items: List of items.
+    :param int max_workers: Number of worker processes.
+    :param int chunksize: Number of items handed to a worker at once.
+
+    :returns: List of the values returned by the function, in the order of
+        ``items``.
+    """
+    global _forked_engine, _forked_function, _forked_items
+
+    # flush what the parent wrote so far, or workers writing to the same
+    # streams would write it again
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    _forked_engine = engine
+    _forked_function = function
+    _forked_items = list(items)
+    try:
+        context = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=context, initializer=_init_worker
+        ) as pool:
+            return list(
+                pool.map(
+                    _run_forked_item, range(len(_forked_items)), chunksize=chunksize
+                )
+            )
+    finally:
+        _forked_engine = None
+        _forked_function = None
+        _forked_items = None
+
+
+def picklable(value):
+    """
+    :returns: The value if it can be sent back from a worker process, its
+        representation otherwise.
+    """
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return repr(value)
+    return value
+
+
+def _init_worker():
+    """
+    Prepares a freshly forked worker process.
+    """
+    reset_after_fork(_forked_engine)
+
+
+def _run_forked_item(index):
+    """
+    Calls the function being mapped inside a forked worker process.
+
+    :param int index: Index of the item to call it with.
+    """
+    return _forked_function(_forked_engine, _forked_items[index])
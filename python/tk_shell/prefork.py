@@ -0,0 +1,189 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Command server running each request in a child process forked from an
+initialized engine.
+
+Children share the modules and app state loaded by the parent copy-on-write,
+so they start in no time, and whatever a command changes dies with its child.
+Clients talk to it exactly like to the regular command server.
+
+Children send the outcome of their command back to the server over a pipe, so
+it is recorded in the metrics of the engine serving the requests.
+"""
+
+import errno
+import json
+import os
+import sys
+
+from .daemon import ACTION_EXECUTE, CommandServer
+from .forking import ensure_fork_supported, reset_after_fork
+
+
+class PreforkCommandServer(CommandServer):
+    """
+    Serves ``execute_command`` requests, each one in its own forked process.
+
+    No ``QApplication`` is created, since QT doesn't survive a fork, so only
+    commands that don't need a UI can be served.
+    """
+
+    def __init__(
+        self,
+        engine,
+        socket_path,
+        poll_interval=0.1,
+        max_children=8,
+        request_timeout=5.0,
+    ):
+        """
+        :param engine: The engine running the commands.
+        :param str socket_path: Path of the socket to listen on.
+        :param float poll_interval: How often, in seconds, to stop waiting for
+            a connection and reap the children that exited.
+        :param int max_children: Maximum number of requests running at once.
+        :param float request_timeout: Number of seconds a client has to send
+            its request once connected.
+        """
+        CommandServer.__init__(
+            self, engine, socket_path, poll_interval, request_timeout
+        )
+        self._max_children = max(1, max_children)
+        # pid of each running child -> read end of its result pipe
+        self._children = {}
+        # write end of the result pipe, in children
+        self._result_pipe = None
+
+    def serve_forever(self):
+        """
+        Listens for requests until a shutdown request is received, then waits
+        for the requests still running.
+        """
+        ensure_fork_supported("The prefork command server")
+
+        try:
+            CommandServer.serve_forever(self)
+        finally:
+            while self._children:
+                self._reap(block=True)
+
+    def _start_qt(self):
+        # the QT event loop and its widgets can't be shared with forked
+        # children.
+        pass
+
+    def _process_events(self):
+        self._reap(block=False)
+
+    def _respond(self, request, wfile):
+        """
+        Forks a child to handle execute requests. Other requests are handled
+        by the server itself.
+        """
+        if request.get("action", ACTION_EXECUTE) != ACTION_EXECUTE:
+            CommandServer._respond(self, request, wfile)
+            return
+
+        while len(self._children) >= self._max_children:
+            self._reap(block=True)
+
+        # flush what the parent wrote so far, or children would write it again
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid:
+            os.close(write_fd)
+            self._children[pid] = read_fd
+            return
+
+        exit_code = 0
+        try:
+            os.close(read_fd)
+            self._result_pipe = write_fd
+            reset_after_fork(self._engine)
+            CommandServer._respond(self, request, wfile)
+            wfile.flush()
+        except BaseException:
+            exit_code = 1
+        finally:
+            # skip the cleanup registered by the parent, like removing the
+            # socket, and exit right away.
+            os._exit(exit_code)
+
+    def _record_result(self, result):
+        if self._result_pipe is None:
+            CommandServer._record_result(self, result)
+            return
+
+        # the metrics of the child die with it, the server records them.
+        message = {
+            "cmd_key": result.cmd_key,
+            "status": result.status,
+            "duration": result.duration,
+        }
+        os.write(self._result_pipe, json.dumps(message).encode("utf-8"))
+
+    def _record_child_result(self, read_fd):
+        """
+        Records the outcome of the command of a child that exited, if it sent
+        one.
+
+        :param int read_fd: Read end of the child's result pipe.
+        """
+        try:
+            data = b"".join(iter(lambda: os.read(read_fd, 4096), b""))
+        finally:
+            os.close(read_fd)
+
+        if not data:
+            return
+        try:
+            message = json.loads(data.decode("utf-8"))
+        except ValueError:
+            self._engine.log_debug("Invalid result sent by a child: %r" % data)
+            return
+        if message.get("status") is not None:
+            self._engine._metrics.record(
+                message["cmd_key"], message["status"], message["duration"]
+            )
+
+    def _reap(self, block):
+        """
+        Collects the exit status of the children that exited.
+
+        :param bool block: Whether to wait for at least one child to exit.
+        """
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except OSError as e:
+                if e.errno != errno.ECHILD:
+                    raise
+                for read_fd in self._children.values():
+                    os.close(read_fd)
+                self._children.clear()
+                return
+
+            if pid == 0:
+                return
+
+            read_fd = self._children.pop(pid, None)
+            if read_fd is not None:
+                self._record_child_result(read_fd)
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status):
+                self._engine.log_warning(
+                    "Command process %d exited with status %d."
+                    % (pid, os.WEXITSTATUS(status))
+                )
+            block = False
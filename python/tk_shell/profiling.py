@@ -0,0 +1,257 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Opt-in instrumentation of the time spent executing a command.
+
+Profiling is configured with a comma separated list of modes:
+
+- ``timing`` (or ``1``) records wall and CPU time for each phase of the
+  command execution.
+- ``cprofile`` also runs the command callback under ``cProfile`` and dumps a
+  ``.pstats`` file.
+- ``tracemalloc`` also traces memory allocations made by the callback and
+  dumps a report of the top allocation sites.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import re
+import time
+import tracemalloc
+
+MODE_TIMING = "timing"
+MODE_CPROFILE = "cprofile"
+MODE_TRACEMALLOC = "tracemalloc"
+
+
+def parse_modes(value):
+    """
+    Parses a profiling configuration string.
+
+    :param str value: Comma separated list of modes.
+
+    :returns: Set of enabled modes, empty if profiling is disabled.
+    """
+    modes = set()
+    for token in (value or "").split(","):
+        token = token.strip().lower()
+        if not token or token in ("0", "false", "no", "off"):
+            continue
+        if token in ("1", "true", "yes", "on"):
+            token = MODE_TIMING
+        modes.add(token)
+
+    if modes:
+        # detailed profiles are always reported along with the phase timings
+        modes.add(MODE_TIMING)
+    return modes
+
+
+class NullProfiler(object):
+    """
+    Profiler used when profiling is disabled. It does nothing, as cheaply as
+    possible.
+    """
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        yield
+
+    def wrap(self, callback):
+        return callback
+
+    def report(self):
+        pass
+
+
+class _Phase(object):
+    """
+    Time spent in a phase of the command execution.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        # time spent in phases nested in this one
+        self.children_wall = 0.0
+        self.children_cpu = 0.0
+
+
+class CommandProfiler(object):
+    """
+    Records how long each phase of a command execution takes and optionally
+    profiles the command callback.
+
+    Phases can be nested, in which case the time reported for the outer phase
+    excludes the time spent in the inner one. For example, the QT event loop
+    phase does not include the callback running inside it.
+    """
+
+    def __init__(self, engine, cmd_key, modes, output_dir=None, top_n=25):
+        """
+        :param engine: The engine running the command, used for logging.
+        :param str cmd_key: Name of the command.
+        :param modes: Set of profiling modes, see :func:`parse_modes`.
+        :param str output_dir: Folder reports are written to. Only needed when
+            ``cprofile`` or ``tracemalloc`` are enabled.
+        :param int top_n: Number of allocation sites in the tracemalloc report.
+        """
+        self._engine = engine
+        self._cmd_key = cmd_key
+        self._modes = modes
+        self._output_dir = output_dir
+        self._top_n = top_n
+        self._phases = []
+        self._stack = []
+        self._profile = None
+        self._allocations = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager timing a phase of the command execution.
+
+        :param str name: Name of the phase.
+        """
+        phase = _Phase(name)
+        self._phases.append(phase)
+        self._stack.append(phase)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            phase.wall = time.perf_counter() - wall_start
+            phase.cpu = time.process_time() - cpu_start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].children_wall += phase.wall
+                self._stack[-1].children_cpu += phase.cpu
+
+    def wrap(self, callback):
+        """
+        Wraps a command callback so it is timed, and profiled if requested.
+
+        :param callback: The command callback.
+
+        :returns: A callable taking the same arguments as ``callback``.
+        """
+
+        def profiled_callback(*args):
+            with self.phase("callback"):
+                return self._call(callback, args)
+
+        return profiled_callback
+
+    def _call(self, callback, args):
+        """
+        Runs the callback under the requested profilers.
+        """
+        if MODE_TRACEMALLOC in self._modes:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+        if MODE_CPROFILE in self._modes:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        try:
+            return callback(*args)
+        finally:
+            if self._profile is not None:
+                self._profile.disable()
+            if MODE_TRACEMALLOC in self._modes:
+                after = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+                self._allocations = after.compare_to(before, "lineno")
+
+    def report(self):
+        """
+        Logs the time spent in each phase and writes the requested profiles.
+        """
+        lines = ["Profile of command %s:" % self._cmd_key]
+        for phase in self._phases:
+            lines.append(
+                "  %-12s wall %8.3f ms  cpu %8.3f ms"
+                % (
+                    phase.name,
+                    (phase.wall - phase.children_wall) * 1000,
+                    (phase.cpu - phase.children_cpu) * 1000,
+                )
+            )
+        self._engine.log_info("\n".join(lines))
+
+        if self._profile is None and self._allocations is None:
+            return
+
+        if not os.path.isdir(self._output_dir):
+            os.makedirs(self._output_dir)
+        prefix = os.path.join(
+            self._output_dir,
+            "%s-%s-%d"
+            % (
+                re.sub(r"[^\w.-]", "_", self._cmd_key),
+                time.strftime("%Y%m%d-%H%M%S"),
+                os.getpid(),
+            ),
+        )
+
+        with open(prefix + "-timings.json", "w") as fh:
+            json.dump(
+                [
+                    {
+                        "phase": phase.name,
+                        "wall": phase.wall - phase.children_wall,
+                        "cpu": phase.cpu - phase.children_cpu,
+                    }
+                    for phase in self._phases
+                ],
+                fh,
+                indent=2,
+            )
+
+        if self._profile is not None:
+            self._profile.dump_stats(prefix + ".pstats")
+            self._engine.log_info("Profile written to %s.pstats" % prefix)
+
+        if self._allocations is not None:
+            with open(prefix + "-allocations.txt", "w") as fh:
+                fh.write(
+                    "Top %d allocation sites for command %s\n"
+                    % (self._top_n, self._cmd_key)
+                )
+                for statistic in self._allocations[: self._top_n]:
+                    fh.write("%s\n" % statistic)
+            self._engine.log_info(
+                "Allocation report written to %s-allocations.txt" % prefix
+            )
+
+
+def create_profiler(engine, cmd_key, modes, output_dir):
+    """
+    Creates the profiler for a command execution.
+
+    :param engine: The engine running the command.
+    :param str cmd_key: Name of the command.
+    :param modes: Set of profiling modes, see :func:`parse_modes`.
+    :param str output_dir: Folder reports are written to.
+
+    :returns: A :class:`CommandProfiler`, or a :class:`NullProfiler` when
+        profiling is disabled.
+    """
+    if not modes:
+        return NullProfiler()
+    return CommandProfiler(engine, cmd_key, modes, output_dir)
@@ -0,0 +1,208 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import asyncio
+import contextlib
+import time
+import traceback
+
+import tank
+
+from .aio import as_sync, is_async_callback
+from .cancellation import (
+    CancellationToken,
+    CommandTimedOut,
+    OperationCancelled,
+    deadline,
+    wait_for,
+)
+
+
+class CommandResult(object):
+    """
+    Outcome of a single command invocation.
+
+    The status mirrors the way the engine has always classified errors
+    raised by a command callback: toolkit errors, user cancellations and
+    any other general error. Commands running out of their time budget are
+    reported as timed out.
+    """
+
+    SUCCESS = "success"
+    TANK_ERROR = "tank_error"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+    ERROR = "error"
+
+    def __init__(self, cmd_key=None, args=None):
+        self.cmd_key = cmd_key
+        self.args = list(args or [])
+        self.status = None
+        self.value = None
+        self.error = None
+        self.traceback = None
+        self.started = None
+        self.duration = None
+
+    @classmethod
+    def failed(cls, cmd_key, args, error, status=TANK_ERROR):
+        """
+        Builds the result of a command that could not run.
+
+        :param str cmd_key: Name of the command.
+        :param list args: Arguments of the command.
+        :param error: Description of the failure, or the error raised.
+        :param str status: One of the :class:`CommandResult` statuses.
+
+        :returns: A :class:`CommandResult` instance.
+        """
+        result = cls(cmd_key, args)
+        result.status = status
+        result.error = str(error)
+        return result
+
+    @property
+    def succeeded(self):
+        """
+        True if the command ran to completion without raising.
+        """
+        return self.status == self.SUCCESS
+
+    def to_dict(self):
+        """
+        :returns: A json friendly dictionary describing this result. The
+            return value of the command is left out as it may not be
+            serializable.
+        """
+        return {
+            "command": self.cmd_key,
+            "args": [str(arg) for arg in self.args],
+            "status": self.status,
+            "error": self.error,
+            "started": self.started,
+            "duration": self.duration,
+        }
+
+    def __repr__(self):
+        return "<CommandResult %s: %s>" % (self.cmd_key, self.status)
+
+
+@contextlib.contextmanager
+def classify_errors(engine, result):
+    """
+    Context manager recording the status of a command in its result, and
+    logging the error it raised, if any.
+
+    It can be entered several times for the same result, for example while a
+    command's output is streamed. The duration then covers all the calls.
+    """
+    if result.started is None:
+        result.started = time.time()
+
+    try:
+        yield
+        result.status = CommandResult.SUCCESS
+
+    except tank.TankError as e:
+        result.status = CommandResult.TANK_ERROR
+        result.error = str(e)
+        engine.log_error(str(e))
+
+    except CommandTimedOut as e:
+        result.status = CommandResult.TIMED_OUT
+        result.error = str(e)
+        engine.log_error(result.error)
+
+    except OperationCancelled as e:
+        result.status = CommandResult.CANCELLED
+        result.error = str(e)
+        engine.log_info(result.error)
+
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        result.status = CommandResult.CANCELLED
+        result.error = "The operation was cancelled by the user."
+        engine.log_info(result.error)
+
+    except Exception as e:
+        result.status = CommandResult.ERROR
+        result.error = str(e) or e.__class__.__name__
+        result.traceback = traceback.format_exc()
+        engine.log_exception("A general error was reported.")
+
+    finally:
+        result.duration = time.time() - result.started
+
+
+def status_of(error):
+    """
+    Classifies an error raised by a command the same way as
+    :func:`classify_errors` does, for code paths letting errors propagate.
+
+    :param error: The exception raised by the command.
+
+    :returns: One of the :class:`CommandResult` statuses.
+    """
+    if isinstance(error, tank.TankError):
+        return CommandResult.TANK_ERROR
+    if isinstance(error, CommandTimedOut):
+        return CommandResult.TIMED_OUT
+    if isinstance(
+        error, (OperationCancelled, KeyboardInterrupt, asyncio.CancelledError)
+    ):
+        return CommandResult.CANCELLED
+    return CommandResult.ERROR
+
+
+def run_callback(engine, callback, args, cmd_key=None, token=None):
+    """
+    Runs a command callback, logging and classifying any error it raises.
+
+    Coroutine functions are run to completion on a new asyncio event loop.
+
+    :param engine: The engine running the command, used for logging.
+    :param callback: The command callback.
+    :param args: List of arguments to pass to the callback.
+    :param cmd_key: Optional name of the command, for reporting.
+    :param token: Optional :class:`~cancellation.CancellationToken` of the
+        command, whose deadline is enforced while the callback runs.
+
+    :returns: A :class:`CommandResult` instance.
+    """
+    if is_async_callback(callback):
+        callback = as_sync(callback)
+
+    result = CommandResult(cmd_key, args)
+    with classify_errors(engine, result):
+        with deadline(engine, token or CancellationToken(), cmd_key):
+            # execute the callback
+            result.value = callback(*args)
+    return result
+
+
+async def run_async_callback(engine, callback, args, cmd_key=None, token=None):
+    """
+    Awaits a coroutine function command callback, logging and classifying any
+    error it raises.
+
+    :param engine: The engine running the command, used for logging.
+    :param callback: The command callback, a coroutine function.
+    :param args: List of arguments to pass to the callback.
+    :param cmd_key: Optional name of the command, for reporting.
+    :param token: Optional :class:`~cancellation.CancellationToken` of the
+        command. The coroutine is cancelled once its deadline passes.
+
+    :returns: A :class:`CommandResult` instance.
+    """
+    result = CommandResult(cmd_key, args)
+    with classify_errors(engine, result):
+        result.value = await wait_for(
+            callback(*args), token or CancellationToken(), cmd_key
+        )
+    return result
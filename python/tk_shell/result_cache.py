@@ -0,0 +1,275 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Cache of the values returned by commands that opted into it, for commands
+that are pure lookups invoked again and again with the same arguments.
+"""
+
+import collections
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+
+from .context_cache import context_key
+from .streaming import is_stream
+
+
+def cache_key(cmd_key, args, context):
+    """
+    Builds the key a command result is cached under.
+
+    :param str cmd_key: Name of the command.
+    :param list args: Arguments of the command.
+    :param context: The context the command runs in.
+
+    :returns: A hexadecimal digest, usable as a file name.
+    """
+    description = json.dumps(
+        [cmd_key, [repr(arg) for arg in args], context_key(context)]
+    )
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Least recently used in-memory cache of command results, backed by an
+    optional on-disk store shared between processes.
+
+    Each entry expires after the time to live it was stored with. Callers
+    get a copy of the cached results, so they can't alter them for the next
+    ones.
+    """
+
+    def __init__(self, max_entries, disk_location=None, max_disk_entries=0):
+        """
+        :param int max_entries: Maximum number of results kept in memory.
+        :param disk_location: Folder of the on-disk store, or a function
+            returning it, called the first time the store is used.
+        :param int max_disk_entries: Maximum number of results kept on disk.
+            The least recently written ones are removed first.
+        """
+        self._max_entries = max_entries
+        self._disk_location = disk_location
+        self._max_disk_entries = max_disk_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Looks up a result.
+
+        :param str key: Key built by :func:`cache_key`.
+
+        :returns: A tuple of a boolean indicating if the result was found and
+            a copy of the result.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            # cached values are never altered, no need to hold the lock
+            return True, copy.deepcopy(entry[1])
+
+        entry = self._read(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._store(key, entry)
+        return True, copy.deepcopy(entry[1])
+
+    def put(self, key, value, ttl, on_disk=False):
+        """
+        Caches a result.
+
+        :param str key: Key built by :func:`cache_key`.
+        :param value: The value returned by the command.
+        :param float ttl: Number of seconds the result is valid for.
+        :param bool on_disk: Whether to also write the result to disk.
+        """
+        try:
+            value = copy.deepcopy(value)
+        except Exception:
+            # results that can't be copied could be altered by their callers
+            return
+
+        entry = (time.time() + ttl, value)
+        with self._lock:
+            self._store(key, entry)
+        if on_disk:
+            self._write(key, entry)
+
+    def invalidate(self, disk=False):
+        """
+        Forgets the cached results.
+
+        :param bool disk: Whether to also remove the results stored on disk.
+        """
+        with self._lock:
+            self._entries.clear()
+
+        if disk:
+            for path in self._disk_paths():
+                _remove(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, entry):
+        """
+        Stores an entry in memory. The lock must be held.
+        """
+        if self._max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _location(self):
+        """
+        :returns: The folder of the on-disk store, or None if there is none.
+        """
+        if callable(self._disk_location):
+            self._disk_location = self._disk_location()
+        return self._disk_location
+
+    def _path(self, key):
+        return os.path.join(self._location(), key + ".pickle")
+
+    def _disk_paths(self):
+        """
+        :returns: The paths of the results stored on disk.
+        """
+        location = self._location()
+        if not location or not os.path.isdir(location):
+            return []
+        return [
+            os.path.join(location, file_name)
+            for file_name in os.listdir(location)
+            if file_name.endswith(".pickle")
+        ]
+
+    def _read(self, key, now):
+        """
+        Reads an entry from disk, removing it if it has expired.
+        """
+        if self._max_disk_entries <= 0 or not self._location():
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                entry = pickle.load(fh)
+        except Exception:
+            # missing, being written or corrupt, all of which are misses.
+            return None
+
+        if entry[0] <= now:
+            _remove(path)
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        """
+        Writes an entry to disk, then prunes the store down to its size.
+        """
+        if self._max_disk_entries <= 0 or not self._location():
+            return
+
+        try:
+            data = pickle.dumps(entry)
+        except Exception:
+            # results that can't be pickled are only cached in memory
+            return
+
+        if not os.path.isdir(self._location()):
+            os.makedirs(self._location(), exist_ok=True)
+
+        # write to a temporary file first, so readers never see partial data
+        path = self._path(key)
+        temp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(temp_path, "wb") as fh:
+            fh.write(data)
+        os.replace(temp_path, path)
+
+        paths = self._disk_paths()
+        if len(paths) > self._max_disk_entries:
+            paths.sort(key=_mtime)
+            for path in paths[: len(paths) - self._max_disk_entries]:
+                _remove(path)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def memoized(callback, cache, key, ttl, on_disk=False):
+    """
+    Wraps a command callback so it is only called when its result isn't
+    cached. Results are cached unless the callback raises or returns a
+    generator or an iterator.
+
+    :param callback: The command callback.
+    :param cache: The :class:`ResultCache`.
+    :param str key: Key built by :func:`cache_key`.
+    :param float ttl: Number of seconds results are valid for.
+    :param bool on_disk: Whether to also write results to disk.
+
+    :returns: A callable taking the same arguments as ``callback``.
+    """
+    if inspect.iscoroutinefunction(callback):
+
+        @functools.wraps(callback)
+        async def memoized_async_callback(*args):
+            found, value = cache.get(key)
+            if not found:
+                value = await callback(*args)
+                cache.put(key, value, ttl, on_disk)
+            return value
+
+        return memoized_async_callback
+
+    @functools.wraps(callback)
+    def memoized_callback(*args):
+        found, value = cache.get(key)
+        if not found:
+            value = callback(*args)
+            if not is_stream(value):
+                cache.put(key, value, ttl, on_disk)
+        return value
+
+    return memoized_callback
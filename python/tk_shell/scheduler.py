@@ -0,0 +1,203 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import collections
+
+import tank
+from tank.platform.qt import QtCore, QtGui
+
+from .cancellation import CancellationToken
+from .result import CommandResult, run_callback
+from .streaming import consuming
+from .task import Task
+
+
+class _Notifier(QtCore.QObject):
+    """
+    Lives on the main thread and tells it when the commands run on the thread
+    pool are done.
+    """
+
+    done = QtCore.Signal()
+
+
+class _CommandRunnable(QtCore.QRunnable):
+    """
+    Runs a headless command on a thread of the pool.
+    """
+
+    def __init__(self, scheduler, index, callback, args, cmd_key, timeout):
+        QtCore.QRunnable.__init__(self)
+        self._engine = scheduler._engine
+        self._results = scheduler.results
+        self._notifier = scheduler._notifier
+        self._index = index
+        self._callback = callback
+        self._args = args
+        self._cmd_key = cmd_key
+        self._timeout = timeout
+
+    def run(self):
+        # the result is stored right away so it is available even if the event
+        # loop stops before the notification is processed.
+        self._results[self._index] = run_callback(
+            self._engine,
+            self._callback,
+            self._args,
+            self._cmd_key,
+            CancellationToken(self._timeout),
+        )
+        self._notifier.done.emit()
+
+
+class TaskScheduler(QtCore.QObject):
+    """
+    Runs a queue of commands within a single QT event loop.
+
+    Commands flagged with the ``headless`` property run concurrently on a
+    ``QThreadPool``, so they must not create any widgets. Other commands run
+    one after the other on the main thread, where UIs can be created.
+
+    ``finished`` is emitted once all the commands are done and no window is
+    left open.
+    """
+
+    # emitted once all the commands are done and all windows are closed
+    finished = QtCore.Signal()
+
+    def __init__(self, engine, max_concurrency, writer=None, parent=None):
+        """
+        :param engine: The engine running the commands.
+        :param int max_concurrency: Maximum number of headless commands running
+            at once.
+        :param writer: Optional :class:`~streaming.StreamWriter` the items of
+            commands returning a generator or an iterator are streamed to.
+        :param parent: Optional parent ``QObject``.
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._engine = engine
+        self._writer = writer
+        self._pool = QtCore.QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, max_concurrency))
+        self._notifier = _Notifier(self)
+        self._notifier.done.connect(self._on_done)
+        self._headless = collections.deque()
+        self._main_thread = collections.deque()
+        self._current_task = None
+        self._outstanding = 0
+        self._started = False
+        self.is_finished = False
+        self.results = []
+
+    def submit(self, cmd_key, args):
+        """
+        Queues a command. Queued commands only start running once
+        :meth:`start` is called.
+
+        :param str cmd_key: Name of the command.
+        :param list args: Arguments for the command.
+        """
+        index = len(self.results)
+        self.results.append(None)
+
+        try:
+            callback, args = self._engine._resolve_command(cmd_key, args)
+        except tank.TankError as e:
+            result = CommandResult.failed(cmd_key, args, e)
+            self._engine.log_error(result.error)
+            self.results[index] = result
+            return
+
+        if self._writer is not None:
+            callback = consuming(callback, self._writer)
+        timeout = self._engine._get_command_timeout(cmd_key)
+
+        self._outstanding += 1
+        properties = self._engine.commands[cmd_key].get("properties", {})
+        if properties.get("headless"):
+            self._headless.append(
+                _CommandRunnable(self, index, callback, args, cmd_key, timeout)
+            )
+        else:
+            self._main_thread.append((index, callback, args, cmd_key, timeout))
+
+        if self._started:
+            self._dispatch()
+
+    def start(self):
+        """
+        Starts running the queued commands.
+        """
+        self._started = True
+        QtGui.QApplication.instance().lastWindowClosed.connect(self._check_idle)
+        self._dispatch()
+        self._check_idle()
+
+    def wait(self):
+        """
+        Blocks until the headless commands handed over to the pool are done.
+        Main thread commands that didn't get to run, because the event loop
+        was stopped, are reported as cancelled.
+        """
+        self._pool.waitForDone()
+
+        while self._main_thread:
+            index, _, args, cmd_key, _ = self._main_thread.popleft()
+            self.results[index] = CommandResult.failed(
+                cmd_key,
+                args,
+                "The event loop stopped before the command could run.",
+                CommandResult.CANCELLED,
+            )
+
+    def _dispatch(self):
+        """
+        Hands the queued headless commands over to the pool and starts the
+        next main thread command, if none is running.
+        """
+        while self._headless:
+            self._pool.start(self._headless.popleft())
+
+        if self._current_task is None and self._main_thread:
+            index, callback, args, cmd_key, timeout = self._main_thread.popleft()
+            task = Task(self._engine, callback, args, cmd_key, timeout)
+            task.completed.connect(lambda: self._on_task_completed(index, task))
+            self._current_task = task
+            task.run_command()
+
+    def _on_task_completed(self, index, task):
+        """
+        Records the result of a main thread command and moves on to the next.
+        """
+        self._current_task = None
+        self.results[index] = task.result
+        self._on_done()
+        # let the events queued by the command be processed first
+        QtCore.QTimer.singleShot(0, self._dispatch)
+
+    def _on_done(self):
+        self._outstanding -= 1
+        self._check_idle()
+
+    def _check_idle(self):
+        """
+        Emits ``finished`` once nothing is left to run and no window is open.
+        """
+        if self.is_finished or not self._started or self._outstanding:
+            return
+
+        for widget in QtGui.QApplication.topLevelWidgets():
+            if widget.isVisible():
+                # windows opened by the commands keep the session alive until
+                # they are closed.
+                return
+
+        self.is_finished = True
+        self.finished.emit()
@@ -0,0 +1,260 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hygiene of long running sessions, like command servers, where many commands
+run within the same engine.
+
+After each command, what it left behind is released: closed windows, log
+handlers it didn't remove and garbage. Optionally, the memory used by the
+process and the number of live objects are sampled after each command, so a
+leak report can show how they grow.
+
+Both assume commands run one after the other, or within one another like the
+commands run by a command server. Commands overlapping others, like ones
+awaited together with ``execute_command_async``, are left alone, since what
+they leave behind may still be in use by the others.
+"""
+
+import collections
+import contextlib
+import contextvars
+import ctypes
+import ctypes.util
+import gc
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Set while a command runs, in the context running it.
+_in_command = contextvars.ContextVar("tk_shell_in_command", default=False)
+
+
+def current_rss():
+    """
+    :returns: The resident memory of the process in bytes, or None if it
+        can't be measured on this platform.
+    """
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # not the current usage but the peak one, which still shows growth.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _trim_heap():
+    """
+    Returns the memory freed by the C allocator to the system, where
+    supported.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _type_counts():
+    """
+    :returns: A ``Counter`` of the live objects tracked by the garbage
+        collector, by type name.
+    """
+    return collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+class SessionHygiene(object):
+    """
+    Releases what commands leave behind and reports the growth of the process
+    across commands.
+    """
+
+    def __init__(self, engine, reclaim=True, report_path=None, top_n=20):
+        """
+        :param engine: The engine running the commands.
+        :param bool reclaim: Whether to release what commands leave behind.
+        :param str report_path: Optional path of the json leak report written
+            by :meth:`write_report`. Sampling only happens when it is set.
+        :param int top_n: Number of object types listed in the leak report.
+        """
+        self._engine = engine
+        self._reclaim = reclaim
+        self._report_path = report_path
+        self._top_n = top_n
+        self._baseline = None
+        self._samples = []
+        # number of commands running, and whether some overlapped since the
+        # last time none was.
+        self._running = 0
+        self._overlapped = False
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def command(self, cmd_key):
+        """
+        Context manager wrapping the execution of a command.
+
+        :param str cmd_key: Name of the command.
+        """
+        if self._report_path and self._baseline is None:
+            gc.collect()
+            self._baseline = {
+                "rss": current_rss(),
+                "objects": len(gc.get_objects()),
+                "types": _type_counts(),
+            }
+
+        handlers = self._handlers()
+        widgets = self._top_level_widgets()
+        # commands run by another one don't overlap it
+        nested = _in_command.get()
+        with self._lock:
+            if not nested:
+                self._running += 1
+                if self._running > 1:
+                    self._overlapped = True
+        reset_token = _in_command.set(True)
+        try:
+            yield
+        finally:
+            _in_command.reset(reset_token)
+            with self._lock:
+                if not nested:
+                    self._running -= 1
+                alone = not self._overlapped
+                if not self._running:
+                    self._overlapped = False
+
+            if alone:
+                if self._reclaim:
+                    self._release(cmd_key, handlers, widgets)
+                if self._report_path:
+                    self._sample(cmd_key)
+            else:
+                self._engine.log_debug(
+                    "Command %s overlapped others, skipping its cleanup." % cmd_key
+                )
+
+    def write_report(self):
+        """
+        Writes the leak report, if enough commands were sampled.
+        """
+        if not self._report_path or not self._samples:
+            return
+
+        gc.collect()
+        last = self._samples[-1]
+        growth = _type_counts()
+        growth.subtract(self._baseline["types"])
+        report = {
+            "created": time.time(),
+            "commands": len(self._samples),
+            "rss_growth": _difference(last["rss"], self._baseline["rss"]),
+            "objects_growth": last["objects"] - self._baseline["objects"],
+            "top_growing_types": [
+                {"type": name, "growth": count}
+                for name, count in growth.most_common(self._top_n)
+                if count > 0
+            ],
+            "samples": self._samples,
+        }
+        with open(self._report_path, "w") as fh:
+            json.dump(report, fh, indent=2)
+        self._engine.log_info("Leak report written to %s" % self._report_path)
+
+    def _loggers(self):
+        return [logging.getLogger(), logging.getLogger("sgtk"), self._engine._log]
+
+    def _handlers(self):
+        """
+        :returns: The handlers attached to the loggers the engine uses, by
+            logger.
+        """
+        return {logger: set(logger.handlers) for logger in self._loggers()}
+
+    def _top_level_widgets(self):
+        """
+        :returns: The top level widgets that currently exist.
+        """
+        if not self._engine._has_qt:
+            return set()
+
+        from sgtk.platform.qt import QtGui
+
+        if not QtGui.QApplication.instance():
+            return set()
+        return set(QtGui.QApplication.topLevelWidgets())
+
+    def _release(self, cmd_key, handlers, widgets):
+        """
+        Releases what a command left behind.
+        """
+        for logger, previous_handlers in handlers.items():
+            for handler in set(logger.handlers) - previous_handlers:
+                self._engine.log_debug(
+                    "Removing log handler %r left behind by command %s."
+                    % (handler, cmd_key)
+                )
+                logger.removeHandler(handler)
+                handler.close()
+
+        windows_open = False
+        current_widgets = self._top_level_widgets()
+        for widget in current_widgets:
+            if widget.isVisible():
+                windows_open = True
+            elif widget not in widgets:
+                # closed windows created by the command
+                widget.deleteLater()
+
+        if current_widgets and not windows_open:
+            from sgtk.platform.qt import QtCore
+
+            # run the deferred deletes now, not whenever an event loop next
+            # runs.
+            QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.DeferredDelete)
+            # the next command starts afresh, rather than being considered to
+            # have requested a UI.
+            self._engine._ui_created = False
+
+        gc.collect()
+        _trim_heap()
+
+    def _sample(self, cmd_key):
+        """
+        Records the memory used and the live objects after a command.
+        """
+        gc.collect()
+        self._samples.append(
+            {
+                "command": cmd_key,
+                "rss": current_rss(),
+                "objects": len(gc.get_objects()),
+                "garbage": len(gc.garbage),
+            }
+        )
+
+
+def _difference(value, baseline):
+    if value is None or baseline is None:
+        return None
+    return value - baseline
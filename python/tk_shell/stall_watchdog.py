@@ -0,0 +1,127 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sys
+import threading
+import time
+import traceback
+
+from tank.platform.qt import QtCore
+
+from .histogram import LatencyHistogram
+
+
+class StallWatchdog(QtCore.QObject):
+    """
+    Measures how late the QT event loop processes events and reports the code
+    blocking it.
+
+    A timer on the main thread beats at a regular interval and records how
+    late each beat is in a :class:`~histogram.LatencyHistogram`. A monitor
+    thread checks the time since the last beat and, when it goes over the
+    threshold, logs the stack of the main thread, once per stall.
+
+    The watchdog should only run while an event loop is running, otherwise
+    the missing beats are reported as stalls.
+    """
+
+    def __init__(self, engine, threshold, interval=0.05, parent=None):
+        """
+        :param engine: The engine, used for logging.
+        :param float threshold: Time in seconds the event loop can be blocked
+            for before it is reported.
+        :param float interval: Time in seconds between two beats.
+        :param parent: Optional parent ``QObject``.
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._engine = engine
+        self._threshold = threshold
+        self._interval = interval
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(int(interval * 1000))
+        self._timer.timeout.connect(self._beat)
+        self._lock = threading.Lock()
+        self._last_beat = None
+        self._reported = False
+        self._stopping = threading.Event()
+        self._thread = None
+        self.histogram = LatencyHistogram()
+        self.stalls = 0
+
+    def start(self):
+        """
+        Starts watching the event loop.
+        """
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            self._last_beat = time.monotonic()
+            self._reported = False
+        self._stopping.clear()
+        self._timer.start()
+        self._thread = threading.Thread(
+            target=self._monitor, name="tk-shell-stall-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops watching the event loop.
+        """
+        if self._thread is None:
+            return
+
+        self._timer.stop()
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+
+    def report(self):
+        """
+        :returns: A json friendly dictionary with the number of stalls and the
+            event loop latency histogram.
+        """
+        return {
+            "threshold": self._threshold,
+            "stalls": self.stalls,
+            "latency": self.histogram.to_dict(),
+        }
+
+    def _beat(self):
+        """
+        Called on the main thread each time the timer fires.
+        """
+        now = time.monotonic()
+        with self._lock:
+            latency = max(0.0, now - self._last_beat - self._interval)
+            self._last_beat = now
+            self._reported = False
+        self.histogram.record(latency)
+
+    def _monitor(self):
+        """
+        Body of the monitor thread.
+        """
+        main_thread_id = threading.main_thread().ident
+        while not self._stopping.wait(self._interval):
+            with self._lock:
+                blocked = time.monotonic() - self._last_beat
+                if blocked < self._threshold or self._reported:
+                    continue
+                self._reported = True
+                self.stalls += 1
+
+            frame = sys._current_frames().get(main_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            self._engine.log_warning(
+                "The QT event loop has been blocked for %.0f ms by:\n%s"
+                % (blocked * 1000, stack)
+            )
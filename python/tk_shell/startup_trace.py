@@ -0,0 +1,233 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Timeline of the startup of the engine, from the creation of the engine to the
+first command it runs.
+
+A profile function records each module import, the ``init_app`` of each app,
+the engine initialization methods, each ``register_command`` and each
+``import_module`` call.
+The timeline is written as a Chrome trace event file, which can be opened in
+``chrome://tracing`` or https://ui.perfetto.dev, and as a text summary sorted
+by duration.
+
+The profile function slows down the code it watches a little, so durations
+are best compared with each other rather than with untraced startups.
+
+This module is loaded by the engine before the ``tk_shell`` package can be
+imported, so it must not import anything from it.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+CATEGORY_ENGINE = "engine"
+CATEGORY_APP = "app"
+CATEGORY_IMPORT = "import"
+
+# Functions recorded by the profile function.
+_WATCHED = frozenset(
+    [
+        "_find_and_load",
+        "_define_qt_base",
+        "import_module",
+        "init_app",
+        "init_engine",
+        "post_app_init",
+        "pre_app_init",
+        "register_command",
+    ]
+)
+
+
+def _process_start_time():
+    """
+    :returns: The time the process started at, as seconds since the epoch, or
+        None if it can't be found on this platform.
+    """
+    try:
+        with open("/proc/self/stat") as fh:
+            # the command name may contain spaces, fields are after it
+            fields = fh.read().rsplit(")", 1)[1].split()
+        with open("/proc/stat") as fh:
+            boot_time = next(
+                int(line.split()[1]) for line in fh if line.startswith("btime")
+            )
+        return boot_time + int(fields[19]) / float(os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        return None
+
+
+def _label(frame):
+    """
+    :returns: A tuple of the category and name of the span of a watched
+        function call.
+    """
+    code_name = frame.f_code.co_name
+    if code_name == "_find_and_load":
+        return CATEGORY_IMPORT, "import %s" % frame.f_locals.get("name")
+    if code_name == "init_app":
+        app = frame.f_locals.get("self")
+        name = getattr(app, "instance_name", None) or type(app).__name__
+        return CATEGORY_APP, "init_app %s" % name
+    if code_name == "import_module":
+        return CATEGORY_ENGINE, "import_module %s" % frame.f_locals.get("module_name")
+    if code_name == "register_command":
+        return CATEGORY_ENGINE, "register_command %s" % frame.f_locals.get("name")
+    return CATEGORY_ENGINE, code_name
+
+
+class StartupTrace(object):
+    """
+    Records a hierarchical timeline of spans.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path of the Chrome trace event file. The text summary
+            is written next to it, with a ``.txt`` extension.
+        """
+        self._path = path
+        self._origin = time.perf_counter()
+        self._epoch = time.time()
+        self._thread_id = threading.get_ident()
+        # stack of [frame, category, name, start, child duration]
+        self._stack = []
+        # tuples of category, name, start, duration and self duration
+        self._spans = []
+        self._profiling = False
+
+        process_start = _process_start_time()
+        if process_start is not None and process_start < self._epoch:
+            self._spans.append(
+                (
+                    CATEGORY_ENGINE,
+                    "python and toolkit bootstrap",
+                    process_start - self._epoch,
+                    self._epoch - process_start,
+                    self._epoch - process_start,
+                )
+            )
+
+    @property
+    def is_running(self):
+        return self._profiling
+
+    def start(self):
+        """
+        Starts recording the watched function calls of the current thread.
+        """
+        if sys.getprofile() is None:
+            sys.setprofile(self._profile)
+            self._profiling = True
+
+    def stop(self):
+        """
+        Stops recording and closes the spans still open.
+        """
+        if self._profiling and sys.getprofile() == self._profile:
+            sys.setprofile(None)
+        self._profiling = False
+        while self._stack:
+            self._close()
+
+    @contextlib.contextmanager
+    def span(self, name, category=CATEGORY_ENGINE):
+        """
+        Context manager recording a span.
+
+        :param str name: Name of the span.
+        :param str category: Category of the span.
+        """
+        self._open(None, category, name)
+        entry = self._stack[-1]
+        try:
+            yield
+        finally:
+            # spans opened by the profile function close on their own
+            if any(item is entry for item in self._stack):
+                while self._stack[-1] is not entry:
+                    self._close()
+                self._close()
+
+    def write(self):
+        """
+        Writes the Chrome trace event file and the text summary.
+
+        :returns: The paths of the files written.
+        """
+        pid = os.getpid()
+        # timestamps can't be negative, the bootstrap started before the trace
+        origin = min([span[2] for span in self._spans] + [0.0])
+        events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - origin) * 1e6),
+                "dur": round(duration * 1e6),
+                "pid": pid,
+                "tid": self._thread_id,
+            }
+            for category, name, start, duration, _ in self._spans
+        ]
+        with open(self._path, "w") as fh:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fh)
+
+        summary_path = os.path.splitext(self._path)[0] + ".txt"
+        with open(summary_path, "w") as fh:
+            fh.write(self.summary())
+        return self._path, summary_path
+
+    def summary(self):
+        """
+        :returns: The spans sorted by decreasing duration, one per line, with
+            their duration and the part of it not spent in child spans.
+        """
+        lines = ["%10s %10s  %-8s %s" % ("total ms", "self ms", "category", "span")]
+        spans = sorted(self._spans, key=lambda span: span[3], reverse=True)
+        for category, name, _, duration, self_duration in spans:
+            lines.append(
+                "%10.2f %10.2f  %-8s %s"
+                % (duration * 1e3, self_duration * 1e3, category, name)
+            )
+        return "\n".join(lines) + "\n"
+
+    def _profile(self, frame, event, arg):
+        """
+        Profile function opening and closing the spans of watched functions.
+        """
+        if event == "call":
+            if frame.f_code.co_name in _WATCHED:
+                category, name = _label(frame)
+                # overridden methods calling their base implementation are
+                # recorded once.
+                if not self._stack or self._stack[-1][2] != name:
+                    self._open(frame, category, name)
+        elif event == "return":
+            if self._stack and self._stack[-1][0] is frame:
+                self._close()
+
+    def _open(self, frame, category, name):
+        self._stack.append(
+            [frame, category, name, time.perf_counter() - self._origin, 0.0]
+        )
+
+    def _close(self):
+        frame, category, name, start, child_duration = self._stack.pop()
+        duration = time.perf_counter() - self._origin - start
+        if self._stack:
+            self._stack[-1][4] += duration
+        self._spans.append((category, name, start, duration, duration - child_duration))
@@ -0,0 +1,149 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Streaming of the items produced by commands returning generators or
+iterators.
+
+Each item is written out as soon as it is produced, and the next item is only
+requested once the previous one has been written and flushed, so a slow
+consumer naturally slows the command down instead of items piling up in
+memory.
+"""
+
+import collections.abc
+import functools
+import inspect
+import json
+import sys
+import threading
+
+import tank
+
+from .aio import as_sync, is_async_callback
+from .cancellation import current_token
+
+FORMAT_TEXT = "text"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_TEXT, FORMAT_JSONL)
+
+
+def is_stream(value):
+    """
+    :returns: True if a command return value should be streamed.
+    """
+    return inspect.isgenerator(value) or isinstance(value, collections.abc.Iterator)
+
+
+class StreamWriter(object):
+    """
+    Writes streamed items, one per line, either as text or as json.
+    """
+
+    def __init__(self, stream=None, output_format=FORMAT_TEXT, path=None):
+        """
+        :param stream: File object items are written to. Defaults to
+            ``sys.stdout``.
+        :param str output_format: ``text`` writes the string representation of
+            each item, ``jsonl`` writes each item as json.
+        :param str path: Optional path of a file to write to instead of
+            ``stream``. It is opened on the first write.
+        :raises TankError: If the format is not supported.
+        """
+        if output_format not in FORMATS:
+            raise tank.TankError(
+                "Unknown stream format '%s'. Expected one of %s."
+                % (output_format, ", ".join(FORMATS))
+            )
+
+        self._stream = stream
+        self._format = output_format
+        self._path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write(self, item):
+        """
+        Writes an item and flushes it out.
+        """
+        if self._format == FORMAT_JSONL:
+            line = json.dumps(item, default=str)
+        else:
+            line = str(item)
+
+        with self._lock:
+            stream = self._get_stream()
+            stream.write(line + "\n")
+            stream.flush()
+            self.count += 1
+
+    def close(self):
+        """
+        Closes the file written to, if the writer opened one.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _get_stream(self):
+        if self._path:
+            if self._file is None:
+                self._file = open(self._path, "a")
+            return self._file
+        return self._stream or sys.stdout
+
+
+def consume(items, writer):
+    """
+    Writes all the items of an iterator.
+
+    The cancellation token of the command being run, if any, is checked
+    before each item, so streamed commands stop as soon as they are cancelled.
+
+    :param items: The iterator.
+    :param writer: Object with a ``write(item)`` method.
+
+    :returns: The number of items written.
+    """
+    token = current_token()
+    count = 0
+    for item in items:
+        if token is not None:
+            token.raise_if_cancelled()
+        writer.write(item)
+        count += 1
+    return count
+
+
+def consuming(callback, writer):
+    """
+    Wraps a command callback so generators and iterators it returns are
+    streamed to a writer.
+
+    :param callback: The command callback.
+    :param writer: Object with a ``write(item)`` method.
+
+    :returns: A callable taking the same arguments as ``callback``. It returns
+        the number of items written when ``callback`` returned a stream, and
+        the return value of ``callback`` otherwise.
+    """
+
+    if is_async_callback(callback):
+        callback = as_sync(callback)
+
+    @functools.wraps(callback)
+    def streaming_callback(*args):
+        value = callback(*args)
+        if is_stream(value):
+            return consume(value, writer)
+        return value
+
+    return streaming_callback
@@ -8,46 +8,161 @@
 # agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
-import tank
-
 from tank.platform.qt import QtCore
 
+from .cancellation import CancellationToken, deadline
+from .result import CommandResult, classify_errors, run_callback
+from .streaming import is_stream
+
+# Returned by next() when a streamed command has no more items.
+_END = object()
+
 
 class Task(QtCore.QObject):
     """
     This is a wrapper class which allows us to run tank commands
     inside the QT universe. This approach is handy when an engine needs
     to start up a qt event loop as part of its initailization.
+
+    When the command returns a generator or an iterator, its items are pulled
+    one at a time from the QT event loop and forwarded through the
+    ``item_produced`` signal, so events keep being processed while the
+    command produces its output.
+
+    When the command is given a time budget, it is cancelled once the budget
+    is spent. ``finished`` is then emitted with a timed out result, even if
+    the command requested a UI, so the QApplication quits.
     """
 
+    # emitted once the command is done, unless it requested a UI
     finished = QtCore.Signal()
+    # emitted once the command is done, in all cases
+    completed = QtCore.Signal()
+    # emitted for each item produced by a streamed command
+    item_produced = QtCore.Signal(object)
 
-    def __init__(self, engine, callback, args):
+    def __init__(self, engine, callback, args, cmd_key=None, timeout=None):
         QtCore.QObject.__init__(self)
         self._callback = callback
         self._args = args
         self._engine = engine
+        self._cmd_key = cmd_key
+        self._items = None
+        self.cancellation_token = CancellationToken(timeout)
+        self.result = None
+        self.is_complete = False
 
     def run_command(self):
 
+        remaining = self.cancellation_token.remaining()
+        if remaining is not None:
+            # catches commands still streaming or showing a UI once their time
+            # is up. Callbacks still running are interrupted by their watchdog.
+            QtCore.QTimer.singleShot(int(remaining * 1000), self._on_deadline)
+
+        streaming = False
         try:
-            # execute the callback
-            self._callback(*self._args)
+            # execute the callback, errors are logged and classified
+            self.result = run_callback(
+                self._engine,
+                self._callback,
+                self._args,
+                self._cmd_key,
+                self.cancellation_token,
+            )
 
-        except tank.TankError as e:
-            self._engine.log_error(str(e))
+            streaming = self.result.succeeded and is_stream(self.result.value)
+            if streaming:
+                # the value reported for a streamed command is its item count
+                self._items = self.result.value
+                self.result.value = 0
+                QtCore.QTimer.singleShot(0, self._stream_next_item)
 
-        except KeyboardInterrupt:
-            self._engine.log_info("The operation was cancelled by the user.")
+        finally:
+            if not streaming:
+                self._complete()
 
-        except Exception:
-            self._engine.log_exception("A general error was reported.")
+    def _stream_next_item(self):
+        """
+        Forwards the next item of a streamed command and schedules the
+        following one.
+        """
+        if self.is_complete:
+            return
 
+        done = True
+        try:
+            done = self._pull_next_item()
         finally:
-            # broadcast that we have finished this command
-            if not self._engine.has_received_ui_creation_requests():
-                # while the app has been doing its thing, no UIs were
-                # created (at least not any tank UIs) - assume it is a
-                # console style app and that the end of its callback
-                # execution means that it is complete and that we should return
-                self.finished.emit()
+            if done:
+                self._items = None
+                self._complete()
+            else:
+                QtCore.QTimer.singleShot(0, self._stream_next_item)
+
+    def _pull_next_item(self):
+        """
+        Forwards the next item of a streamed command.
+
+        :returns: True once the command has no more items or failed.
+        """
+        done = True
+        with classify_errors(self._engine, self.result), deadline(
+            self._engine, self.cancellation_token, self._cmd_key
+        ):
+            self.cancellation_token.raise_if_cancelled()
+            item = next(self._items, _END)
+            if item is not _END:
+                self.result.value += 1
+                self.item_produced.emit(item)
+                done = False
+        return done
+
+    def _close_items(self):
+        """
+        Stops a streamed command.
+        """
+        if self._items is not None:
+            close = getattr(self._items, "close", None)
+            if close is not None:
+                close()
+            self._items = None
+
+    def _on_deadline(self):
+        """
+        Ends the command once its time budget is spent.
+        """
+        if self.is_complete:
+            return
+
+        self.cancellation_token.cancel(
+            "Command %s exceeded its time budget of %s seconds."
+            % (self._cmd_key, self.cancellation_token.timeout),
+            timed_out=True,
+        )
+        self._engine.log_error(self.cancellation_token.reason)
+
+        self._close_items()
+
+        if self.result is None:
+            self.result = CommandResult(self._cmd_key, self._args)
+        self.result.status = CommandResult.TIMED_OUT
+        self.result.error = self.cancellation_token.reason
+        if self.result.duration is None:
+            self.result.duration = self.cancellation_token.timeout
+        self._complete()
+
+    def _complete(self):
+        self.is_complete = True
+        self.completed.emit()
+
+        # broadcast that we have finished this command
+        if (
+            self.cancellation_token.timed_out
+            or not self._engine.has_received_ui_creation_requests()
+        ):
+            # while the app has been doing its thing, no UIs were
+            # created (at least not any tank UIs) - assume it is a
+            # console style app and that the end of its callback
+            # execution means that it is complete and that we should return
+            self.finished.emit()
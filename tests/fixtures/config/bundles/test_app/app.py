@@ -12,6 +12,8 @@
 A simple app to support unit tests.
 """
 
+import asyncio
+
 import sgtk
 
 
@@ -27,6 +29,63 @@ class TestApp(sgtk.platform.Application):
     def init_app(self):
         self.dismiss_button = None
         self.engine.register_command("test_app", self._show_app)
+        self.engine.register_command("test_echo", self._echo, {"headless": True})
+        self.engine.register_command("test_typed", self._typed)
+        self.engine.register_command("test_noop", self._noop)
+        self.engine.register_command("test_async_echo", self._async_echo)
+        self.engine.register_command("test_stream", self._stream)
+        self.engine.register_command("test_cancellable", self._cancellable)
+        self.engine.register_command(
+            "test_lookup", self._lookup, {"cacheable": True, "cache_ttl": 60}
+        )
+        self.lookup_calls = 0
+
+    def _echo(self, *args):
+        """
+        Headless command returning the arguments it was given.
+        """
+        self.engine.log_info("echo %s" % " ".join(str(arg) for arg in args))
+        return list(args)
+
+    def _typed(self, count: int, enabled: bool = False):
+        """
+        Headless command with annotated arguments.
+        """
+        return count, enabled
+
+    def _noop(self):
+        """
+        Headless command doing nothing, to measure the engine overhead.
+        """
+
+    async def _async_echo(self, *args):
+        """
+        Headless coroutine command returning the arguments it was given.
+        """
+        await asyncio.sleep(0)
+        return list(args)
+
+    def _stream(self, count: int = 3):
+        """
+        Headless command yielding its output one item at a time.
+        """
+        for index in range(count):
+            yield {"index": index}
+
+    def _cancellable(self, seconds: float = 5.0, *, cancellation_token):
+        """
+        Headless command waiting until it is cancelled or the time elapses.
+        """
+        cancellation_token.wait(seconds)
+        cancellation_token.raise_if_cancelled()
+        return seconds
+
+    def _lookup(self, *args):
+        """
+        Headless command with a cacheable result, counting its calls.
+        """
+        self.lookup_calls += 1
+        return list(args)
 
     def _show_app(self, auto_dismiss):
         """
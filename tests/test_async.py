@@ -0,0 +1,104 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import asyncio
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestAsyncCommands(TankTestBase):
+    """
+    Tests running commands implemented as coroutine functions.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_run_callback(self):
+        """
+        Ensure coroutine callbacks are run to completion.
+        """
+        callback, args = self.engine._resolve_command("test_async_echo", ["a"])
+        self.assertTrue(self.tk_shell.aio.is_async_callback(callback))
+
+        result = self.tk_shell.run_callback(self.engine, callback, args)
+        self.assertEqual(result.status, "success")
+        self.assertEqual(result.value, ["a"])
+
+    def test_execute_command_async(self):
+        """
+        Ensure commands can be awaited from a running event loop.
+        """
+
+        async def run_both():
+            return await asyncio.gather(
+                self.engine.execute_command_async("test_async_echo", ["a"]),
+                self.engine.execute_command_async("test_echo", ["b"]),
+            )
+
+        self.assertEqual(asyncio.run(run_both()), [["a"], ["b"]])
+
+        commands = self.engine.metrics.to_dict()["commands"]
+        self.assertEqual(commands["test_async_echo"]["statuses"], {"success": 1})
+        self.assertEqual(commands["test_echo"]["statuses"], {"success": 1})
+
+    def test_execute_cancellable_async(self):
+        """
+        Ensure awaited commands get their cancellation token and are held to
+        their time budget.
+        """
+        self.assertEqual(
+            asyncio.run(self.engine.execute_command_async("test_cancellable", ["0"])),
+            0.0,
+        )
+
+        if self.engine._has_qt:
+            # with QT the callback runs on the main thread, which the watchdog
+            # interrupts
+            return
+
+        os.environ["TK_SHELL_COMMAND_TIMEOUT"] = "0.2"
+        try:
+            with self.assertRaises(self.tk_shell.cancellation.CommandTimedOut):
+                asyncio.run(self.engine.execute_command_async("test_cancellable", []))
+        finally:
+            del os.environ["TK_SHELL_COMMAND_TIMEOUT"]
+
+    def test_cancelled(self):
+        """
+        Ensure cancelled coroutines are reported as cancellations.
+        """
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        result = asyncio.run(
+            self.tk_shell.run_async_callback(self.engine, cancelled, [])
+        )
+        self.assertEqual(result.status, "cancelled")
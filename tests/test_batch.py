@@ -0,0 +1,127 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestBatch(TankTestBase):
+    """
+    Tests running commands from a batch manifest.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.batch = self.engine.import_module("tk_shell").batch
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_run_manifest(self):
+        """
+        Ensure every entry runs and failures don't stop the batch.
+        """
+        manifest_path = os.path.join(self.tank_temp, "manifest.jsonl")
+        with open(manifest_path, "w") as fh:
+            fh.write(json.dumps({"command": "test_echo", "args": ["a"]}) + "\n")
+            fh.write(json.dumps(["missing"]) + "\n")
+            fh.write(json.dumps(["test_echo", "b", "c"]) + "\n")
+
+        entries = self.batch.load_manifest(manifest_path)
+        self.assertEqual(
+            entries, [("test_echo", ["a"]), ("missing", []), ("test_echo", ["b", "c"])]
+        )
+
+        results = self.batch.run_entries(self.engine, entries)
+        self.assertEqual(
+            [result.status for result in results],
+            ["success", "tank_error", "success"],
+        )
+        self.assertIn("missing", results[1].error)
+        self.assertEqual(results[2].value, ["b", "c"])
+
+        results_path = os.path.join(self.tank_temp, "results.json")
+        self.batch.write_results(results_path, results)
+        with open(results_path) as fh:
+            report = json.load(fh)
+        self.assertEqual(report["summary"]["total"], 3)
+        self.assertEqual(report["summary"]["failed"], 1)
+
+    def test_invalid_manifest(self):
+        """
+        Ensure malformed manifests are reported as toolkit errors.
+        """
+        manifest_path = os.path.join(self.tank_temp, "invalid.jsonl")
+        with open(manifest_path, "w") as fh:
+            fh.write("{not json\n")
+
+        with self.assertRaises(sgtk.TankError):
+            self.batch.load_manifest(manifest_path)
+
+    def test_run_concurrently(self):
+        """
+        Ensure concurrent results are reported in the order of the entries.
+        """
+        pool = self.engine.import_module("tk_shell").pool
+        entries = [("test_echo", [str(index)]) for index in range(8)]
+        entries.append(("missing", []))
+
+        results = pool.run_entries_concurrently(self.engine, entries, 4, "thread")
+        self.assertEqual(
+            [result.value for result in results[:-1]],
+            [[str(index)] for index in range(8)],
+        )
+        self.assertEqual(results[-1].status, "tank_error")
+
+    def test_stream_concurrently(self):
+        """
+        Ensure the items of commands run concurrently are streamed, from
+        threads and from forked processes.
+        """
+        tk_shell = self.engine.import_module("tk_shell")
+        executors = ["thread"]
+        if hasattr(os, "fork"):
+            executors.append("process")
+
+        for executor in executors:
+            path = os.path.join(self.tank_temp, "%s.jsonl" % executor)
+            writer = tk_shell.streaming.StreamWriter(output_format="jsonl", path=path)
+            results = tk_shell.pool.run_entries_concurrently(
+                self.engine, [("test_stream", ["2"])] * 3, 2, executor, writer
+            )
+            writer.close()
+
+            self.assertEqual([result.value for result in results], [2, 2, 2])
+            with open(path) as fh:
+                self.assertEqual(len(fh.read().splitlines()), 6)
+
+    def test_unknown_executor(self):
+        """
+        Ensure unsupported executors are rejected.
+        """
+        pool = self.engine.import_module("tk_shell").pool
+        with self.assertRaises(sgtk.TankError):
+            pool.run_entries_concurrently(self.engine, [], 2, "cluster")
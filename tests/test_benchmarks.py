@@ -0,0 +1,244 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Benchmarks for engine startup, command dispatch, the QT task round trip and
+logging.
+
+They are skipped unless the ``TK_SHELL_BENCHMARK`` environment variable is set.
+Since they create a QApplication, run them on their own rather than as part of
+the regular test suite. Results are written as json to the path in
+``TK_SHELL_BENCHMARK_OUTPUT``, or printed, so runs on different commits can be
+compared.
+"""
+
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import unittest
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+BENCHMARKS_ENABLED = bool(os.environ.get("TK_SHELL_BENCHMARK"))
+
+# Benchmark results, by name, written out once all the benchmarks have run.
+_results = {}
+
+# Whether an engine was already started in this process.
+_engine_started = False
+
+
+def _record(name, samples):
+    """
+    Records the statistics of a benchmark.
+
+    :param str name: Name of the benchmark.
+    :param samples: List of durations, in seconds.
+    """
+    _results[name] = {
+        "unit": "seconds",
+        "iterations": len(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.mean(samples),
+        "median": statistics.median(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def _measure(name, func, iterations):
+    """
+    Times a function over a number of iterations and records the statistics.
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    _record(name, samples)
+
+
+def _git_commit():
+    """
+    :returns: The commit of the engine being benchmarked, if known.
+    """
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode("utf-8")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def tearDownModule():
+    """
+    Writes the results of the benchmarks that ran.
+    """
+    if not _results:
+        return
+
+    report = {
+        "commit": _git_commit(),
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": _results,
+    }
+    output_path = os.environ.get("TK_SHELL_BENCHMARK_OUTPUT")
+    if output_path:
+        with open(output_path, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    else:
+        sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+@unittest.skipUnless(BENCHMARKS_ENABLED, "Set TK_SHELL_BENCHMARK to run benchmarks.")
+class TestBenchmarks(TankTestBase):
+    """
+    Measures the cost of the engine's main code paths.
+    """
+
+    ITERATIONS = int(os.environ.get("TK_SHELL_BENCHMARK_ITERATIONS", 200))
+
+    def setUp(self):
+        """
+        Prepares the fixtures. Engines are started by the benchmarks.
+        """
+        super().setUp()
+        self.setup_fixtures()
+        self.context = sgtk.Context(self.tk)
+        self.engine = None
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        if self.engine is not None:
+            self.engine.destroy()
+        super().tearDown()
+
+    def _start_engine(self):
+        """
+        Starts the engine, recording the first start in the process as the cold
+        start.
+        """
+        global _engine_started
+
+        start = time.perf_counter()
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, self.context)
+        if not _engine_started:
+            _engine_started = True
+            _record("start_engine_cold", [time.perf_counter() - start])
+
+    def test_01_start_engine(self):
+        """
+        Measures starting and destroying the engine.
+        """
+        self._start_engine()
+        self.engine.destroy()
+        self.engine = None
+
+        def start_and_destroy():
+            sgtk.platform.start_engine("tk-shell", self.tk, self.context).destroy()
+
+        _measure("start_engine_warm", start_and_destroy, max(1, self.ITERATIONS // 10))
+
+    def test_02_dispatch(self):
+        """
+        Measures the overhead of dispatching a command that does nothing.
+        """
+        self._start_engine()
+        callback = self.engine.commands["test_noop"]["callback"]
+
+        _measure("noop_direct_call", callback, self.ITERATIONS)
+        _measure(
+            "noop_resolve_command",
+            lambda: self.engine._resolve_command("test_noop", []),
+            self.ITERATIONS,
+        )
+
+        if not self.engine._has_qt:
+            _measure(
+                "noop_execute_command",
+                lambda: self.engine.execute_command("test_noop", []),
+                self.ITERATIONS,
+            )
+
+    def test_03_qt_task_round_trip(self):
+        """
+        Measures running a command through a Task fired by a single shot
+        timer, until its finished signal is received.
+        """
+        self._start_engine()
+        if not self.engine._has_qt:
+            self.skipTest("QT is not available.")
+
+        from sgtk.platform.qt import QtCore
+
+        self.engine._get_qt_application()
+        tk_shell = self.engine.import_module("tk_shell")
+        callback = self.engine.commands["test_noop"]["callback"]
+
+        def round_trip():
+            task = tk_shell.Task(self.engine, callback, [], "test_noop")
+            loop = QtCore.QEventLoop()
+            task.finished.connect(loop.quit)
+            QtCore.QTimer.singleShot(0, task.run_command)
+            loop.exec_()
+
+        _measure("qt_task_round_trip", round_trip, self.ITERATIONS)
+
+        # with an existing QApplication, execute_command runs the task directly
+        _measure(
+            "noop_execute_command_qt",
+            lambda: self.engine.execute_command("test_noop", []),
+            self.ITERATIONS,
+        )
+
+    def test_04_logging(self):
+        """
+        Measures the throughput of the engine's logging interface.
+        """
+        self._start_engine()
+        if self.engine._stream_handler is None:
+            self.skipTest("Logging is not handled by the engine.")
+
+        stream = io.StringIO()
+        previous_stream = self.engine._stream_handler.setStream(stream)
+        self.engine._log.setLevel(logging.INFO)
+        count = self.ITERATIONS * 50
+
+        def log_records():
+            for index in range(count):
+                self.engine.log_info("benchmark record %d" % index)
+
+        try:
+            start = time.perf_counter()
+            log_records()
+            duration = time.perf_counter() - start
+        finally:
+            self.engine._stream_handler.setStream(previous_stream)
+
+        _record("log_info_per_record", [duration / count])
@@ -0,0 +1,191 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import asyncio
+import os
+import threading
+import time
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestCancellation(TankTestBase):
+    """
+    Tests command time budgets and cancellation.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_token(self):
+        """
+        Ensure tokens report cancellations and expired deadlines.
+        """
+        cancellation = self.tk_shell.cancellation
+
+        token = cancellation.CancellationToken()
+        token.raise_if_cancelled()
+        token.cancel()
+        with self.assertRaises(cancellation.OperationCancelled):
+            token.raise_if_cancelled()
+
+        token = cancellation.CancellationToken(0.01)
+        time.sleep(0.02)
+        with self.assertRaises(cancellation.CommandTimedOut):
+            token.raise_if_cancelled()
+
+    def test_hung_callback(self):
+        """
+        Ensure callbacks that never check their token are interrupted.
+        """
+        token = self.tk_shell.cancellation.CancellationToken(0.2)
+        start = time.time()
+        result = self.tk_shell.run_callback(
+            self.engine, lambda: time.sleep(10), [], "hung", token
+        )
+        self.assertEqual(result.status, "timed_out")
+        self.assertLess(time.time() - start, 5)
+
+    def test_cancellation_token_argument(self):
+        """
+        Ensure commands can get their token as a keyword argument.
+        """
+        callback, args = self.engine._resolve_command("test_cancellable", ["0"])
+        result = self.tk_shell.run_callback(self.engine, callback, args)
+        self.assertEqual(result.status, "success")
+        self.assertEqual(result.value, 0.0)
+
+    def test_command_timeout(self):
+        """
+        Ensure the time budget set through the environment is enforced.
+        """
+        if self.engine._has_qt:
+            self.skipTest("Running commands with QT creates a QApplication.")
+
+        os.environ["TK_SHELL_COMMAND_TIMEOUT"] = "0.2"
+        try:
+            results = self.engine.execute_commands(
+                [("test_cancellable", []), ("test_cancellable", ["0"])]
+            )
+        finally:
+            del os.environ["TK_SHELL_COMMAND_TIMEOUT"]
+
+        self.assertEqual(
+            [result.status for result in results], ["timed_out", "success"]
+        )
+
+    def test_invalid_timeout_variable(self):
+        """
+        Ensure empty or malformed time budgets set through the environment
+        are ignored.
+        """
+        for value in ("", "abc"):
+            os.environ["TK_SHELL_COMMAND_TIMEOUT"] = value
+            try:
+                self.assertIsNone(self.engine._get_command_timeout("test_echo"))
+            finally:
+                del os.environ["TK_SHELL_COMMAND_TIMEOUT"]
+
+    def test_engine_commands_unlimited(self):
+        """
+        Ensure the global time budget doesn't apply to the engine's own long
+        running commands.
+        """
+        os.environ["TK_SHELL_COMMAND_TIMEOUT"] = "600"
+        try:
+            for cmd_key in ("serve_commands", "run_batch", "fan_out"):
+                self.assertIsNone(self.engine._get_command_timeout(cmd_key))
+            self.assertEqual(self.engine._get_command_timeout("test_echo"), 600.0)
+        finally:
+            del os.environ["TK_SHELL_COMMAND_TIMEOUT"]
+
+    def test_offloaded_result_after_deadline(self):
+        """
+        Ensure the result of an offloaded callback finishing after its
+        deadline doesn't replace the timeout reported.
+        """
+        if not self.engine._has_qt:
+            self.skipTest("QT is not available.")
+
+        release = threading.Event()
+        task = self.tk_shell.OffloadedTask(
+            self.engine, lambda: release.wait(10) and "late", [], "late"
+        )
+        task.run_command()
+        task._on_deadline()
+        reported = task.result
+
+        release.set()
+        task._thread.join(10)
+        self.assertIs(task.result, reported)
+        self.assertEqual(task.result.status, "timed_out")
+
+    def test_async_task_ignoring_cancellation(self):
+        """
+        Ensure a coroutine ignoring its cancellation is reported as timed out
+        once the grace period is over.
+        """
+        if not self.engine._has_qt:
+            self.skipTest("QT is not available.")
+
+        async def stubborn():
+            while True:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    pass
+
+        # driven by hand, so no QApplication is needed
+        async_task = self.engine.import_module("tk_shell").async_task
+        task = async_task.AsyncTask(self.engine, stubborn, [], "stubborn")
+        task._pump = async_task.AsyncioPump(task)
+        task._future = task._pump.loop.create_task(task._run())
+        task._pump._run_once()
+
+        task._on_deadline()
+        task._pump._run_once()
+        self.assertFalse(task._future.done())
+        self.assertFalse(task.is_complete)
+
+        task._on_grace_period_end()
+        self.assertTrue(task.is_complete)
+        self.assertEqual(task.result.status, "timed_out")
+
+    def test_async_timeout(self):
+        """
+        Ensure coroutines are cancelled once their time is up.
+        """
+
+        async def sleeper():
+            await asyncio.sleep(10)
+
+        token = self.tk_shell.cancellation.CancellationToken(0.1)
+        result = asyncio.run(
+            self.tk_shell.run_async_callback(self.engine, sleeper, [], None, token)
+        )
+        self.assertEqual(result.status, "timed_out")
@@ -0,0 +1,102 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestContextCache(TankTestBase):
+    """
+    Tests caching the state resolved for recently used contexts.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        self.empty_context = sgtk.Context(self.tk)
+        self.project_context = sgtk.Context(self.tk, project=self.project)
+        self.engine = sgtk.platform.start_engine(
+            "tk-shell", self.tk, self.empty_context
+        )
+        self.context_cache = self.engine.import_module("tk_shell").context_cache
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_lru_eviction(self):
+        """
+        Ensure the least recently used state is evicted and a configuration
+        change discards everything.
+        """
+        cache = self.context_cache.ContextStateCache(1)
+        state = self.context_cache.ContextState("test", (1, 1.0), {}, {})
+
+        cache.put(self.empty_context, state)
+        self.assertIs(cache.get(self.empty_context, (1, 1.0)), state)
+
+        cache.put(self.project_context, state)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(self.empty_context, (1, 1.0)))
+        self.assertIs(cache.get(self.project_context, (1, 1.0)), state)
+
+        self.assertIsNone(cache.get(self.project_context, (1, 2.0)))
+        self.assertEqual(len(cache), 0)
+
+    def test_switch_back_reuses_state(self):
+        """
+        Ensure switching back to a recently used context reuses its state,
+        once the cache is enabled.
+        """
+        self.assertIsNone(self.engine._context_cache)
+        self.engine._context_cache = self.context_cache.ContextStateCache(16)
+        apps = dict(self.engine.apps)
+
+        self.engine.change_context(self.project_context)
+        self.assertEqual(self.engine.context, self.project_context)
+
+        self.engine.change_context(self.empty_context)
+        self.assertEqual(self.engine.context, self.empty_context)
+        self.assertEqual(self.engine._context_cache.hits, 1)
+        for name, app in apps.items():
+            self.assertIs(self.engine.apps[name], app)
+            self.assertEqual(app.context, self.empty_context)
+
+    def test_context_change_not_allowed(self):
+        """
+        Ensure cached state is never reused by engines not allowing context
+        changes.
+        """
+        state = self.context_cache.ContextState(
+            self.engine.environment["name"],
+            self.engine._context_cache_fingerprint(),
+            dict(self.engine.apps),
+            dict(self.engine.commands),
+        )
+        self.assertTrue(self.engine._can_reuse_context_state(state))
+
+        with mock.patch.object(
+            type(self.engine),
+            "context_change_allowed",
+            new_callable=mock.PropertyMock,
+            return_value=False,
+        ):
+            self.assertFalse(self.engine._can_reuse_context_state(state))
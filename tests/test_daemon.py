@@ -0,0 +1,317 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import io
+import json
+import os
+import socket
+import stat
+import threading
+import time
+import unittest
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestCommandServer(TankTestBase):
+    """
+    Tests the request handling of the command server.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine and creates a server for it.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        tk_shell = self.engine.import_module("tk_shell")
+        self.server = tk_shell.daemon.CommandServer(
+            self.engine, os.path.join(self.tank_temp, "tk-shell.sock")
+        )
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def _handle(self, request):
+        """
+        Handles a request and returns the result and the streamed messages.
+        """
+        stream = io.BytesIO()
+        result = self.server._handle_request(request, stream)
+        messages = [json.loads(line) for line in stream.getvalue().splitlines()]
+        return result, messages
+
+    def test_execute(self):
+        """
+        Ensure commands are executed and their logs streamed back.
+        """
+        result, messages = self._handle({"command": "test_echo", "args": ["a", "b"]})
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["value"], ["a", "b"])
+        self.assertIn("echo a b", [message["message"] for message in messages])
+
+    def test_unknown_command(self):
+        """
+        Ensure unknown commands are reported as errors.
+        """
+        result, _ = self._handle({"command": "missing", "args": []})
+        self.assertEqual(result["status"], "tank_error")
+
+    def test_invalid_arguments(self):
+        """
+        Ensure requests with a malformed command or arguments are rejected.
+        """
+        result, _ = self._handle({"command": ["test_echo"], "args": []})
+        self.assertEqual(result["status"], "error")
+        result, _ = self._handle({"command": "test_echo", "args": "a"})
+        self.assertEqual(result["status"], "error")
+
+    def test_shutdown(self):
+        """
+        Ensure the shutdown action stops the server.
+        """
+        self.server._running = True
+        result, _ = self._handle({"action": "shutdown"})
+        self.assertEqual(result["status"], "success")
+        self.assertFalse(self.server._running)
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Requires Unix domain sockets.")
+class TestCommandServerSocket(TankTestBase):
+    """
+    Tests a command server listening on a real socket, with its client.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine and creates a server for it.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+        self.socket_path = os.path.join(self.tank_temp, "tk-shell.sock")
+        self.server = self.tk_shell.daemon.CommandServer(
+            self.engine, self.socket_path, poll_interval=0.01, request_timeout=0.2
+        )
+        self.thread = None
+
+    def tearDown(self):
+        """
+        Stops the server and tears down the engine and everything else from
+        the base class.
+        """
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+        self.engine.destroy()
+        super().tearDown()
+
+    def _serve(self):
+        """
+        Runs the server on a thread and waits for it to listen.
+        """
+        if self.engine._has_qt:
+            self.skipTest("Serving from a thread creates a QApplication on it.")
+
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server._running:
+            self.assertTrue(self.thread.is_alive())
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+
+    def _send_raw(self, data):
+        """
+        Sends raw bytes to the server and returns the decoded response.
+        """
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with client:
+            client.connect(self.socket_path)
+            client.sendall(data)
+            return json.loads(client.makefile("rb").readline())
+
+    def test_serve(self):
+        """
+        Ensure commands sent by the client are run, and the server stops when
+        asked to.
+        """
+        self._serve()
+        self.assertEqual(stat.S_IMODE(os.stat(self.socket_path).st_mode), 0o600)
+
+        logs = io.StringIO()
+        items = io.StringIO()
+        result = self.tk_shell.daemon.execute_command(
+            self.socket_path, "test_echo", ["a", "b"], logs, items
+        )
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["value"], ["a", "b"])
+        self.assertIn("echo a b", logs.getvalue())
+
+        ping = self.tk_shell.daemon.send_request(self.socket_path, {"action": "ping"})
+        self.assertEqual(ping["value"], os.getpid())
+
+        with mock.patch("sys.stdout", io.StringIO()):
+            exit_code = self.tk_shell.daemon.main([self.socket_path, "--shutdown"])
+        self.assertEqual(exit_code, 0)
+        self.thread.join(10)
+        self.assertFalse(self.thread.is_alive())
+        self.thread = None
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_invalid_requests(self):
+        """
+        Ensure malformed requests are rejected without stopping the server.
+        """
+        self._serve()
+        for data in [
+            b"not json\n",
+            b"[1, 2]\n",
+            b'{"command": "test_echo", "args": 1}\n',
+        ]:
+            self.assertEqual(self._send_raw(data)["status"], "error")
+
+        with mock.patch.object(
+            self.server, "_handle_request", side_effect=RuntimeError("boom")
+        ):
+            self.assertEqual(self._send_raw(b"{}\n")["error"], "boom")
+
+        result = self.tk_shell.daemon.execute_command(
+            self.socket_path, "test_echo", ["a"], io.StringIO(), io.StringIO()
+        )
+        self.assertEqual(result["value"], ["a"])
+
+    def test_idle_client(self):
+        """
+        Ensure a client that never sends its request doesn't hold up the
+        server.
+        """
+        self._serve()
+        idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with idle:
+            idle.connect(self.socket_path)
+            ping = self.tk_shell.daemon.send_request(
+                self.socket_path, {"action": "ping"}
+            )
+            self.assertEqual(ping["status"], "success")
+            # the server gave up on the idle client
+            self.assertEqual(idle.recv(1), b"")
+
+    def test_stale_socket(self):
+        """
+        Ensure the socket left behind by a server that didn't shut down
+        cleanly is removed, and a running server is never replaced.
+        """
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)
+        stale.close()
+        self.assertTrue(os.path.exists(self.socket_path))
+
+        self._serve()
+        ping = self.tk_shell.daemon.send_request(self.socket_path, {"action": "ping"})
+        self.assertEqual(ping["status"], "success")
+
+        other = self.tk_shell.daemon.CommandServer(self.engine, self.socket_path)
+        with self.assertRaises(sgtk.TankError):
+            other.serve_forever()
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "Requires fork.")
+class TestPreforkCommandServer(TankTestBase):
+    """
+    Tests running requests in forked processes.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine and creates a server for it.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        tk_shell = self.engine.import_module("tk_shell")
+        self.server = tk_shell.prefork.PreforkCommandServer(
+            self.engine, os.path.join(self.tank_temp, "tk-shell.sock")
+        )
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_execute_in_child(self):
+        """
+        Ensure execute requests are answered by a child process.
+        """
+        client, connection = socket.socketpair()
+        with client:
+            with connection, connection.makefile("wb") as wfile:
+                self.server._respond({"command": "test_echo", "args": ["a"]}, wfile)
+            messages = [
+                json.loads(line) for line in client.makefile("rb").read().splitlines()
+            ]
+        self.server._reap(block=True)
+
+        self.assertEqual(messages[-1]["status"], "success")
+        self.assertEqual(messages[-1]["value"], ["a"])
+        self.assertFalse(self.server._children)
+
+        # the outcome was sent back by the child and recorded by the server
+        commands = self.engine.metrics.to_dict()["commands"]
+        self.assertEqual(commands["test_echo"]["statuses"], {"success": 1})
+
+    def test_ping_in_parent(self):
+        """
+        Ensure other requests are answered by the server itself.
+        """
+        stream = io.BytesIO()
+        self.server._respond({"action": "ping"}, stream)
+        self.assertEqual(json.loads(stream.getvalue())["value"], os.getpid())
+
+    def test_serve_commands_without_qt(self):
+        """
+        Ensure serving commands in prefork mode never starts QT, even when it
+        is available.
+        """
+        if not self.engine._has_qt:
+            self.skipTest("QT is not available.")
+
+        tk_shell = self.engine.import_module("tk_shell")
+        with mock.patch.dict(os.environ, {"TK_SHELL_COMMAND_SERVER": "prefork"}):
+            with mock.patch.object(
+                tk_shell.prefork.PreforkCommandServer, "serve_forever"
+            ) as serve_forever:
+                with mock.patch.object(
+                    self.engine, "_get_qt_application"
+                ) as get_qt_application:
+                    self.engine.execute_command(
+                        "serve_commands", [self.server.socket_path]
+                    )
+
+        serve_forever.assert_called_once_with()
+        get_qt_application.assert_not_called()
@@ -0,0 +1,76 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestDispatch(TankTestBase):
+    """
+    Tests command lookup, argument validation and coercion.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_commands_indexed_on_registration(self):
+        """
+        Ensure registered commands are indexed right away.
+        """
+        self.assertGreaterEqual(len(self.engine._dispatch_index), 3)
+
+    def test_coercion(self):
+        """
+        Ensure string arguments are converted to the annotated types.
+        """
+        _, args = self.engine._resolve_command("test_typed", ["3", "yes"])
+        self.assertEqual(args, [3, True])
+
+        _, args = self.engine._resolve_command("test_typed", ["4"])
+        self.assertEqual(args, [4])
+
+        # Values that are not strings are left alone.
+        _, args = self.engine._resolve_command("test_echo", [True, "1"])
+        self.assertEqual(args, [True, "1"])
+
+    def test_invalid_arguments(self):
+        """
+        Ensure wrong arity and invalid values are reported as toolkit errors.
+        """
+        for args in ([], ["1", "true", "extra"], ["three"], ["1", "maybe"]):
+            with self.assertRaises(sgtk.TankError):
+                self.engine._resolve_command("test_typed", args)
+
+        with self.assertRaises(sgtk.TankError):
+            self.engine._resolve_command("missing", [])
+
+    def test_invalidated_on_context_change(self):
+        """
+        Ensure the index is rebuilt after a context change.
+        """
+        self.engine._dispatch_index.add("stale", lambda: None)
+        self.engine.post_context_change(self.engine.context, self.engine.context)
+        self.assertNotIn("stale", self.engine._dispatch_index._entries)
@@ -77,3 +77,19 @@ class TestShowDialog(TankTestBase):
         self.engine.apps["test_app"].dismiss_button.click()
         # Process the remaining events.
         sgtk.platform.qt.QtGui.QApplication.instance().processEvents()
+
+    def test_03_execute_commands_with_scheduler(self):
+        """
+        Ensure commands can be scheduled concurrently within the running
+        QApplication.
+        """
+        self.assertIsNotNone(
+            sgtk.platform.qt.QtGui.QApplication.instance(),
+            "This should never run first.",
+        )
+        results = self.engine.execute_commands(
+            [("test_echo", ["a"]), ("test_noop", []), ("test_echo", ["b"])],
+            max_workers=2,
+        )
+        self.assertEqual([result.status for result in results], ["success"] * 3)
+        self.assertEqual([result.value for result in results], [["a"], None, ["b"]])
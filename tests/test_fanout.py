@@ -0,0 +1,68 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestFanOut(TankTestBase):
+    """
+    Tests describing the targets a command is fanned out to.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_parse_target(self):
+        """
+        Ensure the supported target formats are parsed.
+        """
+        fanout = self.tk_shell.fanout
+        expected = {"type": "Shot", "id": 12}
+        self.assertEqual(fanout.parse_target({"type": "Shot", "id": 12}), expected)
+        self.assertEqual(fanout.parse_target(["Shot", "12"]), expected)
+        self.assertEqual(fanout.parse_target("Shot:12"), expected)
+
+        with self.assertRaises(sgtk.TankError):
+            fanout.parse_target("Shot")
+
+    def test_load_targets(self):
+        """
+        Ensure targets can be listed in a json lines file.
+        """
+        path = os.path.join(self.tank_temp, "targets.jsonl")
+        with open(path, "w") as fh:
+            fh.write(json.dumps({"type": "Shot", "id": 1}) + "\n")
+            fh.write(json.dumps(["Asset", 2]) + "\n")
+
+        self.assertEqual(
+            self.tk_shell.fanout.load_targets(path),
+            [{"type": "Shot", "id": 1}, {"type": "Asset", "id": 2}],
+        )
@@ -0,0 +1,52 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestLatencyHistogram(TankTestBase):
+    """
+    Tests the histogram the event loop latency is recorded in.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_buckets(self):
+        """
+        Ensure values are counted in the bucket of their upper bound.
+        """
+        histogram = self.tk_shell.histogram.LatencyHistogram((0.01, 0.1))
+        for value in (0.0, 0.01, 0.05, 0.5, 2.0):
+            histogram.record(value)
+
+        report = histogram.to_dict()
+        self.assertEqual(report["counts"], [2, 1, 2])
+        self.assertEqual(report["count"], 5)
+        self.assertAlmostEqual(report["sum"], 2.56)
+        self.assertEqual(report["max"], 2.0)
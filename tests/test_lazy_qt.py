@@ -0,0 +1,129 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sys
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestLazyQt(TankTestBase):
+    """
+    Tests deferring the QT import until it is needed.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine in lazy QT mode.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        # bindings imported by earlier tests in the same process
+        self.imported_bindings = [
+            binding for binding in ("PySide2", "PySide6") if binding in sys.modules
+        ]
+
+        context = sgtk.Context(self.tk)
+        with mock.patch.dict(os.environ, {"TK_SHELL_LAZY_QT": "1"}):
+            self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_pyside_not_imported(self):
+        """
+        Ensure starting the engine doesn't import PySide, including for the
+        qt5 and qt6 shims.
+        """
+        if self.imported_bindings:
+            self.skipTest("PySide was imported by an earlier test.")
+
+        self.assertNotIn("PySide2", sys.modules)
+        self.assertNotIn("PySide6", sys.modules)
+        self.assertIn("__getattr__", vars(sgtk.platform.qt5))
+        self.assertIn("__getattr__", vars(sgtk.platform.qt6))
+
+    def test_qt_bootstrapped_on_first_use(self):
+        """
+        Ensure QT is only set up once a QT class is accessed.
+        """
+        lazy_qt = self.engine.import_module("tk_shell").lazy_qt
+
+        self.assertTrue(self.engine._lazy_qt)
+        self.assertIsNone(self.engine._qt_base)
+        self.assertFalse(self.engine._has_qt)
+        self.assertIsInstance(sgtk.platform.qt.QtGui, lazy_qt.LazyQtModule)
+
+        # Headless commands don't need QT.
+        callback, args = self.engine._resolve_command("test_echo", ["a"])
+        self.assertEqual(callback(*args), ["a"])
+        self.assertIsNone(self.engine._qt_base)
+
+        widget_class = sgtk.platform.qt.QtGui.QWidget
+        self.assertIsNotNone(widget_class)
+        self.assertIsNotNone(self.engine._qt_base)
+        self.assertTrue(self.engine._has_qt)
+        self.assertNotIsInstance(sgtk.platform.qt.QtGui, lazy_qt.LazyQtModule)
+        self.assertIs(sgtk.platform.qt.QtGui.QWidget, widget_class)
+
+        # the shims were filled in along with the QT base
+        self.assertNotIn("__getattr__", vars(sgtk.platform.qt5))
+        self.assertNotIn("__getattr__", vars(sgtk.platform.qt6))
+
+    def test_requires_ui_bootstraps_qt_first(self):
+        """
+        Ensure QT is set up for commands requiring a UI before choosing how
+        to run them.
+        """
+        self.engine.register_command(
+            "test_requires_ui", lambda: "done", {"requires_ui": True}
+        )
+
+        calls = mock.Mock()
+        with mock.patch.object(self.engine, "_ensure_qt", calls.ensure_qt):
+            with mock.patch.object(
+                self.engine,
+                "_runs_in_qt_event_loop",
+                calls.runs_in_qt_event_loop,
+            ):
+                calls.runs_in_qt_event_loop.return_value = False
+                value = self.engine.execute_command("test_requires_ui", [])
+
+        self.assertEqual(value, "done")
+        self.assertEqual(
+            [call[0] for call in calls.mock_calls],
+            ["ensure_qt", "runs_in_qt_event_loop"],
+        )
+
+    def test_destroy_removes_lazy_modules(self):
+        """
+        Ensure the lazy modules don't outlive an engine that never needed QT.
+        """
+        lazy_qt = self.engine.import_module("tk_shell").lazy_qt
+        self.assertIsInstance(sgtk.platform.qt.QtCore, lazy_qt.LazyQtModule)
+
+        self.engine.destroy()
+        self.assertNotIsInstance(sgtk.platform.qt.QtCore, lazy_qt.LazyQtModule)
+        self.assertNotIsInstance(sgtk.platform.qt.QtGui, lazy_qt.LazyQtModule)
+        self.assertNotIn("__getattr__", vars(sgtk.platform.qt5))
+        self.assertNotIn("__getattr__", vars(sgtk.platform.qt6))
+
+        # torn down by tearDown
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
@@ -0,0 +1,120 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import io
+import logging
+import os
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestRateLimitFilter(TankTestBase):
+    """
+    Tests the rate limiting of log messages.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine with rate limiting and repeat collapsing.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        with mock.patch.dict(
+            os.environ,
+            {
+                "TK_SHELL_LOG_RATE_LIMIT": "0.001",
+                "TK_SHELL_LOG_COLLAPSE_REPEATS": "1",
+            },
+        ):
+            self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.log_filters = self.engine.import_module("tk_shell").log_filters
+
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger("tk-shell.test_rate_limit")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = logging.StreamHandler(self.stream)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.logger.removeHandler(self.handler)
+        self.engine.destroy()
+        super().tearDown()
+
+    def _add_filter(self, **kwargs):
+        log_filter = self.log_filters.RateLimitFilter(self.logger, **kwargs)
+        self.logger.addFilter(log_filter)
+        self.addCleanup(self.logger.removeFilter, log_filter)
+        return log_filter
+
+    def test_rate_limit(self):
+        """
+        Ensure messages built from the same template are rate limited, except
+        errors.
+        """
+        log_filter = self._add_filter(rate=0.001, burst=3)
+        for frame in range(1001, 1011):
+            self.logger.info("Published frame %d" % frame)
+        self.logger.info("Done")
+        self.logger.error("Failed frame 1011")
+        self.logger.error("Failed frame 1012")
+
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(
+            lines,
+            [
+                "Published frame 1001",
+                "Published frame 1002",
+                "Published frame 1003",
+                "Done",
+                "Failed frame 1011",
+                "Failed frame 1012",
+            ],
+        )
+        self.assertEqual(log_filter.report()["rate_limited"], 7)
+
+    def test_collapse_repeats(self):
+        """
+        Ensure consecutive identical messages are collapsed.
+        """
+        log_filter = self._add_filter(collapse_repeats=True)
+        for _ in range(5):
+            self.logger.info("Scanning")
+        self.logger.info("Scanned")
+        self.logger.info("Scanned")
+        log_filter.flush()
+
+        self.assertEqual(
+            self.stream.getvalue().splitlines(),
+            [
+                "Scanning",
+                "Last message repeated 4 times.",
+                "Scanned",
+                "Last message repeated 1 times.",
+            ],
+        )
+
+    def test_removed_on_destroy(self):
+        """
+        Ensure the engine filter is removed when the engine is destroyed.
+        """
+        log_filter = self.engine._log_filter
+        self.assertIn(log_filter, self.engine._log.filters)
+        self.engine.destroy()
+        self.assertNotIn(log_filter, self.engine._log.filters)
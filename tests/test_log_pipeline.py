@@ -0,0 +1,108 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import io
+import logging
+import os
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestAsyncLogging(TankTestBase):
+    """
+    Tests logging through the asynchronous pipeline.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine with asynchronous logging to a file.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        self.log_file = os.path.join(self.tank_temp, "tk-shell.log")
+        context = sgtk.Context(self.tk)
+        with mock.patch.dict(
+            os.environ,
+            {"TK_SHELL_ASYNC_LOGGING": "1", "TK_SHELL_LOG_FILE": self.log_file},
+        ):
+            self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_flushed_on_destroy(self):
+        """
+        Ensure queued records are written when the engine is destroyed.
+        """
+        self.assertIsNotNone(self.engine._log_pipeline)
+        for index in range(100):
+            self.engine.log_info("record %d" % index)
+        self.engine.destroy()
+
+        with open(self.log_file) as fh:
+            contents = fh.read()
+        self.assertIn("record 0", contents)
+        self.assertIn("record 99", contents)
+        self.assertIsNone(self.engine._log_pipeline)
+
+    def test_overflow_policies(self):
+        """
+        Ensure records are dropped according to the overflow policy.
+        """
+        log_pipeline = self.engine.import_module("tk_shell").log_pipeline
+        logger = logging.getLogger("tk-shell.test_overflow")
+        logger.propagate = False
+
+        for policy, expected in (("drop_new", "record 0"), ("drop_oldest", "record 9")):
+            stream = io.StringIO()
+            pipeline = log_pipeline.AsyncLogPipeline(
+                [logging.StreamHandler(stream)],
+                max_queue_size=2,
+                overflow_policy=policy,
+            )
+            logger.addHandler(pipeline.handler)
+            try:
+                # The pipeline is not started, so the queue fills up.
+                for index in range(10):
+                    logger.warning("record %d" % index)
+            finally:
+                logger.removeHandler(pipeline.handler)
+            pipeline.start()
+            pipeline.stop()
+
+            self.assertEqual(pipeline.dropped, 8)
+            self.assertIn(expected, stream.getvalue())
+
+        with self.assertRaises(sgtk.TankError):
+            log_pipeline.AsyncLogPipeline([], overflow_policy="explode")
+
+    def test_reset_after_fork(self):
+        """
+        Ensure forked processes log directly rather than through the pipeline,
+        whose thread only exists in the parent process.
+        """
+        forking = self.engine.import_module("tk_shell").forking
+        pipeline = self.engine._log_pipeline
+        self.addCleanup(pipeline.stop)
+
+        forking.reset_after_fork(self.engine)
+
+        self.assertIsNone(self.engine._log_pipeline)
+        self.assertNotIn(pipeline.handler, self.engine._log.handlers)
+        self.assertIn(self.engine._stream_handler, self.engine._log.handlers)
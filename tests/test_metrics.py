@@ -0,0 +1,102 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestMetrics(TankTestBase):
+    """
+    Tests the metrics recorded for the commands run by the engine.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_outcomes(self):
+        """
+        Ensure successes and errors are counted by command.
+        """
+        if self.engine._has_qt:
+            self.skipTest("Commands are run within a QApplication.")
+
+        self.engine.execute_command("test_echo", ["a"])
+        self.engine.execute_command("test_echo", ["b"])
+        os.environ["TK_SHELL_COMMAND_TIMEOUT"] = "0.2"
+        try:
+            self.engine.execute_commands(
+                [("test_cancellable", []), ("test_cancellable", ["0"])]
+            )
+        finally:
+            del os.environ["TK_SHELL_COMMAND_TIMEOUT"]
+
+        commands = self.engine.metrics.to_dict()["commands"]
+        self.assertEqual(commands["test_echo"]["invocations"], 2)
+        self.assertEqual(commands["test_echo"]["statuses"], {"success": 2})
+        self.assertEqual(commands["test_echo"]["latency"]["count"], 2)
+        self.assertEqual(
+            commands["test_cancellable"]["statuses"], {"success": 1, "timed_out": 1}
+        )
+
+    def test_prometheus(self):
+        """
+        Ensure metrics are exported in the Prometheus text format.
+        """
+        registry = self.tk_shell.metrics.MetricsRegistry()
+        registry.record("test_echo", "success", 0.02)
+        registry.record("test_echo", "tank_error", 2.0)
+
+        lines = registry.to_prometheus().splitlines()
+        self.assertIn(
+            'tk_shell_command_invocations_total{command="test_echo"} 2', lines
+        )
+        self.assertIn(
+            'tk_shell_command_results_total{command="test_echo",status="tank_error"} 1',
+            lines,
+        )
+        bucket = "tk_shell_command_duration_seconds_bucket{%s} %d"
+        labels = 'command="test_echo",le="%s"'
+        self.assertIn(bucket % (labels % "0.025", 1), lines)
+        self.assertIn(bucket % (labels % "+Inf", 2), lines)
+
+    def test_export(self):
+        """
+        Ensure metrics are written as json.
+        """
+        path = os.path.join(self.tank_temp, "metrics", "tk-shell.json")
+        registry = self.tk_shell.metrics.MetricsRegistry()
+        registry.record("test_echo", "cancelled", None)
+        exporter = self.tk_shell.metrics.MetricsExporter(registry, path, "json")
+        exporter.stop()
+
+        with open(path) as fh:
+            report = json.load(fh)
+        self.assertEqual(report["commands"]["test_echo"]["statuses"], {"cancelled": 1})
+        self.assertEqual(report["commands"]["test_echo"]["latency"]["count"], 0)
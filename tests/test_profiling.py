@@ -0,0 +1,83 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestProfiling(TankTestBase):
+    """
+    Tests the command profiling instrumentation.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.profiling = self.engine.import_module("tk_shell").profiling
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_parse_modes(self):
+        """
+        Ensure the profiling configuration is parsed properly.
+        """
+        self.assertEqual(self.profiling.parse_modes(""), set())
+        self.assertEqual(self.profiling.parse_modes("0"), set())
+        self.assertEqual(self.profiling.parse_modes("1"), {"timing"})
+        self.assertEqual(
+            self.profiling.parse_modes("cprofile, tracemalloc"),
+            {"timing", "cprofile", "tracemalloc"},
+        )
+
+    def test_disabled_by_default(self):
+        """
+        Ensure commands are not instrumented unless requested.
+        """
+        profiler = self.engine._create_profiler("test_echo")
+        self.assertIsInstance(profiler, self.profiling.NullProfiler)
+
+    def test_reports(self):
+        """
+        Ensure phases are timed and the requested reports are written.
+        """
+        output_dir = os.path.join(self.tank_temp, "profiles")
+        profiler = self.profiling.create_profiler(
+            self.engine,
+            "test_echo",
+            self.profiling.parse_modes("cprofile,tracemalloc"),
+            output_dir,
+        )
+        with profiler.phase("validation"):
+            callback, args = self.engine._resolve_command("test_echo", ["a"])
+        self.assertEqual(profiler.wrap(callback)(*args), ["a"])
+        profiler.report()
+
+        self.assertEqual(
+            [phase.name for phase in profiler._phases], ["validation", "callback"]
+        )
+        extensions = sorted(
+            name.split("-")[-1].split(".")[-1] for name in os.listdir(output_dir)
+        )
+        self.assertEqual(extensions, ["json", "pstats", "txt"])
@@ -0,0 +1,107 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestResultCache(TankTestBase):
+    """
+    Tests caching the results of commands.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+        self.app = self.engine.apps["test_app"]
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def _run(self, cmd_key, args):
+        callback, args = self.engine._resolve_command(cmd_key, args)
+        return self.tk_shell.run_callback(self.engine, callback, args).value
+
+    def test_lazy_disk_location(self):
+        """
+        Ensure the location of the on-disk store is only resolved once a
+        result is looked up.
+        """
+        result_cache = self.engine._result_cache
+        self.assertTrue(callable(result_cache._disk_location))
+
+        self._run("test_lookup", ["a"])
+        self.assertEqual(
+            result_cache._disk_location,
+            os.path.join(self.engine.cache_location, "results"),
+        )
+
+    def test_memoized_command(self):
+        """
+        Ensure cached results are served without calling the callback.
+        """
+        self.assertEqual(self._run("test_lookup", ["a"]), ["a"])
+        self.assertEqual(self._run("test_lookup", ["a"]), ["a"])
+        self.assertEqual(self.app.lookup_calls, 1)
+
+        self.assertEqual(self._run("test_lookup", ["b"]), ["b"])
+        self.assertEqual(self.app.lookup_calls, 2)
+
+    def test_cached_copies(self):
+        """
+        Ensure callers altering a cached result don't alter it for the next
+        ones.
+        """
+        self._run("test_lookup", ["a"]).append("changed")
+        self._run("test_lookup", ["a"]).append("changed")
+        self.assertEqual(self._run("test_lookup", ["a"]), ["a"])
+        self.assertEqual(self.app.lookup_calls, 1)
+
+    def test_context_change(self):
+        """
+        Ensure context changes drop the results cached in memory.
+        """
+        self._run("test_lookup", ["a"])
+        self.engine.post_context_change(self.engine.context, self.engine.context)
+        self._run("test_lookup", ["a"])
+        self.assertEqual(self.app.lookup_calls, 2)
+
+    def test_disk_store(self):
+        """
+        Ensure results stored on disk are shared and expire.
+        """
+        result_cache = self.tk_shell.result_cache
+        location = os.path.join(self.tank_temp, "results")
+        key = result_cache.cache_key("test_lookup", ["a"], self.engine.context)
+
+        result_cache.ResultCache(8, location, 8).put(key, ["a"], 60, on_disk=True)
+        self.assertEqual(
+            result_cache.ResultCache(8, location, 8).get(key), (True, ["a"])
+        )
+
+        result_cache.ResultCache(8, location, 8).put(key, ["a"], -1, on_disk=True)
+        self.assertEqual(
+            result_cache.ResultCache(8, location, 8).get(key), (False, None)
+        )
@@ -0,0 +1,118 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import asyncio
+import json
+import logging
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestSessionHygiene(TankTestBase):
+    """
+    Tests releasing what commands leave behind and reporting leaks.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_leftover_handlers(self):
+        """
+        Ensure log handlers added by a command are removed once it is done.
+        """
+        session = self.tk_shell.session.SessionHygiene(self.engine)
+        logger = logging.getLogger("sgtk")
+        handler = logging.NullHandler()
+
+        with session.command("leaky"):
+            logger.addHandler(handler)
+        self.assertNotIn(handler, logger.handlers)
+
+    def test_nested_commands(self):
+        """
+        Ensure what commands run by another command leave behind is released
+        once they are done.
+        """
+        session = self.tk_shell.session.SessionHygiene(self.engine)
+        logger = logging.getLogger("sgtk")
+        handler = logging.NullHandler()
+
+        with session.command("serve"):
+            with session.command("leaky"):
+                logger.addHandler(handler)
+            self.assertNotIn(handler, logger.handlers)
+
+    def test_overlapping_async_commands(self):
+        """
+        Ensure commands awaited together don't release what the others still
+        use.
+        """
+        self.engine._session = self.tk_shell.session.SessionHygiene(self.engine)
+        logger = logging.getLogger("sgtk")
+        handler = logging.NullHandler()
+        self.addCleanup(logger.removeHandler, handler)
+
+        async def uses_handler():
+            logger.addHandler(handler)
+            # the other command runs and completes meanwhile
+            await asyncio.sleep(0.1)
+            return handler in logger.handlers
+
+        async def completes_first():
+            return True
+
+        self.engine.register_command("test_uses_handler", uses_handler)
+        self.engine.register_command("test_completes_first", completes_first)
+
+        async def run_both():
+            return await asyncio.gather(
+                self.engine.execute_command_async("test_uses_handler", []),
+                self.engine.execute_command_async("test_completes_first", []),
+            )
+
+        self.assertEqual(asyncio.run(run_both()), [True, True])
+
+    def test_leak_report(self):
+        """
+        Ensure the growth of the process across commands is reported.
+        """
+        path = os.path.join(self.tank_temp, "leaks.json")
+        session = self.tk_shell.session.SessionHygiene(
+            self.engine, reclaim=False, report_path=path
+        )
+        leaked = []
+        for _ in range(3):
+            with session.command("test_leak"):
+                leaked.append([object() for _ in range(100)])
+        session.write_report()
+
+        with open(path) as fh:
+            report = json.load(fh)
+        self.assertEqual(report["commands"], 3)
+        self.assertGreaterEqual(report["objects_growth"], 3)
@@ -0,0 +1,236 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Soak tests cycling the engine through start_engine, execute_command and
+destroy thousands of times, headless and with QT on the offscreen platform.
+
+They check that log handlers, threads, file descriptors, memory and live
+objects don't grow from one cycle to the next, and report how the latency of
+a cycle drifts over the run.
+
+They are skipped unless the ``TK_SHELL_SOAK`` environment variable is set.
+Since they create a QApplication, run them on their own rather than as part of
+the regular test suite. ``TK_SHELL_SOAK_CYCLES`` sets the number of cycles.
+Reports are written as json to the path in ``TK_SHELL_SOAK_OUTPUT``, or
+printed.
+"""
+
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+SOAK_ENABLED = bool(os.environ.get("TK_SHELL_SOAK"))
+
+# Bounds of the growth allowed per cycle, once warmed up, and of the ratio of
+# the latency at the end of the run to the latency at its start.
+MAX_RSS_GROWTH = int(os.environ.get("TK_SHELL_SOAK_MAX_RSS_GROWTH", 16 * 1024))
+MAX_OBJECTS_GROWTH = float(os.environ.get("TK_SHELL_SOAK_MAX_OBJECTS_GROWTH", 20))
+MAX_LATENCY_DRIFT = float(os.environ.get("TK_SHELL_SOAK_MAX_LATENCY_DRIFT", 1.5))
+MAX_FDS_GROWTH = 4
+
+# Number of cycles whose mean latency is reported together.
+WINDOW_SIZE = 100
+
+# Soak reports, by name, written out once all the soak tests have run.
+_results = {}
+
+
+def _open_fds():
+    """
+    :returns: The number of file descriptors open in the process, or None if
+        it can't be found on this platform.
+    """
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def _snapshot(current_rss):
+    """
+    :param current_rss: Function returning the resident memory of the process.
+
+    :returns: The resources used by the process.
+    """
+    gc.collect()
+    loggers = [logging.getLogger(), logging.getLogger("sgtk")]
+    loggers.append(logging.getLogger("tank.tk-shell"))
+    return {
+        "rss": current_rss(),
+        "objects": len(gc.get_objects()),
+        "fds": _open_fds(),
+        "threads": threading.active_count(),
+        "handlers": sum(len(logger.handlers) for logger in loggers),
+        "filters": sum(len(logger.filters) for logger in loggers),
+    }
+
+
+def tearDownModule():
+    """
+    Writes the reports of the soak tests that ran.
+    """
+    if not _results:
+        return
+
+    report = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "soak": _results,
+    }
+    output_path = os.environ.get("TK_SHELL_SOAK_OUTPUT")
+    if output_path:
+        with open(output_path, "w") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    else:
+        sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+@unittest.skipUnless(SOAK_ENABLED, "Set TK_SHELL_SOAK to run soak tests.")
+class TestSoak(TankTestBase):
+    """
+    Cycles the engine through its lifecycle and checks it doesn't leak.
+    """
+
+    CYCLES = int(os.environ.get("TK_SHELL_SOAK_CYCLES", 2000))
+
+    def setUp(self):
+        """
+        Prepares the fixtures. Engines are started by the soak tests.
+        """
+        super().setUp()
+        self.setup_fixtures()
+        self.context = sgtk.Context(self.tk)
+
+    def _soak(self, name, environment):
+        """
+        Runs the cycles, records the report and checks the growth of the
+        resources used.
+
+        :param str name: Name of the report.
+        :param dict environment: Environment variables set while cycling.
+        """
+        warmup = max(1, self.CYCLES // 10)
+        latencies = []
+        baseline = None
+
+        # what the engines log is not of interest here
+        devnull = open(os.devnull, "w")
+        self.addCleanup(devnull.close)
+
+        with mock.patch.dict(os.environ, environment):
+            with mock.patch("sys.stderr", devnull):
+                for cycle in range(self.CYCLES):
+                    args = ["soak", str(cycle)]
+                    start = time.perf_counter()
+                    engine = sgtk.platform.start_engine(
+                        "tk-shell", self.tk, self.context
+                    )
+                    try:
+                        value = engine.execute_command("test_echo", args)
+                        tk_shell = engine.import_module("tk_shell")
+                    finally:
+                        engine.destroy()
+                    latencies.append(time.perf_counter() - start)
+                    self.assertEqual(value, args)
+
+                    if cycle == warmup - 1:
+                        baseline = _snapshot(tk_shell.session.current_rss)
+        final = _snapshot(tk_shell.session.current_rss)
+
+        measured = latencies[warmup:] or latencies
+        decile = max(1, len(measured) // 10)
+        first, last = measured[:decile], measured[-decile:]
+        drift = statistics.mean(last) / statistics.mean(first)
+        cycles = max(1, len(latencies) - warmup)
+        rss_growth = None
+        if final["rss"] is not None and baseline["rss"] is not None:
+            rss_growth = (final["rss"] - baseline["rss"]) / cycles
+        objects_growth = (final["objects"] - baseline["objects"]) / cycles
+
+        _results[name] = {
+            "cycles": self.CYCLES,
+            "warmup_cycles": warmup,
+            "baseline": baseline,
+            "final": final,
+            "rss_growth_per_cycle": rss_growth,
+            "objects_growth_per_cycle": objects_growth,
+            "latency": {
+                "unit": "seconds",
+                "mean": statistics.mean(latencies),
+                "median": statistics.median(latencies),
+                "max": max(latencies),
+                "drift": drift,
+                "window_size": WINDOW_SIZE,
+                "window_means": [
+                    statistics.mean(latencies[index : index + WINDOW_SIZE])
+                    for index in range(0, len(latencies), WINDOW_SIZE)
+                ],
+            },
+        }
+
+        self.assertEqual(final["handlers"], baseline["handlers"])
+        self.assertEqual(final["filters"], baseline["filters"])
+        self.assertLessEqual(final["threads"], baseline["threads"])
+        if final["fds"] is not None:
+            self.assertLessEqual(final["fds"] - baseline["fds"], MAX_FDS_GROWTH)
+        if rss_growth is not None:
+            self.assertLessEqual(rss_growth, MAX_RSS_GROWTH)
+        self.assertLessEqual(objects_growth, MAX_OBJECTS_GROWTH)
+        self.assertLessEqual(drift, MAX_LATENCY_DRIFT)
+
+    def test_01_headless(self):
+        """
+        Soaks the engine without QT.
+        """
+        self._soak("headless", {"TK_SHELL_LAZY_QT": "1"})
+
+    def test_02_headless_async_logging(self):
+        """
+        Soaks the engine without QT, logging through the asynchronous
+        pipeline, whose thread must be stopped with each engine.
+        """
+        self._soak(
+            "headless_async_logging",
+            {"TK_SHELL_LAZY_QT": "1", "TK_SHELL_ASYNC_LOGGING": "1"},
+        )
+
+    def test_03_qt_offscreen(self):
+        """
+        Soaks the engine with QT, on the offscreen platform so no display is
+        needed.
+        """
+        platform_name = os.environ.get("QT_QPA_PLATFORM", "offscreen")
+        with mock.patch.dict(os.environ, {"QT_QPA_PLATFORM": platform_name}):
+            engine = sgtk.platform.start_engine("tk-shell", self.tk, self.context)
+            try:
+                if not engine._has_qt:
+                    self.skipTest("QT is not available.")
+                # commands run within the existing QApplication, as they would
+                # in a long running tool.
+                engine._get_qt_application()
+            finally:
+                engine.destroy()
+
+        self._soak("qt_offscreen", {"QT_QPA_PLATFORM": platform_name})
@@ -0,0 +1,70 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import json
+import os
+import sys
+from unittest import mock
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestStartupTrace(TankTestBase):
+    """
+    Tests the timeline of the startup of the engine.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine with the startup trace enabled.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        self.trace_path = os.path.join(self.tank_temp, "startup.json")
+        context = sgtk.Context(self.tk)
+        with mock.patch.dict(os.environ, {"TK_SHELL_STARTUP_TRACE": self.trace_path}):
+            self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_timeline(self):
+        """
+        Ensure the startup phases are written as Chrome trace events and as a
+        summary once the engine is done starting.
+        """
+        self.assertIsNotNone(self.engine._startup_trace)
+        self.engine.destroy()
+        self.assertIsNone(sys.getprofile())
+
+        with open(self.trace_path) as fh:
+            events = json.load(fh)["traceEvents"]
+        names = [event["name"] for event in events]
+        self.assertIn("Engine.__init__", names)
+        self.assertIn("init_engine", names)
+        self.assertIn("post_app_init", names)
+        self.assertIn("register_command test_echo", names)
+        self.assertTrue([name for name in names if name.startswith("init_app ")])
+        for event in events:
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["ts"], 0)
+
+        summary_path = os.path.join(self.tank_temp, "startup.txt")
+        with open(summary_path) as fh:
+            summary = fh.read()
+        self.assertIn("init_engine", summary)
@@ -0,0 +1,97 @@
+# Copyright (c) 2019 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import io
+import json
+import os
+
+import sgtk
+
+from tank_test.tank_test_base import TankTestBase
+from tank_test.tank_test_base import setUpModule  # noqa
+
+
+class TestStreaming(TankTestBase):
+    """
+    Tests streaming the output of commands returning generators.
+    """
+
+    def setUp(self):
+        """
+        Starts the engine.
+        """
+        super().setUp()
+        self.setup_fixtures()
+
+        context = sgtk.Context(self.tk)
+        self.engine = sgtk.platform.start_engine("tk-shell", self.tk, context)
+        self.tk_shell = self.engine.import_module("tk_shell")
+
+    def tearDown(self):
+        """
+        Tears down the engine and everything else from the base class.
+        """
+        self.engine.destroy()
+        super().tearDown()
+
+    def test_consuming(self):
+        """
+        Ensure each item is written as json as it is produced.
+        """
+        stream = io.StringIO()
+        writer = self.tk_shell.streaming.StreamWriter(stream, "jsonl")
+        callback, args = self.engine._resolve_command("test_stream", ["2"])
+
+        result = self.tk_shell.run_callback(
+            self.engine, self.tk_shell.streaming.consuming(callback, writer), args
+        )
+        self.assertEqual(result.status, "success")
+        self.assertEqual(result.value, 2)
+        self.assertEqual(
+            [json.loads(line) for line in stream.getvalue().splitlines()],
+            [{"index": 0}, {"index": 1}],
+        )
+
+    def test_regular_return_value(self):
+        """
+        Ensure values that are not streams are returned untouched.
+        """
+        stream = io.StringIO()
+        writer = self.tk_shell.streaming.StreamWriter(stream)
+        callback, args = self.engine._resolve_command("test_echo", ["a"])
+
+        self.assertEqual(
+            self.tk_shell.streaming.consuming(callback, writer)(*args), ["a"]
+        )
+        self.assertEqual(stream.getvalue(), "")
+
+    def test_stream_path(self):
+        """
+        Ensure streamed items can be written to a file.
+        """
+        if self.engine._has_qt:
+            self.skipTest("Running a command with QT creates a QApplication.")
+
+        path = os.path.join(self.tank_temp, "stream.txt")
+        os.environ["TK_SHELL_STREAM_PATH"] = path
+        try:
+            self.assertEqual(self.engine.execute_command("test_stream", []), 3)
+        finally:
+            del os.environ["TK_SHELL_STREAM_PATH"]
+
+        with open(path) as fh:
+            self.assertEqual(len(fh.read().splitlines()), 3)
+
+    def test_unknown_format(self):
+        """
+        Ensure unsupported formats are reported.
+        """
+        with self.assertRaises(sgtk.TankError):
+            self.tk_shell.streaming.StreamWriter(output_format="xml")